@@ -1,5 +1,13 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
 import unittest
 import random
+import subprocess
+from decimal import Decimal
 from tkinter import Tk
 from unittest.mock import patch, Mock
 
@@ -8,8 +16,41 @@ from Pemba_02240320_A3_PA import (
     BankAccount,
     BankingGUI,
     InvalidInputError,
-    InsufficientFundsError
+    InsufficientFundsError,
+    LimitExceededError,
+    SuspectedFraudError
 )
+import auth
+from accrual import AccrualPass, AccrualScheduler
+from account_store import AccountStore
+from aggregates import BalanceAggregates, SortedKeys
+import bulk_io
+from auth import (AttemptTable, AuthenticationError, Authenticator, TooManyAttemptsError,
+                  hash_passcode)
+from concurrency import ConcurrentLedger
+from controller import BankingController, HeadlessRenderer
+from dispatcher import CommandDispatcher
+import fraud
+from fraud import VelocityDetector
+from history import TransactionHistory
+from id_allocator import IdAllocator, IdSpaceExhaustedError
+from idempotency import IdempotencyCache, RequestIdReusedError
+from journal import TransactionJournal, read_records, replay
+from limits import LimitEngine, Rule
+from metrics import Histogram, Metrics, bucket_floor, bucket_index
+from money import format_amount, parse_amount, to_minor
+import posting
+import service
+import sharding
+from posting import apply_batch
+from service import BankClient, BankService
+from sharding import ShardedLedger, ShardUnavailableError
+from snapshot import Snapshotter, load_snapshot, restore
+from topup import OperatorSimulator, TopupGateway
+import validation
+from workload import Workload, Zipf, parse_mix
+# Keep the passcode KDF cheap so that creating test accounts stays fast
+auth.ITERATIONS = 1000
 
 class TestBankAccount(unittest.TestCase):
     def setUp(self):
@@ -96,7 +137,8 @@ class TestBankAccount(unittest.TestCase):
     def test_change_password_valid(self):
         """Test changing to a valid password"""
         self.assertTrue(self.account1.change_password("4321"))
-        self.assertEqual(self.account1.passcode, "4321")
+        self.assertTrue(self.account1.verify_passcode("4321"))
+        self.assertFalse(self.account1.verify_passcode("1234"))
     
     def test_change_password_invalid(self):
         """Test changing to invalid passwords"""
@@ -112,6 +154,16 @@ class TestBankAccount(unittest.TestCase):
                 with self.assertRaises(InvalidInputError):
                     self.account1.change_password(password)
 
+    def test_core_import_loads_no_gui(self):
+        """Test that the accounts load without tkinter and BankingGUI loads on first use"""
+        script = ("import sys, Pemba_02240320_A3_PA as app\n"
+                  "print('tkinter' in sys.modules)\n"
+                  "app.BankingGUI\n"
+                  "print('tkinter' in sys.modules)\n")
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.split(), ["False", "True"])
+
 class TestBankingGUI(unittest.TestCase):
     def setUp(self):
         """Set up GUI tests with a root window"""
@@ -128,8 +180,10 @@ class TestBankingGUI(unittest.TestCase):
     # First show the create account screen to initialize the widgets
         self.app.show_create_account()
     
-    # Now test with mocked random values
-        with patch('random.randint', side_effect=[54321, 9999]):
+    # Now test with a mocked passcode and a fixed allocator key
+        self.app.id_allocator = IdAllocator(key=1)
+        expected_id = IdAllocator(key=1).allocate()
+        with patch('random.randint', side_effect=[9999]):
             # Get the account_type variable that was created in show_create_account()
             account_type_var = self.app.account_type
             
@@ -138,9 +192,9 @@ class TestBankingGUI(unittest.TestCase):
             self.app.create_account()
             
             # Verify the account was created correctly
-            self.assertIn("54321", self.app.accounts)
-            self.assertEqual(self.app.accounts["54321"].passcode, "9999")
-            self.assertEqual(self.app.accounts["54321"].account_category, "Personal")
+            self.assertIn(expected_id, self.app.accounts)
+            self.assertTrue(self.app.accounts[expected_id].verify_passcode("9999"))
+            self.assertEqual(self.app.accounts[expected_id].account_category, "Personal")
     
     def test_successful_login(self):
         """Test successful login with correct credentials"""
@@ -323,7 +377,7 @@ class TestBankingGUI(unittest.TestCase):
         with patch('tkinter.messagebox.showinfo'):
             self.app.do_change_password()
         
-        self.assertEqual(test_account.passcode, "4321")
+        self.assertTrue(test_account.verify_passcode("4321"))
         
         # Test non-matching passwords
         self.app.new_pass_entry.get.return_value = "4321"
@@ -334,7 +388,1602 @@ class TestBankingGUI(unittest.TestCase):
             mock_error.assert_called_once()
         
         # Password shouldn't change
-        self.assertEqual(test_account.passcode, "4321")
+        self.assertTrue(test_account.verify_passcode("4321"))
+
+    def test_screens_are_reused(self):
+        """Test that navigating back to a screen raises the same widgets"""
+        self.app.current_account = BankAccount("12345", "1234", "Personal", 1000)
+        self.app.show_deposit()
+        frame = self.app.screens["deposit"]
+        entry = self.app.amount_entry
+        entry.insert(0, "50")
+        
+        self.app.show_account_menu()
+        self.app.show_deposit()
+        
+        self.assertIs(self.app.screens["deposit"], frame)
+        self.assertIs(self.app.amount_entry, entry)
+        self.assertEqual(entry.get(), "")
+        self.assertEqual(self.app.current_screen, "deposit")
+
+class TestBankingController(unittest.TestCase):
+    """The GUI flows, driven headlessly through the controller"""
+
+    def setUp(self):
+        self.renderer = HeadlessRenderer()
+        self.app = BankingController(self.renderer, id_allocator=IdAllocator(key=1))
+        self.sender = BankAccount("11111", "2222", "Personal", 1000)
+        self.recipient = BankAccount("22222", "5678", "Business", 500)
+        self.app.accounts.update({"11111": self.sender, "22222": self.recipient})
+
+    def login(self):
+        self.app.login("11111", "2222")
+        self.assertIs(self.app.current_account, self.sender)
+        self.assertEqual(self.renderer.screen, "account_menu")
+
+    def test_create_and_login(self):
+        """Test that a created account can log in with the passcode shown"""
+        with patch('random.randint', side_effect=[9999]):
+            self.app.create_account("Business")
+        kind, message = self.renderer.last_message
+        account_id = IdAllocator(key=1).allocate()
+        self.assertEqual((kind, message),
+                         ("info", f"Account Created!\nID: {account_id}\nPasscode: 9999"))
+        self.assertEqual(self.renderer.screen, "main_menu")
+        self.app.login(account_id, "9999")
+        self.assertEqual(self.app.current_account.account_category, "Business")
+
+    def test_failed_login(self):
+        for account_id, passcode in (("11111", "wrong"), ("99999", "2222"), ("", "")):
+            with self.subTest(account_id=account_id, passcode=passcode):
+                self.app.login(account_id, passcode)
+                self.assertEqual(self.renderer.last_message, ("error", "Invalid credentials"))
+                self.assertIsNone(self.app.current_account)
+
+    def test_money_flows(self):
+        """Test deposit, withdraw, transfer and top-up, and their error messages"""
+        self.login()
+        self.app.deposit("500")
+        self.assertEqual(self.renderer.last_message, ("info", "Deposit completed"))
+        self.app.withdraw("2000")
+        self.assertEqual(self.renderer.last_message, ("error", "Insufficient funds"))
+        self.app.transfer("22222", "300")
+        self.app.transfer("99999", "100")
+        self.assertEqual(self.renderer.last_message, ("error", "Recipient account not found"))
+        self.app.mobile_topup("77123456", "100")
+        self.assertEqual(self.renderer.last_message, ("info", "$100.00 credited to 77123456"))
+        self.app.mobile_topup("12345678", "100")
+        self.assertEqual(self.renderer.last_message[0], "error")
+        self.app.deposit("abc")
+        self.assertEqual(self.renderer.last_message, ("error", "Enter a valid number"))
+        self.assertEqual((self.sender.funds, self.recipient.funds), (1100, 800))
+        self.assertEqual(self.renderer.screen, "account_menu")
+        self.assertFalse(self.renderer.busy)
+
+    def test_change_password_and_balance(self):
+        self.login()
+        self.app.change_password("4321", "1234")
+        self.assertEqual(self.renderer.last_message, ("error", "Passcodes don't match"))
+        self.app.change_password("4321", "4321")
+        self.assertTrue(self.sender.verify_passcode("4321"))
+        self.app.show("balance")
+        self.assertEqual(self.app.balance_text(), "Current Balance: $1000.00")
+        self.assertEqual(self.app.recent_transactions(8), [])
+        self.app.show_main_menu()
+        self.assertIsNone(self.app.current_account)
+
+class TestTransactionJournal(unittest.TestCase):
+    def setUp(self):
+        """Journal into a temporary file"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.journal")
+        self.journal = TransactionJournal(self.path, window=0.001)
+        self.journal.attach()
+
+    def tearDown(self):
+        self.journal.detach()
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_replay_restores_balances(self):
+        """Test that replaying the journal rebuilds every account"""
+        alice = BankAccount.open("11111", "1234", "Personal")
+        bob = BankAccount.open("22222", "5678", "Business")
+        alice.deposit(1000)
+        alice.withdraw(100)
+        alice.transfer(300, bob)
+        bob.mobile_topup(50, "17123456")
+        bob.change_password("4321")
+        self.journal.wait()
+
+        accounts = replay(self.path)
+        self.assertEqual(accounts["11111"].funds, 600)
+        self.assertEqual(accounts["22222"].funds, 250)
+        self.assertTrue(accounts["22222"].verify_passcode("4321"))
+        self.assertEqual(accounts["22222"].account_category, "Business")
+
+    def test_failed_operation_not_journaled(self):
+        """Test that rejected operations leave no record"""
+        account = BankAccount.open("11111", "1234", "Personal", 100)
+        with self.assertRaises(InsufficientFundsError):
+            account.withdraw(500)
+        self.journal.wait()
+        kinds = [record[0] for record in read_records(self.path)]
+        self.assertEqual(kinds, ["open"])
+
+    def test_torn_tail_ignored(self):
+        """Test that a partially written record is dropped on replay"""
+        account = BankAccount.open("11111", "1234", "Personal")
+        account.deposit(10)
+        self.journal.wait()
+        with open(self.path, "ab") as f:
+            f.write(b"\x20\x00garbage")
+        self.assertEqual(replay(self.path)["11111"].funds, 10)
+
+    def test_appends_after_torn_tail_replay(self):
+        """Test that a journal reopened after a torn tail keeps what is appended next"""
+        account = BankAccount.open("11111", "1234", "Personal")
+        account.deposit(5)
+        self.journal.detach()
+        self.journal.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\x20\x00\x01")
+        self.journal = TransactionJournal(self.path, window=0.001)
+        self.journal.attach()
+        account.deposit(7)
+        self.journal.wait()
+        self.assertEqual(replay(self.path)["11111"].funds, 12)
+
+    def test_sync_append_is_durable(self):
+        """Test that a sync append returns only once the record is on disk"""
+        seq = self.journal.append("open", "33333", 0, "Personal", hash_passcode("1111").hex(),
+                                  sync=True)
+        self.assertGreaterEqual(self.journal.durable, seq)
+
+    def test_appends_refused_after_write_error(self):
+        """Test that once a write fails, appends raise instead of being lost"""
+        self.journal.detach()
+        self.journal.close()
+        self.journal = TransactionJournal(self.path, window=0)
+        with patch("os.fsync", side_effect=OSError("disk full")):
+            self.journal.append("deposit", "11111", 100)
+            with self.assertRaisesRegex(OSError, "disk full"):
+                self.journal.wait()
+        with self.assertRaisesRegex(OSError, "disk full"):
+            self.journal.append("deposit", "11111", 100)
+        self.assertEqual(self.journal.durable, 0)
+
+class TestAccountStore(unittest.TestCase):
+    def setUp(self):
+        """Set up a store with two accounts"""
+        self.store = AccountStore(capacity=4)
+        self.store.add("12345", "1234", "Personal", 1000)
+        self.store.add("67890", "5678", "Business", 500)
+
+    def test_view_behaves_like_account(self):
+        """Test that views run the normal BankAccount operations"""
+        account = self.store["12345"]
+        self.assertTrue(account.deposit(500))
+        self.assertEqual(self.store["12345"].funds, 1500)
+        with self.assertRaises(InsufficientFundsError):
+            account.withdraw(5000)
+        account.transfer(300, self.store["67890"])
+        self.assertEqual(self.store["12345"].funds, 1200)
+        self.assertEqual(self.store["67890"].funds, 800)
+        self.assertEqual(self.store["67890"].account_category, "Business")
+
+    def test_assign_bank_account(self):
+        """Test storing a plain BankAccount copies it into the columns"""
+        self.store["11111"] = BankAccount("11111", "2222", "Personal", 50)
+        self.assertIn("11111", self.store)
+        self.assertTrue(self.store["11111"].verify_passcode("2222"))
+        self.assertEqual(len(self.store), 3)
+
+    def test_assign_keeps_exact_balance(self):
+        """Test that an assigned account's balance is copied in cents, not via float"""
+        account = BankAccount("11111", "2222", "Personal", 0)
+        account.balance = (1 << 60) + 1
+        self.store["11111"] = account
+        self.assertEqual(self.store["11111"].balance, (1 << 60) + 1)
+
+    def test_unknown_ids(self):
+        """Test lookups of missing and non-canonical ids"""
+        for account_id in ("99999", "abcde", "", "012345", "-1"):
+            with self.subTest(account_id=account_id):
+                self.assertNotIn(account_id, self.store)
+                self.assertIsNone(self.store.get(account_id))
+                with self.assertRaises(KeyError):
+                    self.store[account_id]
+
+    def test_growth_keeps_rows(self):
+        """Test that every account is still found after the index grows"""
+        for i in range(1000):
+            self.store.add(str(20000 + i), "0000", "Personal", i)
+        self.assertEqual(len(self.store), 1002)
+        for i in range(1000):
+            self.assertEqual(self.store[str(20000 + i)].funds, i)
+
+class TestApplyBatch(unittest.TestCase):
+    def setUp(self):
+        """Set up the same accounts in a store and in a dict"""
+        self.store = AccountStore()
+        self.store.add("11111", "1234", "Personal", 100)
+        self.store.add("22222", "5678", "Business", 50)
+        self.accounts = {
+            "11111": BankAccount("11111", "1234", "Personal", 100),
+            "22222": BankAccount("22222", "5678", "Business", 50),
+        }
+
+    def test_status_codes(self):
+        """Test that each rule of BankAccount maps to a status code"""
+        ops = [
+            ("11111", "deposit", 5000),
+            ("11111", "withdraw", 50000),
+            ("11111", "withdraw", -500),
+            ("11111", "deposit", 0),
+            ("99999", "deposit", 1000),
+            ("11111", "transfer", 1000, "99999"),
+            ("11111", "refund", 1000),
+            ("11111", "deposit", 10.0),
+        ]
+        expected = [posting.OK, posting.INSUFFICIENT_FUNDS, posting.INVALID_INPUT,
+                    posting.INVALID_INPUT, posting.UNKNOWN_ACCOUNT,
+                    posting.UNKNOWN_ACCOUNT, posting.INVALID_INPUT, posting.INVALID_INPUT]
+        for accounts in (self.store, self.accounts):
+            with self.subTest(accounts=type(accounts).__name__):
+                self.assertEqual(list(apply_batch(accounts, ops)), expected)
+                self.assertEqual(accounts["11111"].funds, 150)
+
+    def test_transfers_apply_in_order(self):
+        """Test that transfers to and from one account follow batch order"""
+        ops = [
+            ("22222", "withdraw", 6000),              # fails: only 50.00
+            ("11111", "transfer", 10000, "22222"),
+            ("22222", "withdraw", 6000),              # succeeds after the transfer
+            ("22222", "transfer", 10000, "11111"),    # fails: only 90.00 left
+        ]
+        for accounts in (self.store, self.accounts):
+            with self.subTest(accounts=type(accounts).__name__):
+                status = apply_batch(accounts, ops)
+                self.assertEqual(list(status), [posting.INSUFFICIENT_FUNDS, posting.OK,
+                                                posting.OK, posting.INSUFFICIENT_FUNDS])
+                self.assertEqual(accounts["11111"].funds, 0)
+                self.assertEqual(accounts["22222"].funds, 90)
+
+class TestLimitEngine(unittest.TestCase):
+    RULES = {
+        "Personal": {"withdraw": Rule(100, 0, 0, None), "transfer": Rule(200, 1, 100, 2.5),
+                     "topup": Rule(50, 0, 0, None)},
+        "Business": {"withdraw": Rule(1000, 0, 0, None), "transfer": Rule(5000, 0, 0, None),
+                     "topup": Rule(500, 0, 0, None)},
+    }
+
+    def setUp(self):
+        """Attach an engine with small limits, 4-hour windows in hourly buckets"""
+        self.now = 0.0
+        self.engine = LimitEngine(self.RULES, window=4 * 3600, buckets=4, clock=lambda: self.now)
+        self.engine.attach()
+        self.personal = BankAccount("11111", "1234", "Personal", 10000)
+        self.business = BankAccount("22222", "5678", "Business", 10000)
+
+    def tearDown(self):
+        self.engine.detach()
+
+    def test_limits_by_category(self):
+        """Test that each category has its own limit and the window rolls per bucket"""
+        self.personal.withdraw(60)
+        with self.assertRaisesRegex(LimitExceededError, "Daily withdraw limit exceeded"):
+            self.personal.withdraw(41)
+        self.business.withdraw(600)
+        self.assertEqual(self.personal.funds, 9940)
+        self.now = 3600.0
+        self.personal.withdraw(40)
+        self.now = 4 * 3600.0  # the first withdrawal has left the window
+        self.personal.withdraw(60)
+        with self.assertRaises(LimitExceededError):
+            self.personal.withdraw(1)
+        self.now = 100 * 3600.0
+        self.personal.withdraw(100)
+        self.assertEqual(self.personal.funds, 9740)
+
+    def test_fees(self):
+        """Test that fees are taken with the operation and reported to observers"""
+        observer = Mock()
+        BankAccount.observers = (observer,)
+        try:
+            self.personal.transfer(50, self.business)     # 1.00 + 1% = 1.50
+            self.personal.transfer(149, self.business)    # 1.00 + 1.49, capped at 2.50
+        finally:
+            BankAccount.observers = ()
+        self.assertEqual(self.personal.balance, 1000000 - 19900 - 150 - 249)
+        self.assertEqual(self.business.balance, 1000000 + 19900)
+        fees = [c.args[1:] for c in observer.record.call_args_list if c.args[1] == "fee"]
+        self.assertEqual(fees, [("fee", 150, "transfer"), ("fee", 249, "transfer")])
+        poor = BankAccount("33333", "1234", "Personal", 10)
+        with self.assertRaises(InsufficientFundsError):
+            poor.transfer(10, self.business)  # the fee does not fit
+
+    def test_batch_matches_single_calls(self):
+        """Test that apply_batch enforces the same limits and fees as the methods"""
+        ops = [("11111", "withdraw", 6000), ("11111", "transfer", 5000, "22222"),
+               ("11111", "withdraw", 4100), ("22222", "withdraw", 90000),
+               ("11111", "transfer", 15100, "22222"), ("11111", "withdraw", 3900)]
+        store = AccountStore()
+        store.add("11111", "1234", "Personal", 10000)
+        store.add("22222", "5678", "Business", 10000)
+        statuses = []
+        for accounts in (store, {"11111": self.personal, "22222": self.business}):
+            self.engine.clear()
+            statuses.append(list(apply_batch(accounts, ops)))
+            self.assertEqual((accounts["11111"].balance, accounts["22222"].balance),
+                             (1000000 - 6000 - 5000 - 150 - 3900, 1000000 + 5000 - 90000))
+        self.assertEqual(statuses[0], statuses[1])
+        self.assertEqual(statuses[0], [posting.OK, posting.OK, posting.LIMIT_EXCEEDED,
+                                       posting.OK, posting.LIMIT_EXCEEDED, posting.OK])
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.attach()
+        self.addCleanup(self.metrics.detach)
+        self.account = BankAccount("11111", None, "Personal", 100)
+
+    def test_histogram_percentiles(self):
+        """Test that percentiles are read back within the bucket precision"""
+        for value in (0, 1, 31, 32, 33, 1000, 123456789, 1 << 50):
+            self.assertLessEqual(bucket_floor(bucket_index(value)), value)
+        histogram = Histogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+        for q in (0.5, 0.9, 0.99):
+            self.assertAlmostEqual(histogram.percentile(q), q * 100000, delta=q * 100000 * 0.04)
+        self.assertEqual(histogram.percentile(1.0), 100000)
+        self.assertEqual(histogram.count, 100000)
+
+    def test_counts_errors_and_spans(self):
+        """Test that calls and exceptions are counted and reported to span hooks"""
+        spans = []
+        self.metrics.add_span_hook(lambda *span: spans.append(span))
+        self.account.deposit(10)
+        self.account.withdraw(5)
+        with self.assertRaises(InsufficientFundsError):
+            self.account.withdraw(1000)
+        with self.assertRaises(InvalidInputError):
+            self.account.deposit(-1)
+        self.assertEqual(self.account.funds, 105)
+        withdraw = self.metrics.operations["withdraw"]
+        self.assertEqual((withdraw.calls, withdraw.errors, withdraw.latency.count),
+                         (2, {"InsufficientFundsError": 1}, 2))
+        self.assertEqual([(name, type(error).__name__ if error else None)
+                          for name, _, _, error in spans],
+                         [("deposit", None), ("withdraw", None),
+                          ("withdraw", "InsufficientFundsError"), ("deposit", "InvalidInputError")])
+        self.assertTrue(all(end >= start for _, start, end, _ in spans))
+        text = self.metrics.export()
+        self.assertIn('bank_operations_total{operation="deposit"} 2\n', text)
+        self.assertIn('bank_errors_total{operation="withdraw",error="InsufficientFundsError"} 1\n',
+                      text)
+        self.assertIn('bank_latency_seconds_count{operation="withdraw"} 2\n', text)
+
+    def test_sampling_and_detach(self):
+        """Test that sampling times every Nth call and detach restores the methods"""
+        self.metrics.detach()
+        sampled = Metrics(sample=4)
+        sampled.attach()
+        self.addCleanup(sampled.detach)
+        for _ in range(10):
+            self.account.deposit(1)
+        deposit = sampled.operations["deposit"]
+        self.assertEqual((deposit.calls, deposit.latency.count), (10, 2))
+        self.assertEqual(self.metrics.operations["deposit"].calls, 0)
+        sampled.detach()
+        self.assertFalse(hasattr(BankAccount.deposit, "__wrapped__"))
+        self.assertFalse(hasattr(Authenticator.login, "__wrapped__"))
+
+class TestWorkload(unittest.TestCase):
+    def test_same_seed_same_operations(self):
+        """Test that a workload is fully determined by its arguments"""
+        ops = Workload(100, seed=3).operations(500)
+        self.assertEqual(ops, Workload(100, seed=3).operations(500))
+        self.assertNotEqual(ops, Workload(100, seed=4).operations(500))
+        for kind, source, amount, extra in ops:
+            account = BankAccount(source, None, "Personal", 1000)
+            if kind == "topup":
+                self.assertTrue(account.mobile_topup(amount, extra))
+            elif kind == "transfer":
+                self.assertTrue(account.transfer(amount, BankAccount(extra, None, "Personal")))
+
+    def test_zipf_skew(self):
+        """Test that the hottest item gets a share close to 1/H(n) and skew 0 is uniform"""
+        def top_share(skew):
+            counts = {}
+            for item in Zipf(1000, skew, random.Random(1)).sample(100000):
+                counts[item] = counts.get(item, 0) + 1
+            return max(counts.values()) / 100000
+        self.assertAlmostEqual(top_share(1.0), 1 / sum(1 / k for k in range(1, 1001)), delta=0.01)
+        self.assertLess(top_share(0.0), 0.002)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("deposit=3,transfer=1"), {"deposit": 0.75, "transfer": 0.25})
+        with self.assertRaises(ValueError):
+            parse_mix("steal=1")
+
+class TestMoney(unittest.TestCase):
+    def test_parse_amount(self):
+        """Test parsing decimal text into minor units"""
+        cases = [("12", 1200), ("12.5", 1250), ("12.05", 1205), (" 0.01 ", 1),
+                 ("-3.10", -310), ("+7", 700), (".5", 50), ("5.", 500),
+                 ("-.5", -50), ("-0.05", -5), ("007.30", 730)]
+        for text, cents in cases:
+            with self.subTest(text=text):
+                self.assertEqual(parse_amount(text), cents)
+
+    def test_parse_amount_rejects(self):
+        """Test that malformed text raises ValueError"""
+        for text in ("", ".", "abc", "1.234", "1e3", "1,000", "--1", "١٢",
+                     "-", "+-1", "1_000", "12.-3", "1.+2", "1.2.3"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_amount(text)
+
+    def test_to_minor_and_format(self):
+        """Test conversion of API amounts and formatting for display"""
+        self.assertEqual(to_minor(5), 500)
+        self.assertEqual(to_minor(0.1), 10)
+        self.assertEqual(to_minor(Decimal("19.99")), 1999)
+        with self.assertRaises(ValueError):
+            to_minor(0.001)
+        self.assertEqual(format_amount(123405), "1234.05")
+        self.assertEqual(format_amount(-5), "-0.05")
+
+    def test_no_float_drift(self):
+        """Test that repeated fractional deposits stay exact"""
+        account = BankAccount("12345", "1234", "Personal")
+        for _ in range(1000):
+            account.deposit(0.1)
+        self.assertEqual(account.balance, 10000)
+        account.withdraw("99.99")
+        self.assertEqual(account.balance, 1)
+
+class TestConcurrentLedger(unittest.TestCase):
+    def setUp(self):
+        """Set up a small ledger so that threads collide often"""
+        self.accounts = {str(10000 + i): BankAccount(str(10000 + i), "1234", "Personal", 100)
+                         for i in range(20)}
+        self.ledger = ConcurrentLedger(self.accounts, stripes=8)
+
+    def test_money_conserved_under_threads(self):
+        """Test that concurrent transfers neither create nor lose money"""
+        ids = list(self.accounts)
+        errors = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(2000):
+                    source, target = rng.choice(ids), rng.choice(ids)
+                    try:
+                        self.ledger.transfer(source, target, rng.randint(1, 30))
+                    except InsufficientFundsError:
+                        pass
+            except Exception as e:
+                errors.append(e)
+
+        old_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # force frequent thread switches
+        try:
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(old_interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(a.balance for a in self.accounts.values()), 20 * 10000)
+        self.assertTrue(all(a.balance >= 0 for a in self.accounts.values()))
+
+    def test_failed_credit_rolls_back(self):
+        """Test that a transfer whose deposit side fails leaves the sender intact"""
+        class BrokenAccount(BankAccount):
+            @property
+            def balance(self):
+                return 0
+
+            @balance.setter
+            def balance(self, value):
+                if value:
+                    raise OverflowError("ledger unavailable")
+
+        self.accounts["99999"] = BrokenAccount("99999", "0000", "Business")
+        with self.assertRaises(OverflowError):
+            self.ledger.transfer("10000", "99999", 50)
+        self.assertEqual(self.accounts["10000"].balance, 10000)
+
+    def test_unknown_account(self):
+        """Test transfers to a missing account are rejected"""
+        with self.assertRaises(InvalidInputError):
+            self.ledger.transfer("10000", "55555", 10)
+        self.assertEqual(self.accounts["10000"].balance, 10000)
+
+class TestIdempotencyCache(unittest.TestCase):
+    def setUp(self):
+        """Set up a ledger of 10 accounts with an idempotency cache on a fake clock"""
+        self.now = 0.0
+        self.cache = IdempotencyCache(size=1000, ttl=60.0, clock=lambda: self.now)
+        self.accounts = {str(10000 + i): BankAccount(str(10000 + i), "1234", "Personal", 100)
+                         for i in range(10)}
+        self.ledger = ConcurrentLedger(self.accounts, stripes=4, idempotency=self.cache)
+
+    def test_retries_take_effect_once(self):
+        """Test that concurrent retries of the same requests move money exactly once"""
+        ids = list(self.accounts)
+        requests = [(f"req-{n}", ids[n % 10], ids[(n * 7 + 3) % 10], n % 40 + 1)
+                    for n in range(300)]
+        outcomes = [[] for _ in requests]
+
+        def client(seed):
+            rng = random.Random(seed)
+            order = list(range(len(requests)))
+            rng.shuffle(order)
+            for n in order:
+                request_id, source, target, amount = requests[n]
+                try:
+                    outcome = self.ledger.transfer(source, target, amount, request_id=request_id)
+                except InsufficientFundsError as e:
+                    outcome = e
+                outcomes[n].append(outcome)
+
+        old_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=client, args=(n,)) for n in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(old_interval)
+
+        self.assertEqual((self.cache.executed, self.cache.replayed), (300, 1500))
+        for results in outcomes:
+            self.assertEqual(len(results), 6)
+            self.assertTrue(all(r is results[0] for r in results))
+        # Every balance reflects each successful transfer exactly once
+        expected = dict.fromkeys(ids, 10000)
+        for (_, source, target, amount), results in zip(requests, outcomes):
+            if results[0] is True:
+                expected[source] -= amount * 100
+                expected[target] += amount * 100
+        self.assertEqual({i: a.balance for i, a in self.accounts.items()}, expected)
+
+    def test_outcome_is_replayed(self):
+        """Test that a retry gets the first outcome even after state changed"""
+        with self.assertRaises(InsufficientFundsError):
+            self.ledger.withdraw("10000", 500, request_id="a")
+        self.ledger.deposit("10000", 1000, request_id="b")
+        with self.assertRaises(InsufficientFundsError):
+            self.ledger.withdraw("10000", 500, request_id="a")
+        self.assertTrue(self.ledger.deposit("10000", 1000, request_id="b"))
+        self.assertEqual(self.accounts["10000"].funds, 1100)
+        with self.assertRaises(RequestIdReusedError):
+            self.ledger.deposit("10000", 5, request_id="b")
+
+    def test_unexpected_errors_are_not_cached(self):
+        """Test that a request which failed for another reason runs again on retry"""
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise OSError("journal unavailable")
+            return "done"
+
+        with self.assertRaises(OSError):
+            self.cache.run("x", "op", flaky)
+        self.assertEqual(self.cache.run("x", "op", flaky), "done")
+        self.assertEqual(self.cache.run("x", "op", flaky), "done")
+        self.assertEqual(len(calls), 2)
+
+    def test_expiry_and_size_bound(self):
+        """Test that entries expire after the ttl and the oldest go beyond the size"""
+        self.ledger.deposit("10000", 1, request_id="old")
+        self.now = 61.0
+        self.ledger.deposit("10000", 1, request_id="old")
+        self.assertEqual(self.accounts["10000"].funds, 102)
+        for n in range(1500):
+            self.cache.run(n, None, int)
+        self.assertEqual(len(self.cache), 1000)
+        self.assertEqual(self.cache.run(1499, None, lambda: "again"), 0)
+        self.assertEqual(self.cache.run(0, None, lambda: "again"), "again")
+
+class TestBankService(unittest.TestCase):
+    def setUp(self):
+        """Serve a fresh BankService on a temporary Unix socket"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "bank.sock")
+        self.service = BankService()
+        self.service.accounts["22222"] = BankAccount("22222", "5678", "Business", 500)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_client(self, scenario):
+        async def main():
+            server = await self.service.start(unix_path=self.path)
+            async with server:
+                client = await BankClient.connect(unix_path=self.path)
+                try:
+                    return await scenario(client)
+                finally:
+                    await client.close()
+        return asyncio.run(main())
+
+    def test_pipelined_session(self):
+        """Test a full session sent without waiting for responses"""
+        async def scenario(client):
+            account_id, passcode = await client.call(service.CREATE, "Personal")
+            futures = [
+                client.send(service.LOGIN, account_id, passcode),
+                client.send(service.DEPOSIT, "100.50"),
+                client.send(service.WITHDRAW, "0.50"),
+                client.send(service.TRANSFER, "22222", "30"),
+                client.send(service.TOPUP, "17123456", "20"),
+                client.send(service.BALANCE),
+            ]
+            return [await f for f in futures]
+
+        results = self.run_client(scenario)
+        self.assertEqual([status for status, _ in results], [service.OK] * 6)
+        self.assertEqual(results[-1][1], ["50.00"])
+        self.assertEqual(self.service.accounts["22222"].balance, 53000)
+
+    def test_error_statuses(self):
+        """Test that each failure is reported as a status, not a dropped connection"""
+        async def scenario(client):
+            results = [await client.send(service.BALANCE),
+                       await client.send(service.LOGIN, "22222", "0000"),
+                       await client.send(service.LOGIN, "22222", "5678"),
+                       await client.send(service.WITHDRAW, "1000"),
+                       await client.send(service.DEPOSIT, "abc"),
+                       await client.send(service.TOPUP, "12345678", "1"),
+                       await client.send(99)]
+            return [status for status, _ in results]
+
+        self.assertEqual(self.run_client(scenario), [
+            service.NOT_LOGGED_IN, service.AUTH_FAILED, service.OK,
+            service.INSUFFICIENT_FUNDS, service.INVALID_INPUT,
+            service.INVALID_INPUT, service.BAD_REQUEST])
+
+    def test_login_does_not_block_other_clients(self):
+        """Test that passcode checks run off the event loop, in order per connection"""
+        def slow_verify(record, passcode):
+            time.sleep(0.3)
+            return auth.verify_passcode(record, passcode)
+
+        async def scenario(client):
+            other = await BankClient.connect(unix_path=self.path)
+            try:
+                login = client.send(service.LOGIN, "22222", "5678")
+                balance = client.send(service.BALANCE)
+                await asyncio.sleep(0.05)
+                await other.send(service.BALANCE)
+                waiting = login.done()
+                return waiting, await login, await balance
+            finally:
+                await other.close()
+
+        with patch("service.verify_passcode", slow_verify):
+            waiting, login, balance = self.run_client(scenario)
+        self.assertFalse(waiting)
+        self.assertEqual(login[0], service.OK)
+        self.assertEqual(balance, (service.OK, ["500.00"]))
+
+    def test_malformed_frames(self):
+        """Test that short or truncated frames get BAD_REQUEST and the connection lives on"""
+        async def scenario(client):
+            writer = client.writer
+            writer.write(service.LENGTH.pack(2) + b"\x01\x00")
+            body = service.HEADER.pack(7, service.LOGIN) + service.FIELD.pack(10) + b"22222"
+            writer.write(service.LENGTH.pack(len(body)) + body)
+            body = service.HEADER.pack(8, service.LOGIN) + b"\x05"
+            writer.write(service.LENGTH.pack(len(body)) + body)
+            body = service.HEADER.pack(9, service.LOGIN) + service.FIELD.pack(2) + b"\xff\xfe"
+            writer.write(service.LENGTH.pack(len(body)) + body)
+            futures = {request_id: asyncio.get_running_loop().create_future()
+                       for request_id in (0, 7, 8, 9)}
+            client._waiting.update(futures)
+            balance = await client.send(service.BALANCE)
+            return [(await futures[i])[0] for i in (0, 7, 8, 9)], balance[0]
+
+        statuses, balance = self.run_client(scenario)
+        self.assertEqual(statuses, [service.BAD_REQUEST] * 4)
+        self.assertEqual(balance, service.NOT_LOGGED_IN)
+
+    def test_retried_request_id(self):
+        """Test that a request id resent on a new connection does not run twice"""
+        async def scenario(client):
+            await client.call(service.LOGIN, "22222", "5678")
+            await client.call(service.DEPOSIT, "10", "r1")
+            await client.call(service.DEPOSIT, "10", "r1")
+            retry = await BankClient.connect(unix_path=self.path)
+            try:
+                await retry.call(service.LOGIN, "22222", "5678")
+                await retry.call(service.DEPOSIT, "10", "r1")
+                reused = await retry.send(service.WITHDRAW, "10", "r1")
+                await retry.call(service.DEPOSIT, "10", "r2")
+            finally:
+                await retry.close()
+            return reused[0]
+
+        self.assertEqual(self.run_client(scenario), service.INVALID_INPUT)
+        self.assertEqual(self.service.accounts["22222"].funds, 520)
+
+class TestShardedLedger(unittest.TestCase):
+    def setUp(self):
+        """Start three journaled shards with a dozen accounts"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = ShardedLedger(3, journal_dir=self.tmp.name)
+        self.ids = [str(10000 + i) for i in range(12)]
+        for account_id in self.ids:
+            self.ledger.open_account(account_id, "1234", "Personal", 10000)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp.cleanup()
+
+    def test_routing_and_transfer(self):
+        """Test single-shard operations and a cross-shard transfer"""
+        source = self.ids[0]
+        target = next(i for i in self.ids if self.ledger.shard(i) != self.ledger.shard(source))
+        self.ledger.deposit(source, 500)
+        self.ledger.transfer(source, target, 2500)
+        self.assertEqual(self.ledger.balance(source), 8000)
+        self.assertEqual(self.ledger.balance(target), 12500)
+        with self.assertRaises(InsufficientFundsError):
+            self.ledger.transfer(source, target, 999999)
+        with self.assertRaises(InvalidInputError):
+            self.ledger.transfer(source, "99999", 100)
+        self.assertEqual(self.ledger.totals(), (120500, 0))
+
+    def test_conservation_with_crashes(self):
+        """Test that killing shards mid-transfer never creates or loses money"""
+        # A shard dying during a batch fails only its own commands
+        first = next(i for i in self.ids if self.ledger.shard(i) == 0)
+        second = next(i for i in self.ids if self.ledger.shard(i) == 1)
+        self.ledger.crash_on(0, "deposit")
+        results = self.ledger.run_batch([("deposit", first, 100), ("deposit", second, 100)])
+        self.assertEqual(results[0][0], sharding.SHARD_UNAVAILABLE)
+        self.assertEqual(results[1][0], sharding.OK)
+        self.assertEqual(self.ledger.balance(second), 10100)
+        self.assertEqual(self.ledger.balance(first), 10000)
+        self.ledger.withdraw(second, 100)
+
+        rng = random.Random(7)
+        phases = ["prepare_debit", "prepare_credit", "commit_credit", "commit_debit"]
+        failures = 0
+        for n in range(120):
+            if n % 10 == 0:
+                self.ledger.crash_on(rng.randrange(3), rng.choice(phases))
+            try:
+                self.ledger.transfer(rng.choice(self.ids), rng.choice(self.ids),
+                                     rng.randint(1, 5000))
+            except (ShardUnavailableError, InsufficientFundsError):
+                failures += 1
+        self.assertEqual(self.ledger.totals(), (120000, 0))
+        self.assertGreater(failures, 0)
+
+class TestIdAllocator(unittest.TestCase):
+    def test_exhausts_space_without_repeats(self):
+        """Test that the allocator yields every id in its space exactly once"""
+        allocator = IdAllocator(10000, 12000)
+        ids = [allocator.allocate() for _ in range(1000)]
+        ids.extend(allocator.reserve(1000))
+        self.assertEqual(sorted(int(i) for i in ids), list(range(10000, 12000)))
+        with self.assertRaises(IdSpaceExhaustedError):
+            allocator.allocate()
+
+    def test_cursor_persists(self):
+        """Test that a restarted allocator never reissues an id"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ids.json")
+            first = IdAllocator(state_path=path)
+            issued = {first.allocate() for _ in range(100)}
+            second = IdAllocator(state_path=path)
+            self.assertEqual(second.key, first.key)
+            self.assertTrue(issued.isdisjoint(second.allocate() for _ in range(100)))
+
+    def test_skips_existing_accounts(self):
+        """Test that ids already present in the accounts are not handed out"""
+        taken = IdAllocator(key=5).allocate()
+        accounts = {taken: BankAccount(taken, "1234", "Personal")}
+        self.assertNotEqual(IdAllocator(key=5).allocate_unused(accounts), taken)
+
+class TestAuthenticator(unittest.TestCase):
+    def setUp(self):
+        """Set up accounts and an authenticator driven by a fake clock"""
+        self.now = 1000.0
+        self.auth = Authenticator(cache_ttl=60, clock=lambda: self.now)
+        self.accounts = {"11111": BankAccount("11111", "2222", "Personal")}
+
+    def test_passcode_is_not_stored(self):
+        """Test that the account keeps only a salted hash"""
+        other = BankAccount("22222", "2222", "Personal")
+        self.assertNotIn(b"2222", self.accounts["11111"].passcode_hash)
+        self.assertNotEqual(self.accounts["11111"].passcode_hash, other.passcode_hash)
+
+    def test_cache_skips_kdf_until_expiry(self):
+        """Test that repeat logins are served from the cache within the TTL"""
+        self.auth.login(self.accounts, "11111", "2222")
+        with patch('auth.verify_passcode') as mock_verify:
+            self.auth.login(self.accounts, "11111", "2222")
+            mock_verify.assert_not_called()
+            self.now += 61
+            mock_verify.return_value = True
+            self.auth.login(self.accounts, "11111", "2222")
+            mock_verify.assert_called_once()
+
+    def test_passcode_change_invalidates_cache(self):
+        """Test that the old passcode stops working after a change"""
+        self.auth.login(self.accounts, "11111", "2222")
+        self.accounts["11111"].change_password("3333")
+        with self.assertRaises(AuthenticationError):
+            self.auth.login(self.accounts, "11111", "2222")
+        self.assertIs(self.auth.login(self.accounts, "11111", "3333"), self.accounts["11111"])
+
+    def test_brute_force_backoff(self):
+        """Test that repeated failures block the account with growing delays"""
+        for passcode in ("0000", "0001", "0002"):
+            with self.assertRaises(AuthenticationError):
+                self.auth.login(self.accounts, "11111", passcode)
+        with self.assertRaises(TooManyAttemptsError) as blocked:
+            self.auth.login(self.accounts, "11111", "2222")
+        first_wait = blocked.exception.retry_after
+        self.now += first_wait
+        with self.assertRaises(AuthenticationError):
+            self.auth.login(self.accounts, "11111", "0003")
+        with self.assertRaises(TooManyAttemptsError) as blocked:
+            self.auth.login(self.accounts, "11111", "2222")
+        self.assertGreater(blocked.exception.retry_after, first_wait)
+
+    def test_source_throttled_across_accounts(self):
+        """Test that one source guessing many accounts gets blocked"""
+        table = AttemptTable(free_attempts=5)
+        auth = Authenticator(sources_table=table, clock=lambda: self.now)
+        for n in range(5):
+            with self.assertRaises(AuthenticationError):
+                auth.login(self.accounts, str(20000 + n), "0000", source="10.0.0.9")
+        with self.assertRaises(TooManyAttemptsError):
+            auth.login(self.accounts, "11111", "2222", source="10.0.0.9")
+        self.assertIs(auth.login(self.accounts, "11111", "2222", source="10.0.0.1"),
+                      self.accounts["11111"])
+
+class TestTransactionHistory(unittest.TestCase):
+    def setUp(self):
+        """Record into a history driven by a fake clock"""
+        self.now = 100.0
+        self.history = TransactionHistory(clock=lambda: self.now)
+        self.history.attach()
+        self.alice = BankAccount("11111", "1234", "Personal", 100)
+        self.bob = BankAccount("22222", "5678", "Business")
+
+    def tearDown(self):
+        self.history.detach()
+
+    def tick(self):
+        self.now += 10
+
+    def test_records_each_operation(self):
+        """Test that every kind of operation lands in the right statements"""
+        self.alice.deposit(50)
+        self.tick()
+        self.alice.transfer(30, self.bob)
+        self.tick()
+        self.alice.mobile_topup(20, "77123456")
+        with self.assertRaises(InsufficientFundsError):
+            self.alice.withdraw(1000)
+
+        entries = self.history.statement("11111", newest_first=False)
+        self.assertEqual([(e.kind, e.amount, e.balance) for e in entries],
+                         [("deposit", 5000, 15000), ("transfer", -3000, 12000),
+                          ("topup", -2000, 10000)])
+        self.assertEqual(entries[1].counterparty, "22222")
+        self.assertEqual(self.history.statement("22222")[0][1:],
+                         ("receive", 3000, 3000, "11111"))
+
+    def test_batch_entries_have_running_balances(self):
+        """Test that each row of an apply_batch records the balance it left"""
+        ops = [("11111", "deposit", 10000), ("11111", "withdraw", 3000),
+               ("11111", "transfer", 500, "22222"), ("11111", "deposit", 500)]
+        store = AccountStore()
+        store.add("11111", "1234", "Personal", 0)
+        store.add("22222", "5678", "Business", 0)
+        self.history.detach()
+        for accounts in (store, {"11111": self.alice, "22222": self.bob}):
+            with self.subTest(accounts=type(accounts).__name__):
+                history = TransactionHistory()
+                history.attach()
+                try:
+                    start = accounts["11111"].balance
+                    apply_batch(accounts, ops)
+                finally:
+                    history.detach()
+                entries = history.statement("11111", newest_first=False)
+                self.assertEqual([e.balance - start for e in entries], [10000, 7000, 6500, 7000])
+                self.assertEqual(history.statement("22222")[0].balance, 500)
+
+    def test_pages_and_ranges(self):
+        """Test pagination, date ranges and balances at a point in time"""
+        for _ in range(45):
+            self.alice.deposit(1)
+            self.tick()
+        self.bob.deposit(1)
+        self.assertEqual(self.history.count("11111"), 45)
+        newest = self.history.statement("11111", page=0, page_size=20)
+        self.assertEqual(newest[0].balance, 14500)
+        self.assertEqual(len(self.history.statement("11111", page=2, page_size=20)), 5)
+        self.assertEqual(self.history.statement("11111", page=3, page_size=20), [])
+
+        in_range = self.history.between("11111", 200.0, 300.0)
+        self.assertEqual([e.timestamp for e in in_range], [200.0 + 10 * i for i in range(10)])
+        self.assertIsNone(self.history.balance_at("11111", 99.0))
+        self.assertEqual(self.history.balance_at("11111", 105.0), 10100)
+        self.assertEqual(self.history.balance_at("11111", 1e9), 14500)
+
+class TestBalanceAggregates(unittest.TestCase):
+    def setUp(self):
+        """Track a few accounts opened with the aggregates attached"""
+        self.aggregates = BalanceAggregates(load=2)
+        self.aggregates.attach()
+        self.alice = BankAccount.open("11111", "1234", "Personal", 100)
+        self.bob = BankAccount.open("22222", "5678", "Business", 50)
+        self.carol = BankAccount.open("33333", "0000", "Personal")
+
+    def tearDown(self):
+        self.aggregates.detach()
+
+    def test_follows_each_operation(self):
+        """Test that totals, categories and ranks move with every mutation"""
+        self.alice.transfer(30, self.bob)
+        self.carol.deposit(200)
+        self.alice.mobile_topup(20, "77123456")
+        self.bob.withdraw(5)
+        with self.assertRaises(InsufficientFundsError):
+            self.alice.withdraw(1000)
+
+        self.assertEqual(self.aggregates.total, 32500)
+        self.assertEqual(self.aggregates.by_category(),
+                         {"Personal": (2, 25000), "Business": (1, 7500)})
+        self.assertEqual(self.aggregates.top(2), [("33333", 20000), ("22222", 7500)])
+        self.assertEqual(self.aggregates.bottom(1), [("11111", 5000)])
+        self.assertEqual(self.aggregates.percentile(0.5), 7500)
+        self.assertEqual(self.aggregates.flows["deposit"], 20000)
+        self.assertEqual(self.aggregates.flows["transfer"], self.aggregates.flows["receive"])
+
+    def test_load_catches_up_with_a_store(self):
+        """Test that load picks up accounts and balances changed without observers"""
+        store = AccountStore()
+        for i in range(20):
+            store.add(str(40000 + i), "1234", "Business", i)
+        store.balances[0] = 99900
+        self.aggregates.load(store)
+        self.aggregates.load(store)
+        store.balances[1] = 50
+        self.aggregates.load(store)
+        self.assertEqual(len(self.aggregates), 23)
+        self.assertEqual(self.aggregates.total, 15000 + sum(store.balances))
+        self.assertEqual(self.aggregates.top(1), [("40000", 99900)])
+        self.assertEqual(self.aggregates.percentile(0), 0)
+        self.assertEqual(self.aggregates.percentile(1), 99900)
+
+    def test_sorted_keys_match_a_sorted_list(self):
+        """Test SortedKeys against a plain sorted list under random inserts and removals"""
+        rng = random.Random(3)
+        keys, expected = SortedKeys(load=4), []
+        for _ in range(2000):
+            if expected and rng.random() < 0.4:
+                key = rng.choice(expected)
+                expected.remove(key)
+                keys.remove(key)
+            else:
+                key = rng.randint(-50, 50)
+                expected.append(key)
+                keys.add(key)
+            expected.sort()
+            if expected:
+                i = rng.randrange(len(expected))
+                self.assertEqual((keys[i], keys[-1]), (expected[i], expected[-1]))
+        self.assertEqual(list(keys), expected)
+        self.assertEqual(list(reversed(keys)), expected[::-1])
+        with self.assertRaises(KeyError):
+            keys.remove(1000)
+
+class TestBulkIO(unittest.TestCase):
+    def setUp(self):
+        """Set up accounts with some history in a temporary directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = TransactionHistory()
+        self.history.attach()
+        self.accounts = {str(10000 + i): BankAccount.open(str(10000 + i), "1234",
+                                                          ("Personal", "Business")[i % 2], i)
+                         for i in range(10)}
+        self.accounts["10001"].transfer(0.5, self.accounts["10002"])
+        self.accounts["10003"].mobile_topup(1, "17123456")
+        self.history.detach()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_round_trip(self):
+        """Test that accounts and history come back unchanged from both formats"""
+        for name in ("accounts.csv", "accounts.bin"):
+            self.assertEqual(bulk_io.export_accounts(self.accounts, self.path(name)), 10)
+            store = AccountStore()
+            report = bulk_io.import_accounts(self.path(name), store, chunk_rows=3)
+            self.assertEqual(report, (10, 10, []))
+            for account_id, account in self.accounts.items():
+                self.assertEqual((store[account_id].balance, store[account_id].account_category,
+                                  store[account_id].passcode_hash),
+                                 (account.balance, account.account_category,
+                                  account.passcode_hash))
+            # Exporting the store gives the same file back
+            bulk_io.export_accounts(store, self.path("again_" + name))
+            with open(self.path(name), "rb") as a, open(self.path("again_" + name), "rb") as b:
+                self.assertEqual(a.read(), b.read())
+        for name in ("history.csv", "history.bin"):
+            self.assertEqual(bulk_io.export_history(self.history, self.path(name)), 13)
+            restored = TransactionHistory()
+            self.assertEqual(bulk_io.import_history(self.path(name), restored, chunk_rows=4),
+                             (13, 13, []))
+            self.assertEqual(list(restored.entries()), list(self.history.entries()))
+
+    def test_reports_bad_rows(self):
+        """Test that each bad row is skipped with its code and the rest are imported"""
+        good_hash = hash_passcode("1234").hex()
+        with open(self.path("accounts.csv"), "w") as f:
+            f.write("account_id,category,balance,passcode_hash\n"
+                    f"10000,Personal,5.00,{good_hash}\n"
+                    f"01,Personal,5.00,{good_hash}\n"
+                    f"20000,Savings,5.00,{good_hash}\n"
+                    f"20001,Business,-1,{good_hash}\n"
+                    "20002,Business,1,abc\n"
+                    "20003,Business\n"
+                    f"20004,Business,0,{good_hash}\n")
+        report = bulk_io.import_accounts(self.path("accounts.csv"), self.accounts)
+        self.assertEqual(report.errors, [(1, validation.DUPLICATE_ACCOUNT),
+                                         (2, validation.INVALID_ACCOUNT_ID),
+                                         (3, validation.INVALID_CATEGORY),
+                                         (4, validation.NON_POSITIVE_AMOUNT),
+                                         (5, validation.INVALID_PASSCODE_HASH),
+                                         (6, validation.MALFORMED_ROW)])
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(self.accounts["20004"].balance, 0)
+
+        bulk_io.export_accounts(self.accounts, self.path("accounts.bin"))
+        with open(self.path("accounts.bin"), "r+b") as f:
+            f.truncate(os.path.getsize(self.path("accounts.bin")) - 1)
+        report = bulk_io.import_accounts(self.path("accounts.bin"), {})
+        self.assertEqual(report, (11, 10, [(11, validation.MALFORMED_ROW)]))
+
+    def test_out_of_range_rows(self):
+        """Test that ids and balances beyond int64 are row errors, not crashes"""
+        good_hash = hash_passcode("1234").hex()
+        with open(self.path("accounts.csv"), "w") as f:
+            f.write("account_id,category,balance,passcode_hash\n"
+                    f"20000,Personal,99999999999999999999,{good_hash}\n"
+                    f"99999999999999999999999,Personal,1,{good_hash}\n"
+                    f"9223372036854775808,Personal,1,{good_hash}\n"
+                    f"9223372036854775807,Personal,1,{good_hash}\n")
+        store = AccountStore()
+        report = bulk_io.import_accounts(self.path("accounts.csv"), store)
+        self.assertEqual(report, (4, 1, [(1, validation.INVALID_AMOUNT),
+                                         (2, validation.INVALID_ACCOUNT_ID),
+                                         (3, validation.INVALID_ACCOUNT_ID)]))
+        self.assertEqual(store["9223372036854775807"].balance, 100)
+
+    def test_onboarding_passcodes(self):
+        """Test that a passcode column is validated and hashed on import"""
+        with open(self.path("new.csv"), "w") as f:
+            f.write("account_id,category,balance,passcode\n"
+                    "30000,Business,12.50,4321\n"
+                    "30001,Personal,1,12a4\n")
+        accounts = {}
+        report = bulk_io.import_accounts(self.path("new.csv"), accounts)
+        self.assertEqual(report.errors, [(2, validation.INVALID_PASSCODE)])
+        self.assertTrue(accounts["30000"].verify_passcode("4321"))
+        self.assertEqual(accounts["30000"].balance, 1250)
+
+class TestAccrual(unittest.TestCase):
+    def setUp(self):
+        """Set up a mix of Personal and Business accounts and a state file"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp.name, "accrual.json")
+        self.accounts = {}
+        for i in range(10):
+            category = "Business" if i % 3 == 0 else "Personal"
+            self.accounts[str(10000 + i)] = BankAccount(str(10000 + i), "1234", category,
+                                                        1000 * i + 0.07)
+        self.before = {k: a.balance for k, a in self.accounts.items()}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def expected(self, account_id):
+        balance = self.before[account_id]
+        if self.accounts[account_id].account_category == "Business":
+            return balance - min(5000, balance)
+        return balance + (balance * 250 + 60000) // 120000
+
+    def test_postings_and_rounding(self):
+        """Test that interest is rounded half up to a cent and fees never overdraw"""
+        history = TransactionHistory()
+        history.attach()
+        try:
+            accrual = AccrualPass(self.accounts, "2026-10", chunk_rows=3, pause=None)
+            self.assertTrue(accrual.run())
+        finally:
+            history.detach()
+        for account_id, account in self.accounts.items():
+            self.assertEqual(account.balance, self.expected(account_id))
+        self.assertEqual(self.accounts["10000"].balance, 0)  # fee capped at the 7 cents there
+        self.assertEqual(accrual.fees, 3 * 5000 + 7)
+        self.assertEqual(history.statement("10001")[0][1:4], ("interest", 208, 100215))
+
+    def test_interrupted_pass_charges_once(self):
+        """Test that stopping, and dying mid-chunk, never charge an account twice"""
+        accrual = AccrualPass(self.accounts, "2026-10", self.state_path, chunk_rows=2,
+                              pause=None, fsync=False)
+
+        class StopAfterFirst:
+            def record(self, account, kind, amount, detail=None):
+                accrual.stop()
+
+        BankAccount.observers = (StopAfterFirst(),)
+        try:
+            self.assertFalse(accrual.run())
+        finally:
+            BankAccount.observers = ()
+        self.assertEqual(accrual.next_chunk, 1)
+
+        class Crash:
+            def record(self, account, kind, amount, detail=None):
+                if account.account_id == "10004":
+                    raise RuntimeError("power cut")
+
+        BankAccount.observers = (Crash(),)
+        try:
+            with self.assertRaises(RuntimeError):
+                AccrualPass(self.accounts, "2026-10", self.state_path, chunk_rows=2,
+                            pause=None, fsync=False).run()
+        finally:
+            BankAccount.observers = ()
+
+        resumed = AccrualPass(self.accounts, "2026-10", self.state_path, chunk_rows=2,
+                              workers=2, pause=None, fsync=False)
+        self.assertEqual(resumed.unconfirmed, [2])
+        self.assertTrue(resumed.run())
+        # The chunk that died is left for reconciliation rather than redone
+        self.assertEqual(self.accounts["10005"].balance, self.before["10005"])
+        for account_id, account in self.accounts.items():
+            if account_id != "10005":
+                self.assertEqual(account.balance, self.expected(account_id), account_id)
+        again = AccrualPass(self.accounts, "2026-10", self.state_path, chunk_rows=2)
+        self.assertTrue(again.complete)
+
+    def test_scheduler_runs_each_period_once(self):
+        """Test that the scheduler accrues again only when the period changes"""
+        store = AccountStore()
+        store.add("20000", "1234", "Personal", 1200)
+        self.now = 1790000000.0  # 2026-09
+        scheduler = AccrualScheduler(store, self.state_path, clock=lambda: self.now,
+                                     pause=None, fsync=False)
+        scheduler.run_once()
+        scheduler.run_once()
+        self.assertEqual(store["20000"].balance, 120250)
+        self.now += 31 * 86400
+        self.assertEqual(scheduler.run_once().period, "2026-10")
+        self.assertEqual(store["20000"].balance, 120250 + 251)
+
+class FakeRoot:
+    """Stands in for Tk: after() callbacks run when pump() is called"""
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+
+    def pump(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.001)
+            self.pending.pop(0)()
+
+class TestCommandDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.root = FakeRoot()
+        self.busy = []
+        self.dispatcher = CommandDispatcher(self.root, workers=2, on_busy=self.busy.append)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.dispatcher.close()
+
+    def slow_deposit(self, account):
+        """A backend call that blocks until the test lets it finish"""
+        def operation():
+            self.release.wait(5)
+            return account.deposit(10)
+        return operation
+
+    def test_slow_operation_does_not_block(self):
+        """Test that submit returns at once and results arrive on the calling thread"""
+        account = BankAccount("12345", "1234", "Personal", 0)
+        results = []
+        start = time.perf_counter()
+        self.dispatcher.submit(("deposit", "12345"), self.slow_deposit(account),
+                               lambda r: results.append((r, threading.current_thread())))
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(self.busy, [True])
+        self.assertTrue(self.dispatcher.busy)
+
+        self.release.set()
+        self.root.pump()
+        self.assertEqual(results, [(True, threading.main_thread())])
+        self.assertEqual(account.balance, 1000)
+        self.assertEqual(self.busy, [True, False])
+        self.assertFalse(self.root.pending)
+
+    def test_repeated_submit_is_dropped(self):
+        """Test that a key already in flight is not submitted twice"""
+        account = BankAccount("12345", "1234", "Personal", 0)
+        key = ("deposit", "12345")
+        self.assertTrue(self.dispatcher.submit(key, self.slow_deposit(account)))
+        self.assertFalse(self.dispatcher.submit(key, self.slow_deposit(account)))
+        self.assertTrue(self.dispatcher.submit(("deposit", "67890"), lambda: None))
+        self.release.set()
+        self.root.pump()
+        self.assertEqual(account.balance, 1000)
+        self.assertTrue(self.dispatcher.submit(key, self.slow_deposit(account)))
+        self.root.pump()
+        self.assertEqual(account.balance, 2000)
+
+    def test_errors_reach_the_error_callback(self):
+        """Test that an exception in the worker is handed to on_error"""
+        account = BankAccount("12345", "1234", "Personal", 0)
+        errors = []
+        self.dispatcher.submit("withdraw", lambda: account.withdraw(10), None, errors.append)
+        self.root.pump()
+        self.assertIsInstance(errors[0], InsufficientFundsError)
+
+    def test_failing_callback_is_reported(self):
+        """Test that a callback that raises is reported and later commands still finish"""
+        reported = []
+        self.root.report_callback_exception = lambda *exc: reported.append(exc[1])
+        results = []
+
+        def on_error(error):
+            raise OSError("journal write failed")
+
+        self.release.set()
+        self.dispatcher.submit("first", lambda: 1 / 0, None, on_error)
+        self.dispatcher.submit("second", lambda: 2, results.append)
+        self.root.pump()
+        self.assertEqual(results, [2])
+        self.assertIsInstance(reported[0], OSError)
+        self.assertFalse(self.dispatcher.busy)
+        self.assertEqual(self.busy, [True, False])
+        self.assertTrue(self.dispatcher.submit("first", lambda: 3, results.append))
+        self.root.pump()
+        self.assertEqual(results, [2, 3])
+
+    def test_inline_mode(self):
+        """Test that workers=0 runs the operation and callback before returning"""
+        dispatcher = CommandDispatcher(self.root, workers=0)
+        results = []
+        dispatcher.submit("key", lambda: 42, results.append)
+        self.assertEqual(results, [42])
+        self.assertFalse(dispatcher.busy)
+
+class TestTopupGateway(unittest.TestCase):
+    def setUp(self):
+        self.accounts = [BankAccount(str(10000 + i), "1234", "Personal", 100) for i in range(10)]
+
+    def run_topups(self, operator, count, **options):
+        """Top up count numbers across both operators and wait for the results"""
+        results = []
+
+        async def main():
+            gateway = TopupGateway(operator, backoff=0.001,
+                                   on_result=lambda r, ok: results.append(ok), **options)
+            await gateway.start()
+            gateway.attach()
+            try:
+                for i in range(count):
+                    prefix = "17" if i % 2 else "77"
+                    self.accounts[i % 10].mobile_topup("1.25", f"{prefix}{i:06d}")
+            finally:
+                gateway.detach()
+                await gateway.close()
+            return gateway
+        return asyncio.run(main()), results
+
+    def total(self):
+        return sum(account.balance for account in self.accounts)
+
+    def test_batches_per_operator(self):
+        """Test that queued top-ups go out in one batch per prefix"""
+        operator = OperatorSimulator(latency=0.001)
+        gateway, results = self.run_topups(operator, 40)
+        self.assertEqual(operator.calls, 2)
+        self.assertEqual((gateway.delivered, gateway.refunded), (40, 0))
+        self.assertEqual(sum(operator.credited.values()), 40 * 125)
+        self.assertEqual(self.total(), 10 * 10000 - 40 * 125)
+        self.assertEqual(len(results), 40)
+
+    def test_failed_batches_are_refunded(self):
+        """Test that a batch is refunded once its retries run out"""
+        operator = OperatorSimulator(latency=0, lost_reply_rate=1.0, seed=1)
+        gateway, results = self.run_topups(operator, 20, retries=2)
+        self.assertEqual(operator.calls, 2 * (3 + 1))
+        self.assertEqual((gateway.delivered, gateway.refunded), (0, 20))
+        self.assertEqual(sum(operator.credited.values()), 0)
+        self.assertEqual(self.total(), 10 * 10000)
+
+    def test_retries_apply_each_key_once(self):
+        """Test that lost replies and rejections never create or destroy money"""
+        operator = OperatorSimulator(latency=0, failure_rate=0.3, lost_reply_rate=0.3,
+                                     reject_rate=0.1, seed=7)
+        gateway, results = self.run_topups(operator, 200, max_batch=8, retries=4)
+        self.assertEqual(gateway.delivered + gateway.refunded, 200)
+        self.assertEqual(len(operator.results), 200)
+        self.assertEqual(sum(operator.credited.values()), gateway.delivered * 125)
+        self.assertEqual(self.total(), 10 * 10000 - gateway.delivered * 125)
+
+    def test_timed_out_batches_are_voided(self):
+        """Test that a batch that keeps timing out is voided and then refunded"""
+        class SlowSends(OperatorSimulator):
+            async def send_batch(self, prefix, items):
+                await asyncio.sleep(0.5)
+                return await super().send_batch(prefix, items)
+
+        gateway, results = self.run_topups(SlowSends(latency=0), 4, timeout=0.01, retries=1)
+        self.assertEqual(results, [False] * 4)
+        self.assertEqual(self.total(), 10 * 10000)
+
+    def test_unconfirmed_voids_stay_unresolved(self):
+        """Test that nothing is refunded while the operator cannot confirm a void"""
+        gateway, results = self.run_topups(OperatorSimulator(latency=0.5), 4,
+                                           timeout=0.01, retries=1)
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(len(gateway.unresolved), 4)
+        self.assertEqual(self.total(), 10 * 10000 - 4 * 125)
+
+class TestValidation(unittest.TestCase):
+    AMOUNTS = ["12", "12.", ".5", "0.29", "+3.1", " 7 ", "\t9.99\r", "00012.30", "-0.05", "0",
+               "-0", "0.00", "", ".", "+", "1.234", "1e3", "--1", "- 5", "1,000", "1_000",
+               "nan", "abc", "12.5x", "#12", "\u0661\u0662", "12345678901234567.89"]
+
+    def test_amount_column_matches_parse_amount(self):
+        """Test that batch amount codes and cents agree with parse_amount"""
+        for column in (self.AMOUNTS, self.AMOUNTS[:10], self.AMOUNTS + [5, "7\n8"]):
+            codes, cents = validation.check_amounts(column)
+            for text, code, value in zip(column, codes, cents):
+                with self.subTest(text=text):
+                    try:
+                        expected = parse_amount(text)
+                    except (ValueError, AttributeError):
+                        expected_code, expected = validation.INVALID_AMOUNT, 0
+                    else:
+                        expected_code = (validation.OK if expected > 0
+                                         else validation.NON_POSITIVE_AMOUNT)
+                    self.assertEqual((code, value), (expected_code, expected))
+                    self.assertEqual(validation.check_amount(text), (expected_code, expected))
+
+    def test_amounts_out_of_range(self):
+        """Test that amounts beyond int64 cents are reported, not raised"""
+        codes, cents = validation.check_amounts(["1" * 30, "-" + "9" * 20, "92233720368547758.07",
+                                                 "92233720368547758.08", "5"])
+        self.assertEqual(list(codes), [validation.INVALID_AMOUNT] * 2 + [validation.OK,
+                                       validation.INVALID_AMOUNT, validation.OK])
+        self.assertEqual(list(cents), [0, 0, (1 << 63) - 1, 0, 500])
+
+    def test_mobile_and_passcode_columns(self):
+        """Test column checks against the single-value checks"""
+        mobiles = ["17123456", "77999999", "27123456", "1712345", "171234567", "17\u0661" * 2,
+                   "", "77abc456"]
+        self.assertEqual(list(validation.check_mobiles(mobiles)),
+                         [0, 0] + [validation.INVALID_MOBILE] * 6)
+        self.assertEqual(list(validation.check_mobiles(mobiles + [None]))[-1],
+                         validation.INVALID_MOBILE)
+        passcodes = ["1234", "0000", "123", "12345", "abcd", "\u0661\u0662\u0663\u0664"]
+        self.assertEqual(list(validation.check_passcodes(passcodes)),
+                         [validation.check_passcode(p) for p in passcodes])
+
+    def test_first_errors(self):
+        """Test that each row reports the code of its first failing column"""
+        combined = validation.first_errors(bytes([0, 1, 0, 2]), bytes([3, 3, 0, 0]),
+                                           bytes([4, 0, 0, 4]))
+        self.assertEqual(list(combined), [3, 1, 0, 2])
+
+    def test_account_methods_use_messages(self):
+        """Test that BankAccount raises the validation messages"""
+        account = BankAccount("12345", "1234", "Personal", 1000)
+        with self.assertRaisesRegex(InvalidInputError, "Invalid mobile number"):
+            account.mobile_topup(10, "27123456")
+        with self.assertRaisesRegex(InvalidInputError, "Passcode must be 4 digits"):
+            account.change_password("12a4")
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        """Set up a journaled store of 50 accounts with some history"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tmp.name, "accounts.snap")
+        self.journal_path = os.path.join(self.tmp.name, "accounts.journal")
+        self.journal = TransactionJournal(self.journal_path, window=0.001, fsync=False)
+        self.journal.attach()
+        self.store = AccountStore(capacity=4)
+        for i in range(50):
+            self.store[str(10000 + i)] = BankAccount.open(str(10000 + i), "1234", "Personal", i)
+        self.store["10001"].deposit(100)
+
+    def tearDown(self):
+        self.journal.detach()
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def assertSameAccounts(self, restored, store):
+        self.assertEqual(sorted(restored), sorted(store))
+        for account_id in store:
+            original, copy = store[account_id], restored[account_id]
+            self.assertEqual((copy.balance, copy.account_category, copy.passcode_hash),
+                             (original.balance, original.account_category,
+                              original.passcode_hash))
+
+    def test_mapped_store_behaves_like_store(self):
+        """Test that a loaded snapshot finds, changes and adds accounts"""
+        snapshotter = Snapshotter(self.store, self.snapshot_path)
+        snapshotter.snapshot()
+        snapshotter.wait()
+        mapped = load_snapshot(self.snapshot_path)
+        self.assertSameAccounts(mapped, self.store)
+        self.assertNotIn("99999", mapped)
+        mapped["10001"].transfer(50, mapped["10002"])
+        self.assertEqual(mapped["10002"].funds, 52)
+        for i in range(mapped.capacity + 10):  # past the spare rows
+            mapped.add(str(20000 + i), None, "Business", 1, passcode_hash=hash_passcode("0000"))
+        self.assertEqual(mapped["20000"].account_category, "Business")
+        self.assertEqual(mapped["10001"].funds, 51)
+        # The file itself is never changed through the mapping
+        self.assertEqual(load_snapshot(self.snapshot_path)["10002"].funds, 2)
+
+    def test_snapshot_waits_for_journal(self):
+        """Test that a snapshot is only in place once the journal reaches its position"""
+        self.journal.detach()
+        slow = TransactionJournal(os.path.join(self.tmp.name, "slow.journal"), window=0.3,
+                                  fsync=False)
+        self.addCleanup(slow.close)
+        slow.attach()
+        try:
+            self.store["10001"].deposit(5)
+            snapshotter = Snapshotter(self.store, self.snapshot_path, slow)
+            snapshotter.snapshot()
+            snapshotter.wait()
+        finally:
+            slow.detach()
+        self.assertEqual(slow.durable, 1)
+        self.assertEqual(load_snapshot(self.snapshot_path).journal_position,
+                         os.path.getsize(slow.path))
+
+    def test_writes_during_snapshot(self):
+        """Test that a restore gives exactly the live state after writes during a snapshot"""
+        snapshotter = Snapshotter(self.store, self.snapshot_path, self.journal, chunk_rows=1)
+        self.assertTrue(snapshotter.snapshot())
+        self.assertFalse(snapshotter.snapshot())
+        rng = random.Random(5)
+        new_id = 30000
+        while snapshotter.busy or new_id < 30010:
+            account = self.store[str(10000 + rng.randrange(50))]
+            account.deposit(rng.randint(1, 100))
+            account.transfer(1, self.store[str(10000 + rng.randrange(50))])
+            account.change_password(f"{rng.randrange(10000):04d}")
+            self.store[str(new_id)] = BankAccount.open(str(new_id), "5555", "Business", 7)
+            new_id += 1
+        snapshotter.wait()
+        self.journal.wait()
+
+        self.assertEqual(len(load_snapshot(self.snapshot_path)), 50)
+        self.assertSameAccounts(restore(self.snapshot_path, self.journal_path), self.store)
+        self.assertSameAccounts(restore(None, self.journal_path), self.store)
+
+class TestVelocityDetector(unittest.TestCase):
+    THRESHOLDS = {fraud.TRANSFER_BURST: 6, fraud.FAN_OUT: 3, fraud.TOPUP_BURST: 6,
+                  fraud.NEW_NUMBERS: 2, fraud.FAN_IN: 2}
+
+    def setUp(self):
+        """Attach a small detector with one-hour windows on a fake clock"""
+        self.now = 0.0
+        self.detector = VelocityDetector(self.THRESHOLDS, window=3600, known_window=86400,
+                                         width=1 << 10, depth=4, pair_bits=1 << 14,
+                                         number_bits=1 << 14, clock=lambda: self.now)
+        self.detector.attach()
+        self.addCleanup(self.detector.detach)
+        self.accounts = [BankAccount(str(10000 + i), "1234", "Personal", 1000)
+                         for i in range(10)]
+
+    def test_fan_out_blocked(self):
+        """Test that transfers to too many new recipients are refused before they apply"""
+        sender = self.accounts[0]
+        sender.transfer(1, self.accounts[1])
+        for recipient in self.accounts[1:4]:
+            sender.transfer(1, recipient)  # a repeat recipient is not new
+        with self.assertRaisesRegex(SuspectedFraudError, "Too many new recipients"):
+            sender.transfer(1, self.accounts[4])
+        with self.assertRaises(SuspectedFraudError):  # nor is a retry let through
+            sender.transfer(1, self.accounts[4])
+        self.assertEqual(sender.funds, 996)
+        self.assertEqual(self.accounts[4].funds, 1000)
+        self.assertEqual((self.detector.checked, self.detector.flagged), (6, 2))
+        # Other accounts are not affected
+        self.accounts[5].transfer(1, self.accounts[6])
+
+    def test_topups(self):
+        """Test top-up bursts, new numbers and one number fed by many accounts"""
+        account = self.accounts[0]
+        for _ in range(6):
+            account.mobile_topup(1, "17000001")
+        with self.assertRaisesRegex(SuspectedFraudError, "Too many top-ups"):
+            account.mobile_topup(1, "17000001")
+        account = self.accounts[4]
+        account.mobile_topup(1, "17000001")  # already known
+        account.mobile_topup(1, "17000002")
+        account.mobile_topup(1, "77000003")
+        with self.assertRaisesRegex(SuspectedFraudError, "new numbers"):
+            account.mobile_topup(1, "17000004")
+        self.accounts[1].mobile_topup(1, "77999999")
+        self.accounts[2].mobile_topup(1, "77999999")
+        with self.assertRaisesRegex(SuspectedFraudError, "too many accounts"):
+            self.accounts[3].mobile_topup(1, "77999999")
+        self.assertEqual(self.accounts[3].funds, 1000)
+
+    def test_window_slides(self):
+        """Test that counts leave the window after at most a whole window"""
+        sender, recipient = self.accounts[0], self.accounts[1]
+        for _ in range(6):
+            sender.transfer(1, recipient)
+        with self.assertRaises(SuspectedFraudError):
+            sender.transfer(1, recipient)
+        self.now = 1800.0  # half a window: the burst is in the previous generation
+        with self.assertRaises(SuspectedFraudError):
+            sender.transfer(1, recipient)
+        self.now = 5400.0  # both generations have aged out
+        for _ in range(6):
+            sender.transfer(1, recipient)
+        self.assertEqual(sender.funds, 988)
+
+    def test_report_only_and_fixed_memory(self):
+        """Test that block=False only reports flags and that memory never grows"""
+        flagged = []
+        detector = VelocityDetector(self.THRESHOLDS, width=1 << 10, pair_bits=1 << 14,
+                                    number_bits=1 << 14, block=False,
+                                    on_flag=lambda *args: flagged.append(args[1:]),
+                                    clock=lambda: self.now)
+        detector.attach()
+        memory = detector.memory
+        self.assertEqual(memory, 2 * (4 * 1024 * 4 + 2 * 2048))
+        account = self.accounts[0]
+        for i in range(3):
+            account.mobile_topup(1, f"1700000{i}")
+        self.assertEqual(flagged, [("topup", 1, "17000002", fraud.NEW_NUMBERS)])
+        self.assertEqual(account.funds, 997)
+        for i in range(20000):
+            self.now = i * 10.0
+            detector.score(str(i), "topup", f"77{i:06d}", self.now)
+        self.assertEqual(detector.memory, memory)
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
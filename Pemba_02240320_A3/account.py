@@ -0,0 +1,157 @@
+"""Bank accounts and the errors their operations raise.
+
+This is the core of the banking app: it loads no GUI toolkit, so batch
+jobs, services and tests can import it cheaply on any host.
+"""
+from auth import hash_passcode, verify_passcode
+from money import MINOR_UNITS, to_minor
+from validation import MESSAGES, check_mobile, check_passcode
+
+# Custom Exception Classes
+class InvalidInputError(Exception):
+    pass
+
+class InsufficientFundsError(Exception):
+    pass
+
+class LimitExceededError(InvalidInputError):
+    pass
+
+class SuspectedFraudError(InvalidInputError):
+    pass
+
+class BankAccount:
+    # Objects with a record(account, kind, amount, detail) method that are told
+    # about every successful mutation (e.g. the transaction journal).
+    # Amounts passed to observers are in minor units (cents); a transfer is
+    # reported to both sides, as "transfer" and "receive".
+    observers = ()
+    # Optional limits.LimitEngine checked before withdrawals, transfers and
+    # top-ups; it can refuse them and charge a fee on top
+    limits = None
+    # Optional fraud.VelocityDetector shown every transfer and top-up
+    # attempt before it is applied; it can refuse them
+    screen = None
+
+    def __init__(self, account_id, passcode, account_category, funds=0, passcode_hash=None):
+        self.account_id = account_id
+        # Only a salted hash of the passcode is kept.  With passcode None the
+        # hash is passcode_hash, made elsewhere, or left unset (e.g. while
+        # replaying a journal that carries the hash itself)
+        self.passcode_hash = passcode_hash if passcode is None else hash_passcode(passcode)
+        self.account_category = account_category
+        # Balance in minor units; funds is the same value in major units
+        self.balance = to_minor(funds)
+
+    @property
+    def funds(self):
+        return self.balance / MINOR_UNITS
+
+    @funds.setter
+    def funds(self, value):
+        self.balance = to_minor(value)
+
+    def verify_passcode(self, passcode):
+        """Check a passcode against the stored hash"""
+        return self.passcode_hash is not None and verify_passcode(self.passcode_hash, passcode)
+
+    @classmethod
+    def open(cls, account_id, passcode, account_category, funds=0, passcode_hash=None):
+        """Create a new account and announce it to the observers"""
+        account = cls(account_id, passcode, account_category, funds, passcode_hash)
+        account._notify("open", account.balance, account_category)
+        return account
+
+    def _notify(self, kind, amount, detail=None):
+        for observer in self.observers:
+            observer.record(self, kind, amount, detail)
+        
+    def deposit(self, amount):
+        """Deposit money into account"""
+        amount = to_minor(amount)
+        if amount > 0:
+            self.balance += amount
+            self._notify("deposit", amount)
+            return True
+        raise InvalidInputError("Invalid deposit amount")
+
+    def _debit_amount(self, amount):
+        """Convert and check an amount to be taken from this account"""
+        amount = to_minor(amount)
+        if amount <= 0:
+            raise InvalidInputError("Invalid withdrawal amount")
+        if amount > self.balance:
+            raise InsufficientFundsError("Insufficient funds")
+        return amount
+
+    def _debit(self, amount, kind):
+        """Check a debit of the given kind against funds and limits; returns (cents, fee).
+
+        With limits attached the debit is counted against them here, so
+        the caller must go on to apply it.
+        """
+        amount = self._debit_amount(amount)
+        if self.limits is None:
+            return amount, 0
+        return amount, self.limits.debit(self, kind, amount)
+        
+    def withdraw(self, amount):
+        """Withdraw money from account"""
+        amount, fee = self._debit(amount, "withdraw")
+        self.balance -= amount + fee
+        self._notify("withdraw", amount)
+        if fee:
+            self._notify("fee", fee, "withdraw")
+        return True
+        
+    def transfer(self, amount, recipient):
+        """Transfer money to another account"""
+        if self.screen is not None:
+            self.screen.check(self, "transfer", amount, recipient.account_id)
+        amount, fee = self._debit(amount, "transfer")
+        self.balance -= amount + fee
+        try:
+            recipient.balance += amount
+        except BaseException:
+            # Put the money back if the credit side could not be applied
+            self.balance += amount + fee
+            if self.limits is not None:
+                self.limits.release(self, "transfer", amount)
+            raise
+        self._notify("transfer", amount, recipient.account_id)
+        recipient._notify("receive", amount, self.account_id)
+        if fee:
+            self._notify("fee", fee, "transfer")
+        return True
+        
+    def mobile_topup(self, amount, mobile_number):
+        """Top up mobile phone balance"""
+        code = check_mobile(mobile_number)
+        if code:
+            raise InvalidInputError(MESSAGES[code])
+        if self.screen is not None:
+            self.screen.check(self, "topup", amount, mobile_number)
+        amount, fee = self._debit(amount, "topup")
+        self.balance -= amount + fee
+        self._notify("topup", amount, mobile_number)
+        if fee:
+            self._notify("fee", fee, "topup")
+        return True
+    
+    def refund_topup(self, amount, mobile_number):
+        """Give back a top-up that the operator did not deliver"""
+        amount = to_minor(amount)
+        if amount <= 0:
+            raise InvalidInputError("Invalid refund amount")
+        self.balance += amount
+        self._notify("refund", amount, mobile_number)
+        return True
+            
+    def change_password(self, new_passcode, passcode_hash=None):
+        """Change account password; passcode_hash is new_passcode already hashed, if given"""
+        code = check_passcode(new_passcode)
+        if code:
+            raise InvalidInputError(MESSAGES[code])
+        self.passcode_hash = hash_passcode(new_passcode) if passcode_hash is None else passcode_hash
+        self._notify("passcode", 0)
+        return True
@@ -0,0 +1,218 @@
+"""Columnar account storage.
+
+``AccountStore`` keeps every account as one row across parallel typed
+arrays (ids, balances in cents, category codes, fixed-width passcode
+hashes) instead of one Python object per account, and finds rows through a
+compact open-addressing index.  Indexing the store returns an
+``AccountView``, a ``BankAccount`` whose fields live in the store, so the
+existing account methods and ``BankingGUI`` work on it unchanged.
+"""
+from array import array
+
+from account import BankAccount
+from auth import HASH_SIZE, hash_passcode
+from money import to_minor
+
+CATEGORIES = ("Personal", "Business")
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORIES)}
+
+_EMPTY = -1
+_HASH_MULT = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+MAX_ID = (1 << 63) - 1
+_MAX_ID_DIGITS = len(str(MAX_ID))
+
+
+def parse_id(account_id):
+    """Return the integer form of an account id, or None if it is not canonical
+    or does not fit the int64 id column"""
+    if isinstance(account_id, int):
+        return account_id if 0 <= account_id <= MAX_ID else None
+    if not account_id.isdigit() or not account_id.isascii() or len(account_id) > _MAX_ID_DIGITS:
+        return None
+    key = int(account_id)
+    if str(key) != account_id or key > MAX_ID:
+        return None
+    return key
+
+
+class AccountView(BankAccount):
+    """A BankAccount backed by one row of an AccountStore"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def account_id(self):
+        return str(self.store.ids[self.row])
+
+    @property
+    def balance(self):
+        return self.store.balances[self.row]
+
+    @balance.setter
+    def balance(self, value):
+        self.store.balances[self.row] = value
+
+    @property
+    def passcode_hash(self):
+        start = self.row * HASH_SIZE
+        return bytes(self.store.passcode_hashes[start:start + HASH_SIZE])
+
+    @passcode_hash.setter
+    def passcode_hash(self, value):
+        start = self.row * HASH_SIZE
+        self.store.passcode_hashes[start:start + HASH_SIZE] = value
+
+    @property
+    def account_category(self):
+        return CATEGORIES[self.store.categories[self.row]]
+
+    def __eq__(self, other):
+        if isinstance(other, AccountView):
+            return self.store is other.store and self.row == other.row
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self.store), self.row))
+
+    def __repr__(self):
+        return f"AccountView({self.account_id!r}, row={self.row})"
+
+
+class AccountStore:
+    """Dict-like container of accounts stored column-wise.
+
+    Keys are account id strings (canonical non-negative integers), values
+    are ``AccountView`` objects.  Rows are never removed.
+    """
+
+    def __init__(self, capacity=1024):
+        self.ids = array("q")
+        self.balances = array("q")  # minor units
+        self.categories = array("b")
+        self.passcode_hashes = bytearray()  # HASH_SIZE bytes per row
+        self._slots = array("q", [_EMPTY]) * self._table_size(capacity)
+        self._shift = 64 - (len(self._slots).bit_length() - 1)
+
+    @staticmethod
+    def _table_size(capacity):
+        size = 8
+        while size < capacity * 2:
+            size *= 2
+        return size
+
+    def _probe(self, key):
+        """Return the slot holding key, or the empty slot where it would go"""
+        slots = self._slots
+        ids = self.ids
+        mask = len(slots) - 1
+        slot = ((key * _HASH_MULT) & _MASK64) >> self._shift
+        while True:
+            row = slots[slot]
+            if row == _EMPTY or ids[row] == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        self._slots = array("q", [_EMPTY]) * (len(self._slots) * 2)
+        self._shift -= 1
+        slots = self._slots
+        for row, key in enumerate(self.ids):
+            slots[self._probe(key)] = row
+
+    def reserve(self, capacity):
+        """Size the index for at least ``capacity`` accounts up front"""
+        if self._table_size(capacity) > len(self._slots):
+            self._slots = array("q", [_EMPTY]) * self._table_size(capacity)
+            self._shift = 64 - (len(self._slots).bit_length() - 1)
+            slots = self._slots
+            for row, key in enumerate(self.ids):
+                slots[self._probe(key)] = row
+
+    def row_of(self, account_id):
+        """Return the row of an account, or -1 if it does not exist"""
+        key = parse_id(account_id)
+        if key is None:
+            return _EMPTY
+        return self._slots[self._probe(key)]
+
+    def add(self, account_id, passcode, account_category, funds=0, passcode_hash=None,
+            balance=None):
+        """Insert or overwrite an account and return its row.
+
+        Pass ``passcode_hash`` instead of a plaintext passcode (None) to
+        store an existing hash record, and ``balance`` in cents instead of
+        ``funds`` to store a balance exactly.
+        """
+        key = parse_id(account_id)
+        if key is None:
+            raise KeyError(account_id)
+        if passcode_hash is None:
+            passcode_hash = hash_passcode(passcode)
+        if len(passcode_hash) != HASH_SIZE:
+            raise ValueError("Invalid passcode hash")
+        category = CATEGORY_CODES[account_category]
+        if balance is None:
+            balance = to_minor(funds)
+        slot = self._probe(key)
+        row = self._slots[slot]
+        if row != _EMPTY:
+            self.balances[row] = balance
+            self.categories[row] = category
+            self.passcode_hashes[row * HASH_SIZE:(row + 1) * HASH_SIZE] = passcode_hash
+            return row
+        row = len(self.ids)
+        self._append_row(key, balance, category, passcode_hash)
+        self._slots[slot] = row
+        if len(self.ids) * 2 > len(self._slots):
+            self._grow()
+        return row
+
+    def _append_row(self, key, balance, category, passcode_hash):
+        self.ids.append(key)
+        self.balances.append(balance)
+        self.categories.append(category)
+        self.passcode_hashes += passcode_hash
+
+    def view(self, row):
+        return AccountView(self, row)
+
+    def __getitem__(self, account_id):
+        row = self.row_of(account_id)
+        if row == _EMPTY:
+            raise KeyError(account_id)
+        return AccountView(self, row)
+
+    def __setitem__(self, account_id, account):
+        self.add(account_id, None, account.account_category,
+                 passcode_hash=account.passcode_hash, balance=account.balance)
+
+    def __contains__(self, account_id):
+        return self.row_of(account_id) != _EMPTY
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for key in self.ids:
+            yield str(key)
+
+    def get(self, account_id, default=None):
+        row = self.row_of(account_id)
+        if row == _EMPTY:
+            return default
+        return AccountView(self, row)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for row in range(len(self.ids)):
+            yield AccountView(self, row)
+
+    def items(self):
+        for row, key in enumerate(self.ids):
+            yield str(key), AccountView(self, row)
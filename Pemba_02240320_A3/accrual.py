@@ -0,0 +1,239 @@
+"""Periodic interest and maintenance fees, applied in resumable batched passes.
+
+``RULES`` gives, for each account category, a yearly interest rate in
+basis points and a fixed maintenance fee per period.  An ``AccrualPass``
+applies one period's postings to every account: interest is
+``balance * rate / (10000 * periods_per_year)`` rounded half up to a
+whole cent, and the fee is taken from what is there (never overdrawing).
+Postings are reported to the observers as "interest" (detail: the period)
+and "fee" (detail: "maintenance").
+
+A pass walks the accounts in chunks of ``chunk_rows``, optionally on
+several worker threads, and pauses between chunks so live operations get
+the interpreter; with a StripedLocks each account is posted under its
+stripe, like ConcurrentLedger operations.  With ``state_path`` progress is
+checkpointed (write, fsync, rename) around every chunk: a chunk is claimed
+before anything in it is posted and confirmed once it is done.  A pass
+resumed for the same period carries on from the first unclaimed chunk, so
+no account is charged twice in a period however the pass was interrupted.
+Chunks that were claimed but never confirmed (the process died in the
+middle of them) are not redone; they are listed in ``unconfirmed`` to be
+reconciled against the journal.
+
+``AccrualScheduler`` runs the pass for the current period from a
+background thread whenever that period's pass has not completed yet.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from account_store import AccountStore
+
+# rate: yearly interest in basis points; fee: per period, in minor units
+AccrualRule = namedtuple("AccrualRule", "rate fee")
+
+RULES = {
+    "Personal": AccrualRule(rate=250, fee=0),
+    "Business": AccrualRule(rate=0, fee=5000),
+}
+
+PERIODS_PER_YEAR = 12
+_BASIS = 10000
+
+
+def monthly_period(when):
+    """The period key ("2026-10") of a time.time() value"""
+    return time.strftime("%Y-%m", time.gmtime(when))
+
+
+class AccrualPass:
+    """One period's interest and fees over every account in a mapping.
+
+    ``accounts`` is an AccountStore or a dict of BankAccount objects.  The
+    pass covers the accounts there were when it started, a dict's in its
+    (insertion) order; accounts opened later wait for the next period.
+    """
+
+    def __init__(self, accounts, period, state_path=None, rules=RULES,
+                 periods_per_year=PERIODS_PER_YEAR, chunk_rows=4096, workers=1, locks=None,
+                 pause=0.001, fsync=True):
+        self.accounts = accounts
+        self.period = period
+        self.state_path = state_path
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.locks = locks
+        self.pause = pause
+        self.fsync = fsync
+        divisor = _BASIS * periods_per_year
+        # category -> (rate, rounding half, divisor, fee)
+        self.rules = {category: (rule.rate, divisor // 2, divisor, rule.fee)
+                      for category, rule in rules.items()}
+        self._ids = None if isinstance(accounts, AccountStore) else list(accounts)
+        self._size = len(accounts)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.next_chunk = 0
+        self.claimed = set()
+        self.unconfirmed = []
+        self.interest = 0
+        self.fees = 0
+        self.complete = False
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            if state["period"] == period:
+                if state["chunk_rows"] != chunk_rows:
+                    raise ValueError("Chunk size does not match the saved accrual state")
+                self.next_chunk = state["next_chunk"]
+                self.unconfirmed = sorted(state["unconfirmed"] + state["claimed"])
+                self.interest = state["interest"]
+                self.fees = state["fees"]
+                self.complete = state["complete"]
+
+    @property
+    def chunks(self):
+        return -(-self._size // self.chunk_rows)
+
+    def _save(self):
+        if not self.state_path:
+            return
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"period": self.period, "chunk_rows": self.chunk_rows,
+                       "next_chunk": self.next_chunk, "claimed": sorted(self.claimed),
+                       "unconfirmed": self.unconfirmed, "interest": self.interest,
+                       "fees": self.fees, "complete": self.complete}, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    def _claim(self):
+        """Take the next chunk and checkpoint the claim; None when there are none left"""
+        with self._lock:
+            if self._stop.is_set() or self.next_chunk >= self.chunks:
+                return None
+            chunk = self.next_chunk
+            self.next_chunk += 1
+            self.claimed.add(chunk)
+            self._save()
+            return chunk
+
+    def _confirm(self, chunk, interest, fees):
+        with self._lock:
+            self.claimed.discard(chunk)
+            self.interest += interest
+            self.fees += fees
+            if self.next_chunk >= self.chunks and not self.claimed:
+                self.complete = True
+            self._save()
+
+    def _post(self, account, rule):
+        """Apply the period's interest and fee to one account; returns (interest, fee)"""
+        rate, half, divisor, fee = rule
+        balance = account.balance
+        interest = (balance * rate + half) // divisor if rate and balance > 0 else 0
+        if fee > balance + interest:
+            fee = max(0, balance + interest)
+        if interest or fee:
+            account.balance = balance + interest - fee
+            if interest:
+                account._notify("interest", interest, self.period)
+            if fee:
+                account._notify("fee", fee, "maintenance")
+        return interest, fee
+
+    def _accounts(self, chunk):
+        start = chunk * self.chunk_rows
+        stop = min(start + self.chunk_rows, self._size)
+        if self._ids is None:
+            return map(self.accounts.view, range(start, stop))
+        accounts = self.accounts
+        return (accounts[account_id] for account_id in self._ids[start:stop]
+                if account_id in accounts)
+
+    def _run_chunk(self, chunk):
+        rules = self.rules
+        hold = self.locks.hold if self.locks is not None else None
+        interest = fees = 0
+        for account in self._accounts(chunk):
+            rule = rules.get(account.account_category)
+            if rule is None:
+                continue
+            if hold is None:
+                credited, charged = self._post(account, rule)
+            else:
+                with hold(account.account_id):
+                    credited, charged = self._post(account, rule)
+            interest += credited
+            fees += charged
+        self._confirm(chunk, interest, fees)
+
+    def _work(self):
+        while (chunk := self._claim()) is not None:
+            self._run_chunk(chunk)
+            if self.pause is not None:
+                time.sleep(self.pause)
+
+    def run(self):
+        """Run (or resume) the pass; returns True once every chunk is done"""
+        if self.complete:
+            return True
+        if self.workers <= 1:
+            self._work()
+        else:
+            threads = [threading.Thread(target=self._work, daemon=True)
+                       for _ in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return self.complete
+
+    def stop(self):
+        """Stop claiming chunks; run() returns once the chunks in progress are done"""
+        self._stop.set()
+
+
+class AccrualScheduler:
+    """Runs the accrual pass of the current period from a background thread"""
+
+    def __init__(self, accounts, state_path, period=monthly_period, interval=3600.0,
+                 clock=time.time, **options):
+        self.accounts = accounts
+        self.state_path = state_path
+        self.period = period
+        self.interval = interval
+        self.clock = clock
+        self.options = options
+        self.current = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Run or resume the pass of the current period; returns it"""
+        self.current = AccrualPass(self.accounts, self.period(self.clock()), self.state_path,
+                                   **self.options)
+        if self._stop.is_set():
+            self.current.stop()
+        self.current.run()
+        return self.current
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.current is not None:
+            self.current.stop()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,231 @@
+"""Incrementally maintained aggregates over all account balances.
+
+``BalanceAggregates`` is a BankAccount observer: on every mutation it
+moves the account's balance from its last known value to the current one,
+updating the total (the bank's liabilities), the per-category totals and
+a sorted index of balances.  Reports then read those instead of scanning
+every account, so totals are O(1), and top-N and percentile queries cost
+a binary search plus the rows returned.
+
+The sorted index, ``SortedKeys``, is a list of sorted ``array("q")``
+chunks of at most ``2 * load`` keys.  Inserting or removing a key is a
+bisect over the chunk maxima and a memmove inside one chunk; a Fenwick
+tree over the chunk lengths, rebuilt lazily after a chunk is split or
+dropped, finds the k-th key in O(log n).  Each key packs a balance and
+the account's slot as ``balance << SLOT_BITS | slot``, so balances must
+stay within +-2**(63 - SLOT_BITS) minor units.
+
+Accounts that change without telling the observers (e.g. rows written
+straight into an AccountStore) are picked up with ``add``/``load``.
+"""
+import math
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+
+from account import BankAccount
+
+SLOT_BITS = 27
+_SLOT_MASK = (1 << SLOT_BITS) - 1
+
+
+class SortedKeys:
+    """Sorted multiset of 64-bit integers with rank lookups"""
+
+    def __init__(self, keys=(), load=1000):
+        self.load = load
+        self._build(sorted(keys))
+
+    def _build(self, keys):
+        load = self.load
+        self.chunks = [array("q", keys[i:i + load]) for i in range(0, len(keys), load)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+        self.size = len(keys)
+        self._tree = None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return chain.from_iterable(self.chunks)
+
+    def __reversed__(self):
+        return chain.from_iterable(map(reversed, reversed(self.chunks)))
+
+    def update(self, keys):
+        """Add many keys at once by re-sorting everything"""
+        self._build(sorted(chain(self, keys)))
+
+    def add(self, key):
+        chunks, maxes = self.chunks, self.maxes
+        if not chunks:
+            chunks.append(array("q", [key]))
+            maxes.append(key)
+            self.size = 1
+            self._tree = None
+            return
+        i = bisect_left(maxes, key)
+        if i == len(chunks):
+            i -= 1
+            chunks[i].append(key)
+            maxes[i] = key
+        else:
+            chunk = chunks[i]
+            chunk.insert(bisect_left(chunk, key), key)
+        self.size += 1
+        chunk = chunks[i]
+        if len(chunk) > 2 * self.load:
+            half = self.load
+            chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            maxes[i:i + 1] = [chunk[half - 1], chunk[-1]]
+            self._tree = None
+        elif self._tree is not None:
+            self._update(i, 1)
+
+    def remove(self, key):
+        """Remove one occurrence of key; KeyError if there is none"""
+        chunks, maxes = self.chunks, self.maxes
+        i = bisect_left(maxes, key)
+        if i == len(chunks):
+            raise KeyError(key)
+        chunk = chunks[i]
+        j = bisect_left(chunk, key)
+        if chunk[j] != key:
+            raise KeyError(key)
+        del chunk[j]
+        self.size -= 1
+        if not chunk:
+            del chunks[i], maxes[i]
+            self._tree = None
+            return
+        maxes[i] = chunk[-1]
+        if self._tree is not None:
+            self._update(i, -1)
+
+    def _update(self, i, delta):
+        tree = self._tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def __getitem__(self, k):
+        """The k-th smallest key (negative k counts from the largest)"""
+        if k < 0:
+            k += self.size
+        if not 0 <= k < self.size:
+            raise IndexError("key index out of range")
+        tree = self._tree
+        if tree is None:
+            tree = self._tree = [0] + [len(chunk) for chunk in self.chunks]
+            for i in range(1, len(tree)):
+                parent = i + (i & -i)
+                if parent < len(tree):
+                    tree[parent] += tree[i]
+        # Walk down the tree to the last chunk whose prefix length is <= k
+        pos = 0
+        bit = 1 << (len(tree) - 1).bit_length()
+        while bit:
+            if pos + bit < len(tree) and tree[pos + bit] <= k:
+                pos += bit
+                k -= tree[pos]
+            bit >>= 1
+        return self.chunks[pos][k]
+
+
+class BalanceAggregates:
+    """Totals, per-category totals and balance ranks kept up to date per mutation"""
+
+    def __init__(self, load=1000):
+        self.slots = {}              # account id -> slot
+        self.ids = []                # slot -> account id
+        self.balances = array("q")   # slot -> last known balance, minor units
+        self.categories = []         # slot -> account category
+        self.total = 0
+        self.category_totals = {}
+        self.category_counts = {}
+        # Amount moved by each kind of operation since tracking began
+        # (deposit, withdraw, transfer, receive, topup, refund, fee, open)
+        self.flows = {}
+        self.ranked = SortedKeys(load=load)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def attach(self, target=BankAccount):
+        target.observers = tuple(target.observers) + (self,)
+
+    def detach(self, target=BankAccount):
+        target.observers = tuple(o for o in target.observers if o is not self)
+
+    def record(self, account, kind, amount, detail=None):
+        """BankAccount observer hook"""
+        self.add(account)
+        if amount:
+            self.flows[kind] = self.flows.get(kind, 0) + amount
+
+    def _new_slot(self, account_id, category, balance):
+        slot = len(self.ids)
+        if slot > _SLOT_MASK:
+            raise OverflowError("too many accounts to rank")
+        self.slots[account_id] = slot
+        self.ids.append(account_id)
+        self.balances.append(balance)
+        self.categories.append(category)
+        self.total += balance
+        self.category_totals[category] = self.category_totals.get(category, 0) + balance
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        return slot
+
+    def add(self, account):
+        """Start tracking an account, or bring a tracked one up to its current balance"""
+        balance = account.balance
+        slot = self.slots.get(account.account_id)
+        if slot is None:
+            slot = self._new_slot(account.account_id, account.account_category, balance)
+            self.ranked.add(balance << SLOT_BITS | slot)
+            return
+        old = self.balances[slot]
+        if balance == old:
+            return
+        self.ranked.remove(old << SLOT_BITS | slot)
+        self.ranked.add(balance << SLOT_BITS | slot)
+        self.balances[slot] = balance
+        self.total += balance - old
+        self.category_totals[self.categories[slot]] += balance - old
+
+    def load(self, accounts):
+        """Track every account in a mapping, sorting the new ones into the index in one go"""
+        keys = []
+        for account in accounts.values():
+            if account.account_id in self.slots:
+                self.add(account)
+                continue
+            balance = account.balance
+            slot = self._new_slot(account.account_id, account.account_category, balance)
+            keys.append(balance << SLOT_BITS | slot)
+        self.ranked.update(keys)
+
+    def _entry(self, key):
+        return self.ids[key & _SLOT_MASK], key >> SLOT_BITS
+
+    def top(self, n=10):
+        """The n largest balances as (account id, balance) pairs, largest first"""
+        return [self._entry(key) for key in islice(reversed(self.ranked), n)]
+
+    def bottom(self, n=10):
+        """The n smallest balances as (account id, balance) pairs, smallest first"""
+        return [self._entry(key) for key in islice(self.ranked, n)]
+
+    def percentile(self, q):
+        """Balance at quantile q (0..1) by nearest rank, or None with no accounts"""
+        n = len(self.ranked)
+        if not n:
+            return None
+        k = min(n - 1, max(0, math.ceil(q * n) - 1))
+        return self.ranked[k] >> SLOT_BITS
+
+    def by_category(self):
+        """{category: (number of accounts, total balance)}"""
+        return {category: (self.category_counts[category], total)
+                for category, total in self.category_totals.items()}
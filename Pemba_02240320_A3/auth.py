@@ -0,0 +1,178 @@
+"""Passcode hashing and login throttling.
+
+Passcodes are stored as salted PBKDF2-HMAC-SHA256 hashes in a fixed-width
+record.  Because the KDF is deliberately slow, ``Authenticator`` keeps a
+bounded cache of recently verified logins with a TTL, and an
+``AttemptTable`` of failures per account and per source that imposes an
+exponential back-off, so a 4-digit passcode cannot be guessed by brute force.
+"""
+import hashlib
+import hmac
+import os
+import struct
+import time
+from array import array
+from collections import OrderedDict
+
+# Work factor for new hashes; lowered only by tests and benchmarks that
+# create many accounts
+ITERATIONS = 200000
+
+SALT_SIZE = 16
+DIGEST_SIZE = 32
+_HEADER = struct.Struct("<I")
+HASH_SIZE = _HEADER.size + SALT_SIZE + DIGEST_SIZE
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+class TooManyAttemptsError(AuthenticationError):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many attempts, try again in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+def hash_passcode(passcode, salt=None, iterations=None):
+    """Return a HASH_SIZE-byte record: iteration count, salt, derived key"""
+    if iterations is None:
+        iterations = ITERATIONS
+    if salt is None:
+        salt = os.urandom(SALT_SIZE)
+    digest = hashlib.pbkdf2_hmac("sha256", passcode.encode(), salt, iterations)
+    return _HEADER.pack(iterations) + salt + digest
+
+
+def verify_passcode(record, passcode):
+    """Check a passcode against a record made by hash_passcode"""
+    (iterations,) = _HEADER.unpack_from(record)
+    salt = record[_HEADER.size:_HEADER.size + SALT_SIZE]
+    digest = hashlib.pbkdf2_hmac("sha256", passcode.encode(), bytes(salt), iterations)
+    return hmac.compare_digest(digest, bytes(record[_HEADER.size + SALT_SIZE:]))
+
+
+class AttemptTable:
+    """Failed-attempt counters for an unbounded key space in fixed memory.
+
+    Keys hash into ``size`` slots; a collision can only make throttling
+    stricter, never looser.  After ``free_attempts`` failures a key is
+    blocked for ``base_delay * 2**n`` seconds (capped at ``max_delay``),
+    and counters are forgotten after ``reset_after`` quiet seconds.
+    """
+
+    def __init__(self, size=65536, free_attempts=3, base_delay=1.0, max_delay=900.0,
+                 reset_after=3600.0):
+        self.size = size
+        self.free_attempts = free_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reset_after = reset_after
+        self.failures = array("H", bytes(2 * size))
+        self.last_failure = array("d", bytes(8 * size))
+        self.blocked_until = array("d", bytes(8 * size))
+
+    def _slot(self, key):
+        return hash(key) % self.size
+
+    def retry_after(self, key, now):
+        """Seconds until key may try again (0 if it may try now)"""
+        return max(0.0, self.blocked_until[self._slot(key)] - now)
+
+    def failure(self, key, now):
+        slot = self._slot(key)
+        failures = self.failures[slot]
+        if now - self.last_failure[slot] > self.reset_after:
+            failures = 0
+        failures = min(failures + 1, 0xFFFF)
+        self.failures[slot] = failures
+        self.last_failure[slot] = now
+        if failures >= self.free_attempts:
+            excess = failures - self.free_attempts
+            self.blocked_until[slot] = now + min(self.max_delay, self.base_delay * 2 ** min(excess, 30))
+
+    def reset(self, key):
+        slot = self._slot(key)
+        self.failures[slot] = 0
+        self.blocked_until[slot] = 0.0
+
+
+class Authenticator:
+    """Verifies logins with a verified-session cache and brute-force throttling.
+
+    Cache entries are keyed by account id and an HMAC of the passcode under
+    a per-process secret, so no plaintext is kept, and they remember the
+    hash record they were checked against so a passcode change invalidates
+    them.
+    """
+
+    def __init__(self, cache_size=10000, cache_ttl=300.0, accounts_table=None,
+                 sources_table=None, clock=time.monotonic):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.accounts_table = accounts_table or AttemptTable()
+        self.sources_table = sources_table or AttemptTable(free_attempts=20)
+        self.clock = clock
+        self._cache = OrderedDict()
+        self._secret = os.urandom(32)
+        self._dummy = hash_passcode("0000")
+
+    def _cache_key(self, account_id, passcode):
+        return account_id, hmac.digest(self._secret, passcode.encode(), "sha256")
+
+    def login(self, accounts, account_id, passcode, source=None):
+        """Return the account for valid credentials.
+
+        Raises TooManyAttemptsError while the account or source is blocked
+        and AuthenticationError for wrong credentials.
+        """
+        account, record = self.begin_login(accounts, account_id, passcode, source)
+        if account is not None:
+            return account
+        return self.finish_login(accounts, account_id, passcode, source, record,
+                                 verify_passcode(record, passcode))
+
+    def begin_login(self, accounts, account_id, passcode, source=None):
+        """The cheap first half of login: throttling and the cache.
+
+        Returns (account, None) for a cached login.  Otherwise returns
+        (None, record): the caller checks the passcode against record with
+        verify_passcode, on any thread, and passes the result to
+        finish_login.
+        """
+        now = self.clock()
+        wait = max(self.accounts_table.retry_after(account_id, now),
+                   self.sources_table.retry_after(source, now) if source is not None else 0.0)
+        if wait:
+            raise TooManyAttemptsError(wait)
+
+        account = accounts.get(account_id)
+        key = self._cache_key(account_id, passcode)
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires, record = entry
+            if account is not None and expires > now and record == account.passcode_hash:
+                self._cache.move_to_end(key)
+                return account, None
+            del self._cache[key]
+        # A missing account costs the same check as a real one
+        return None, self._dummy if account is None else account.passcode_hash
+
+    def finish_login(self, accounts, account_id, passcode, source, record, valid):
+        """Count a login whose passcode was checked against record; returns the account"""
+        now = self.clock()
+        account = accounts.get(account_id)
+        # The account may have gone or changed passcode during the check
+        if account is None or account.passcode_hash != record:
+            valid = False
+        if not valid:
+            self.accounts_table.failure(account_id, now)
+            if source is not None:
+                self.sources_table.failure(source, now)
+            raise AuthenticationError("Invalid credentials")
+
+        self.accounts_table.reset(account_id)
+        self._cache[self._cache_key(account_id, passcode)] = (now + self.cache_ttl, record)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return account
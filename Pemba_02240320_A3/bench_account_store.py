@@ -0,0 +1,72 @@
+"""Compare AccountStore with a dict of BankAccount objects.
+
+Reports the memory held by each container (tracemalloc) and the cost of a
+random id lookup plus balance read.
+
+    python bench_account_store.py --sizes 10000 1000000 10000000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from account import BankAccount
+from account_store import AccountStore
+import auth
+
+# Compare storage, not PBKDF2 time: hash passcodes with a single iteration
+auth.ITERATIONS = 1
+
+LOOKUPS = 200000
+
+
+def build_dict(n):
+    accounts = {}
+    for i in range(n):
+        account_id = str(10000000 + i)
+        accounts[account_id] = BankAccount(account_id, "1234", "Personal", 100.0)
+    return accounts
+
+
+def build_store(n):
+    store = AccountStore(capacity=n)
+    for i in range(n):
+        store.add(10000000 + i, "1234", "Personal", 100.0)
+    return store
+
+
+def measure(builder, n):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    container = builder(n)
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    keys = [str(10000000 + random.randrange(n)) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for key in keys:
+        container[key].funds
+    lookup = (time.perf_counter() - start) / LOOKUPS
+    return memory, build_time, lookup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'accounts':>10} {'container':>10} {'MB':>9} {'bytes/acct':>11} "
+          f"{'build s':>8} {'lookup us':>10}")
+    for n in args.sizes:
+        for name, builder in (("dict", build_dict), ("store", build_store)):
+            memory, build_time, lookup = measure(builder, n)
+            print(f"{n:>10,} {name:>10} {memory / 1e6:>9.1f} {memory / n:>11.0f} "
+                  f"{build_time:>8.2f} {lookup * 1e6:>10.3f}")
+            gc.collect()
+
+
+if __name__ == "__main__":
+    main()
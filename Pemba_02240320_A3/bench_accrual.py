@@ -0,0 +1,126 @@
+"""Accrual pass time and its effect on live-traffic latency.
+
+For each ``--sizes`` account count, builds an AccountStore (filled
+column-wise, a fifth of the accounts Business) and times:
+
+* a full AccrualPass on its own, with no pauses and no locks;
+* ``--live-threads`` threads running deposits and transfers through a
+  ConcurrentLedger for as long as a pass takes, once with no pass running
+  and once alongside a pass that posts under the ledger's stripe locks and
+  pauses ``--pause`` seconds between chunks of ``--chunk-rows``, reporting
+  the live operations' p50/p99/max latency and the pass time under load.
+
+Checkpoints are written to a temporary directory without fsync.
+
+    python bench_accrual.py --sizes 1000000 10000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from array import array
+
+from account import InsufficientFundsError
+from account_store import AccountStore
+from accrual import AccrualPass
+from auth import hash_passcode
+from concurrency import ConcurrentLedger
+from metrics import Histogram
+
+FIRST_ID = 10000000
+
+
+def build_store(n, seed):
+    rng = random.Random(seed)
+    store = AccountStore(capacity=1)
+    store.ids = array("q", range(FIRST_ID, FIRST_ID + n))
+    store.balances = array("q", (rng.randrange(10000000) for _ in range(n)))
+    store.categories = array("b", (rng.random() < 0.2 for _ in range(n)))
+    store.passcode_hashes = bytearray(hash_passcode("1234", iterations=1) * n)
+    store.reserve(n)
+    return store
+
+
+def live_traffic(ledger, n, stop, latency, seed):
+    rng = random.Random(seed)
+    clock = time.perf_counter_ns
+    record = latency.record
+    while not stop.is_set():
+        source = str(FIRST_ID + rng.randrange(n))
+        before = clock()
+        try:
+            if rng.random() < 0.5:
+                ledger.deposit(source, 1)
+            else:
+                ledger.transfer(source, str(FIRST_ID + rng.randrange(n)), 1)
+        except InsufficientFundsError:
+            pass
+        record(clock() - before)
+
+
+def under_load(store, threads, duration, seed, accrual=None):
+    """Run live traffic for duration seconds, or alongside accrual until it finishes"""
+    ledger = ConcurrentLedger(store)
+    stop = threading.Event()
+    latencies = [Histogram() for _ in range(threads)]
+    workers = [threading.Thread(target=live_traffic,
+                                args=(ledger, len(store), stop, latencies[i], seed + i))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    start = time.perf_counter()
+    if accrual is None:
+        time.sleep(duration)
+    else:
+        accrual.locks = ledger.locks
+        accrual.run()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for worker in workers:
+        worker.join()
+    total = Histogram()
+    for latency in latencies:
+        total.merge(latency)
+    return elapsed, total
+
+
+def report(label, elapsed, latency):
+    print(f"  {label:<22} {elapsed:7.2f} s  {latency.count / elapsed:>10,.0f} ops/s  "
+          f"p50 {latency.percentile(0.5) / 1e3:7.1f} us  "
+          f"p99 {latency.percentile(0.99) / 1e3:7.1f} us  max {latency.max / 1e6:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--chunk-rows", type=int, default=4096)
+    parser.add_argument("--pause", type=float, default=0.001)
+    parser.add_argument("--live-threads", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            store = build_store(n, args.seed)
+            print(f"{n:,} accounts")
+
+            state_path = os.path.join(tmp, f"alone-{n}.json")
+            accrual = AccrualPass(store, "2026-10", state_path, chunk_rows=args.chunk_rows,
+                                  pause=None, fsync=False)
+            start = time.perf_counter()
+            accrual.run()
+            alone = time.perf_counter() - start
+            print(f"  {'pass alone':<22} {alone:7.2f} s  {n / alone:>10,.0f} accounts/s")
+
+            elapsed, latency = under_load(store, args.live_threads, alone, args.seed)
+            report("live traffic alone", elapsed, latency)
+            accrual = AccrualPass(store, "2026-11", os.path.join(tmp, f"load-{n}.json"),
+                                  chunk_rows=args.chunk_rows, pause=args.pause, fsync=False)
+            elapsed, latency = under_load(store, args.live_threads, alone, args.seed, accrual)
+            report("live traffic + pass", elapsed, latency)
+
+
+if __name__ == "__main__":
+    main()
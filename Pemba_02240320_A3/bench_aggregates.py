@@ -0,0 +1,120 @@
+"""Report queries from BalanceAggregates against scanning every account.
+
+For each ``--sizes`` account count, fills an AccountStore column-wise with
+random balances, loads it into a BalanceAggregates, then times:
+
+* the queries (total, per-category totals, top 10, median) read from the
+  aggregates, and the same answers computed by a full scan of the store;
+* ``--ops`` random deposits, withdrawals and transfers on the store with
+  no observer and with the aggregates attached, giving the per-mutation
+  cost of keeping them up to date.
+
+    python bench_aggregates.py --sizes 1000000 10000000
+"""
+import argparse
+import heapq
+import random
+import time
+from array import array
+
+from account import InsufficientFundsError
+from account_store import CATEGORIES, AccountStore
+from aggregates import BalanceAggregates
+from auth import hash_passcode
+
+FIRST_ID = 10000000
+QUERIES = 200
+
+
+def build_store(n, seed):
+    """A store of n accounts with random balances, filled column-wise"""
+    rng = random.Random(seed)
+    store = AccountStore(capacity=1)
+    store.ids = array("q", range(FIRST_ID, FIRST_ID + n))
+    store.balances = array("q", (rng.randrange(1000000) for _ in range(n)))
+    store.categories = array("b", (rng.random() < 0.2 for _ in range(n)))
+    store.passcode_hashes = bytearray(hash_passcode("1234", iterations=1) * n)
+    store.reserve(n)
+    return store
+
+
+def scan(store):
+    """The report answers the way they are computed without aggregates"""
+    by_category = {}
+    for category, balance in zip(store.categories, store.balances):
+        by_category[CATEGORIES[category]] = by_category.get(CATEGORIES[category], 0) + balance
+    top = heapq.nlargest(10, range(len(store)), key=store.balances.__getitem__)
+    median = sorted(store.balances)[(len(store) - 1) // 2]
+    return sum(store.balances), by_category, top, median
+
+
+def time_per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+def run_ops(store, n_ops, seed):
+    rng = random.Random(seed)
+    n = len(store)
+    views = [store.view(rng.randrange(n)) for _ in range(n_ops)]
+    others = [store.view(rng.randrange(n)) for _ in range(n_ops)]
+    amounts = [rng.randint(1, 5000) for _ in range(n_ops)]
+    start = time.perf_counter()
+    for i, (account, other, amount) in enumerate(zip(views, others, amounts)):
+        try:
+            if i % 3 == 0:
+                account.deposit(amount)
+            elif i % 3 == 1:
+                account.withdraw(amount)
+            else:
+                account.transfer(amount, other)
+        except InsufficientFundsError:
+            pass
+    return (time.perf_counter() - start) / n_ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        store = build_store(n, args.seed)
+        aggregates = BalanceAggregates()
+        start = time.perf_counter()
+        aggregates.load(store)
+        print(f"{n:,} accounts (loaded into the aggregates in {time.perf_counter() - start:.1f} s)")
+
+        start = time.perf_counter()
+        scanned = scan(store)
+        full_scan = time.perf_counter() - start
+        assert scanned[0] == aggregates.total
+        assert [balance for _, balance in aggregates.top(10)] == [store.balances[row]
+                                                                  for row in scanned[2]]
+        assert aggregates.percentile(0.5) == scanned[3]
+        print(f"  {'full scan, all reports':<26} {full_scan * 1e6:>12.1f} us")
+        for label, query in (("total", lambda: aggregates.total),
+                             ("per category", aggregates.by_category),
+                             ("top 10", lambda: aggregates.top(10)),
+                             ("median", lambda: aggregates.percentile(0.5))):
+            print(f"  {label:<26} {time_per_call(query, QUERIES) * 1e6:>12.1f} us")
+
+        bare = run_ops(store, args.ops, args.seed)
+        aggregates.load(store)  # catch up with the unobserved operations
+        aggregates.attach()
+        try:
+            observed = run_ops(store, args.ops, args.seed + 1)
+        finally:
+            aggregates.detach()
+        print(f"  {'operation, no observer':<26} {bare * 1e6:>12.2f} us")
+        print(f"  {'operation, aggregates':<26} {observed * 1e6:>12.2f} us "
+              f"(+{(observed - bare) * 1e6:.2f} us)")
+        assert aggregates.total == sum(store.balances)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Logins per second with the verified-session cache on and off.
+
+A fixed set of users logs in repeatedly with the default PBKDF2 work
+factor, as tellers re-authenticating through the day would.
+
+    python bench_auth.py --users 50 --logins 2000
+"""
+import argparse
+import random
+import time
+
+from account import BankAccount
+from auth import Authenticator
+
+
+def run(accounts, credentials, logins, cache_size, seed):
+    rng = random.Random(seed)
+    auth = Authenticator(cache_size=cache_size)
+    start = time.perf_counter()
+    for _ in range(logins):
+        account_id, passcode = credentials[rng.randrange(len(credentials))]
+        auth.login(accounts, account_id, passcode)
+    return logins / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    accounts = {}
+    credentials = []
+    for i in range(args.users):
+        account_id, passcode = str(10000000 + i), f"{i % 10000:04d}"
+        accounts[account_id] = BankAccount(account_id, passcode, "Personal")
+        credentials.append((account_id, passcode))
+
+    uncached = run(accounts, credentials, max(1, args.logins // 20), 0, args.seed)
+    cached = run(accounts, credentials, args.logins, 10000, args.seed)
+    print(f"cache off: {uncached:>12,.0f} logins/s")
+    print(f"cache on:  {cached:>12,.0f} logins/s ({cached / uncached:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Rows per second of bulk account and history export and import.
+
+For each ``--sizes`` row count, builds an AccountStore of that many
+accounts (filled column-wise) and a TransactionHistory of as many entries,
+then times exporting and importing both, in CSV and in the binary format,
+and reports the file sizes.  Imports go into an empty AccountStore and
+TransactionHistory.  With ``--trace-memory`` each step also reports its
+peak traced memory (and runs several times slower): exports stay at about
+one chunk whatever the size, imports add only what the target holds.
+
+    python bench_bulk_io.py --sizes 1000000 10000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+import bulk_io
+from account_store import AccountStore
+from auth import hash_passcode
+from history import TransactionHistory
+
+FIRST_ID = 10000000
+
+
+def build_store(n, seed):
+    rng = random.Random(seed)
+    store = AccountStore(capacity=1)
+    store.ids = array("q", range(FIRST_ID, FIRST_ID + n))
+    store.balances = array("q", (rng.randrange(1000000) for _ in range(n)))
+    store.categories = array("b", (rng.random() < 0.2 for _ in range(n)))
+    store.passcode_hashes = bytearray(hash_passcode("1234", iterations=1) * n)
+    store.reserve(n)
+    return store
+
+
+def build_history(rows, accounts, seed):
+    rng = random.Random(seed)
+    history = TransactionHistory()
+    append = history.append
+    for i in range(rows):
+        append(str(FIRST_ID + rng.randrange(accounts)), 1, rng.randint(1, 10000), i,
+               timestamp=float(i))
+    return history
+
+
+def measure(label, rows, step, path=None, trace_memory=False):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    step()
+    elapsed = time.perf_counter() - start
+    line = f"  {label:<24} {rows / elapsed:>12,.0f} rows/s"
+    if path:
+        line += f"  {os.path.getsize(path) / 1e6:8.1f} MB"
+    if trace_memory:
+        line += f"  peak {tracemalloc.get_traced_memory()[1] / 1e6:.1f} MB"
+        tracemalloc.stop()
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--formats", nargs="+", choices=["csv", "binary"],
+                        default=["csv", "binary"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            store = build_store(n, args.seed)
+            history = build_history(n, max(1, n // 10), args.seed)
+            print(f"{n:,} accounts and {n:,} history entries")
+            for format in args.formats:
+                accounts_path = os.path.join(tmp, f"accounts.{format}")
+                history_path = os.path.join(tmp, f"history.{format}")
+                measure(f"{format} export accounts", n,
+                        lambda: bulk_io.export_accounts(store, accounts_path, format),
+                        accounts_path, args.trace_memory)
+                measure(f"{format} import accounts", n,
+                        lambda: bulk_io.import_accounts(accounts_path, AccountStore(), format),
+                        trace_memory=args.trace_memory)
+                measure(f"{format} export history", n,
+                        lambda: bulk_io.export_history(history, history_path, format),
+                        history_path, args.trace_memory)
+                measure(f"{format} import history", n,
+                        lambda: bulk_io.import_history(history_path, TransactionHistory(),
+                                                       format),
+                        trace_memory=args.trace_memory)
+                os.remove(accounts_path)
+                os.remove(history_path)
+
+
+if __name__ == "__main__":
+    main()
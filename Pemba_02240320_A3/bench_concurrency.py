@@ -0,0 +1,75 @@
+"""Throughput of ConcurrentLedger transfers by thread count and hot-account skew.
+
+``--hot`` is the fraction of transfers that touch one of a handful of hot
+accounts; the rest pick uniformly random accounts.
+
+    python bench_concurrency.py --threads 1 2 4 8 --hot 0 0.5 0.9
+"""
+import argparse
+import random
+import threading
+import time
+
+from account import BankAccount, InsufficientFundsError
+import auth
+from concurrency import ConcurrentLedger
+
+# Only transfers are timed; make building the ledger quick
+auth.ITERATIONS = 1
+
+HOT_ACCOUNTS = 4
+
+
+def make_ledger(n_accounts):
+    accounts = {str(10000 + i): BankAccount(str(10000 + i), "1234", "Personal", 1000)
+                for i in range(n_accounts)}
+    return ConcurrentLedger(accounts)
+
+
+def run(ledger, n_accounts, threads, transfers, hot, seed):
+    ids = list(ledger.accounts)
+    per_thread = transfers // threads
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        for _ in range(per_thread):
+            if rng.random() < hot:
+                source = ids[rng.randrange(HOT_ACCOUNTS)]
+            else:
+                source = ids[rng.randrange(n_accounts)]
+            target = ids[rng.randrange(n_accounts)]
+            try:
+                ledger.transfer(source, target, 1)
+            except InsufficientFundsError:
+                pass
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--transfers", type=int, default=200000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--hot", type=float, nargs="+", default=[0.0, 0.5, 0.9])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'hot':>5} {'transfers/s':>12} {'conserved':>10}")
+    for hot in args.hot:
+        for threads in args.threads:
+            ledger = make_ledger(args.accounts)
+            expected = sum(a.balance for a in ledger.accounts.values())
+            rate = run(ledger, args.accounts, threads, args.transfers, hot, args.seed)
+            total = sum(a.balance for a in ledger.accounts.values())
+            print(f"{threads:>8} {hot:>5.2f} {rate:>12,.0f} {str(total == expected):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Tk event-loop latency while account operations run against a slow backend.
+
+Every mutation is made to take ``--delay`` ms (an observer that sleeps,
+standing in for storage or a remote ledger).  The benchmark clicks the
+deposit button every ``--click`` ms until ``--operations`` deposits have
+gone through, while a 10 ms heartbeat records how late the event loop
+serves it.  It compares running operations inline on the Tk thread with
+the GUI's background dispatcher.
+
+Needs a display (run under ``xvfb-run`` on a headless machine).
+
+    python bench_dispatcher.py --operations 200 --delay 50
+"""
+import argparse
+import sys
+import time
+import tkinter as tk
+from unittest.mock import patch
+
+from account import BankAccount
+import auth
+from gui import BankingGUI
+
+# Opening the benchmark account should not cost a full-strength hash
+auth.ITERATIONS = 1
+
+TICK_MS = 10
+
+
+class SlowBackend:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def record(self, account, kind, amount, detail):
+        time.sleep(self.delay)
+
+
+def run(workers, operations, delay, click_ms):
+    root = tk.Tk()
+    app = BankingGUI(root, workers=workers)
+    account = BankAccount.open("10000000", "1234", "Personal")
+    app.accounts[account.account_id] = account
+    app.current_account = account
+    app.show_deposit()
+    entry = app.amount_entry
+    lateness = []
+
+    def heartbeat(expected):
+        now = time.perf_counter()
+        lateness.append(now - expected)
+        root.after(TICK_MS, heartbeat, now + TICK_MS / 1000)
+
+    def click():
+        if account.balance >= operations * 100:
+            root.quit()
+            return
+        entry.delete(0, tk.END)
+        entry.insert(0, "1")
+        app.do_deposit()
+        root.after(click_ms, click)
+
+    BankAccount.observers = (SlowBackend(delay / 1000),)
+    try:
+        with patch("tkinter.messagebox.showinfo"):
+            start = time.perf_counter()
+            root.after(TICK_MS, heartbeat, start + TICK_MS / 1000)
+            root.after(0, click)
+            root.mainloop()
+            elapsed = time.perf_counter() - start
+    finally:
+        BankAccount.observers = ()
+        app.close()
+        root.destroy()
+    return elapsed, sorted(lateness)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=50.0, help="ms per backend write")
+    parser.add_argument("--click", type=int, default=20, help="ms between clicks")
+    args = parser.parse_args()
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        sys.exit(f"No display available: {e}")
+
+    print(f"{args.operations} deposits, {args.delay:g} ms backend, click every {args.click} ms")
+    for label, workers in (("inline", 0), ("dispatcher", 1)):
+        elapsed, lateness = run(workers, args.operations, args.delay, args.click)
+        print(f"  {label:<11} {elapsed:6.2f} s   heartbeat lateness "
+              f"p50 {lateness[len(lateness) // 2] * 1e3:6.1f} ms  "
+              f"p99 {lateness[int(len(lateness) * 0.99)] * 1e3:6.1f} ms  "
+              f"max {lateness[-1] * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""The app's flows through Tk against the headless controller.
+
+Runs one full session -- create an account, log in, deposit, withdraw,
+transfer, top up, change the passcode, log out -- ``--sessions`` times,
+once through BankingGUI on a real Tk root (messageboxes patched, as in the
+tests) and once through BankingController with a HeadlessRenderer, then
+runs the headless sessions split over ``--processes`` worker processes.
+Also times the two test classes that cover these flows, TestBankingGUI and
+TestBankingController.
+
+The Tk half needs a display (run under ``xvfb-run`` on a headless
+machine); without one it is skipped and only the headless numbers are
+printed.
+
+    python bench_gui_flows.py --sessions 2000 --processes 4
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from account import BankAccount
+import auth
+from controller import BankingController, HeadlessRenderer
+
+# Logins and passcode changes should measure the flows, not the KDF
+auth.ITERATIONS = 1
+
+
+def session(app, n):
+    """One session through app, which has the controller's flow methods"""
+    app.create_account("Personal")
+    account_id = str(10000000 + n)
+    app.accounts[account_id] = BankAccount(account_id, "1234", "Personal", 1000)
+    app.login(account_id, "1234")
+    app.deposit("50")
+    app.withdraw("20")
+    app.transfer("10000000", "5")
+    app.mobile_topup("77123456", "10")
+    app.change_password("4321", "4321")
+    app.show("balance")
+    app.show_main_menu()
+
+
+class TkDriver:
+    """Drives BankingGUI like a user: show the screen, fill its entries, submit"""
+
+    def __init__(self, gui):
+        self.gui = gui
+        self.accounts = gui.accounts
+
+    def fill(self, *pairs):
+        for entry, text in pairs:
+            entry.delete(0, "end")
+            entry.insert(0, text)
+
+    def create_account(self, category):
+        self.gui.show_create_account()
+        self.gui.account_type.set(category)
+        self.gui.create_account()
+
+    def login(self, account_id, passcode):
+        self.gui.show_login()
+        self.fill((self.gui.login_id, account_id), (self.gui.login_pass, passcode))
+        self.gui.login()
+
+    def deposit(self, amount):
+        self.gui.show_deposit()
+        self.fill((self.gui.amount_entry, amount))
+        self.gui.do_deposit()
+
+    def withdraw(self, amount):
+        self.gui.show_withdraw()
+        self.fill((self.gui.amount_entry, amount))
+        self.gui.do_withdraw()
+
+    def transfer(self, recipient_id, amount):
+        self.gui.show_transfer()
+        self.fill((self.gui.recipient_entry, recipient_id), (self.gui.amount_entry, amount))
+        self.gui.do_transfer()
+
+    def mobile_topup(self, mobile, amount):
+        self.gui.show_mobile_topup()
+        self.fill((self.gui.mobile_entry, mobile), (self.gui.amount_entry, amount))
+        self.gui.do_mobile_topup()
+
+    def change_password(self, new_passcode, confirm_passcode):
+        self.gui.show_change_password()
+        self.fill((self.gui.new_pass_entry, new_passcode),
+                  (self.gui.confirm_pass_entry, confirm_passcode))
+        self.gui.do_change_password()
+
+    def show(self, screen):
+        self.gui.show_balance()
+
+    def show_main_menu(self):
+        self.gui.show_main_menu()
+
+
+def headless_app():
+    app = BankingController(HeadlessRenderer())
+    app.accounts["10000000"] = BankAccount("10000000", "1234", "Personal", 1000)
+    return app
+
+
+def run_headless(sessions, first=1):
+    app = headless_app()
+    start = time.perf_counter()
+    for n in range(first, first + sessions):
+        session(app, n)
+    return time.perf_counter() - start
+
+
+def run_tk(sessions):
+    import tkinter as tk
+    from gui import BankingGUI
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        gui = BankingGUI(root)
+        gui.accounts["10000000"] = BankAccount("10000000", "1234", "Personal", 1000)
+        driver = TkDriver(gui)
+        with patch("tkinter.messagebox.showinfo"), patch("tkinter.messagebox.showerror"):
+            start = time.perf_counter()
+            for n in range(1, sessions + 1):
+                session(driver, n)
+                root.update_idletasks()
+            return time.perf_counter() - start
+    finally:
+        root.destroy()
+
+
+def run_parallel(sessions, processes):
+    shares = [(sessions // processes, 1 + i * sessions) for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        pool.starmap(run_headless, [(1, 1)] * processes)  # warm the workers up
+        start = time.perf_counter()
+        pool.starmap(run_headless, shares)
+        return time.perf_counter() - start
+
+
+def time_tests(name):
+    import Pemba_02240320_A3_test
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(getattr(Pemba_02240320_A3_test, name))
+    result = unittest.TestResult()
+    start = time.perf_counter()
+    suite.run(result)
+    return time.perf_counter() - start, suite.countTestCases(), result
+
+
+def display_available():
+    import tkinter as tk
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print(f"{args.sessions:,} sessions of 9 flows each")
+    has_display = display_available()
+    if has_display:
+        elapsed = run_tk(args.sessions)
+        print(f"  Tk BankingGUI          {elapsed / args.sessions * 1e6:9.1f} us/session  "
+              f"({elapsed:.2f} s)")
+    else:
+        print("  Tk BankingGUI          skipped: no display")
+    elapsed = run_headless(args.sessions)
+    print(f"  headless, 1 process    {elapsed / args.sessions * 1e6:9.1f} us/session  "
+          f"({elapsed:.2f} s)")
+    elapsed = run_parallel(args.sessions, args.processes)
+    print(f"  headless, {args.processes} processes  {elapsed / args.sessions * 1e6:9.1f} us/session  "
+          f"({elapsed:.2f} s)")
+
+    for name in ("TestBankingGUI", "TestBankingController"):
+        if name == "TestBankingGUI" and not has_display:
+            print(f"  {name:<22} skipped: no display")
+            continue
+        elapsed, count, result = time_tests(name)
+        print(f"  {name:<22} {count} tests in {elapsed * 1e3:8.1f} ms "
+              f"({len(result.failures) + len(result.errors)} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Screen-switch latency and Tcl object growth of BankingGUI.
+
+Logs into one account and walks ``--transitions`` times round the account
+screens, timing each switch up to ``update_idletasks`` (the point where
+Tk has laid out the new screen).  Compares the cached screens against a
+subclass that destroys and rebuilds every screen, as the GUI used to,
+and reports the number of Tcl commands and live widgets before and after
+so leaks from widgets that are never destroyed show up.
+
+Needs a display (run under ``xvfb-run`` on a headless machine).
+
+    python bench_gui_navigation.py --transitions 10000
+"""
+import argparse
+import sys
+import time
+import tkinter as tk
+
+from account import BankAccount
+import auth
+from gui import BankingGUI
+from history import TransactionHistory
+
+# Opening the benchmark account should not cost a full-strength hash
+auth.ITERATIONS = 1
+
+ROUTE = ("show_balance", "show_account_menu", "show_deposit", "show_account_menu",
+         "show_withdraw", "show_account_menu", "show_transfer", "show_account_menu",
+         "show_mobile_topup", "show_account_menu", "show_change_password", "show_account_menu")
+
+
+class RebuildingGUI(BankingGUI):
+    """BankingGUI that destroys and rebuilds each screen it shows"""
+
+    def show_screen(self, name, build):
+        for frame in self.screens.values():
+            frame.destroy()
+        self.screens.clear()
+        return super().show_screen(name, build)
+
+
+def widget_count(widget):
+    return 1 + sum(widget_count(child) for child in widget.winfo_children())
+
+
+def tcl_commands(root):
+    return len(root.tk.splitlist(root.tk.call("info", "commands")))
+
+
+def run(gui_class, transitions):
+    root = tk.Tk()
+    history = TransactionHistory()
+    history.attach()
+    try:
+        app = gui_class(root, history=history)
+        account = BankAccount.open("10000000", "1234", "Personal", 100)
+        for _ in range(20):
+            account.deposit(5)
+        app.accounts[account.account_id] = account
+        app.current_account = account
+        # One lap to build every screen before measuring
+        for name in ROUTE:
+            getattr(app, name)()
+        root.update()
+        commands, widgets = tcl_commands(root), widget_count(root)
+
+        latencies = []
+        for i in range(transitions):
+            start = time.perf_counter()
+            getattr(app, ROUTE[i % len(ROUTE)])()
+            root.update_idletasks()
+            latencies.append(time.perf_counter() - start)
+        root.update()
+        return latencies, commands, tcl_commands(root), widgets, widget_count(root)
+    finally:
+        history.detach()
+        root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transitions", type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        sys.exit(f"No display available: {e}")
+
+    print(f"{args.transitions:,} screen transitions")
+    for label, gui_class in (("cached screens", BankingGUI), ("rebuild each time", RebuildingGUI)):
+        latencies, commands_before, commands_after, widgets_before, widgets_after = run(
+            gui_class, args.transitions)
+        latencies.sort()
+        total = sum(latencies)
+        print(f"  {label:<18} mean {total / len(latencies) * 1e6:>8.1f} us  "
+              f"p50 {latencies[len(latencies) // 2] * 1e6:>8.1f} us  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:>8.1f} us  "
+              f"({total:.2f} s)")
+        print(f"  {'':<18} Tcl commands {commands_before:,} -> {commands_after:,}, "
+              f"widgets {widgets_before:,} -> {widgets_after:,}")
+
+
+if __name__ == "__main__":
+    main()
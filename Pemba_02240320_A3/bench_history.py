@@ -0,0 +1,65 @@
+"""Query latency of TransactionHistory as the log grows.
+
+Fills the history with ``--rows`` entries spread over ``--accounts``
+accounts (1M and 100M rows are the sizes of interest; 100M needs about
+6 GB of RAM), then times statement pages, date-range queries and
+balance-at-time lookups on random accounts.
+
+    python bench_history.py --rows 1000000 100000000
+"""
+import argparse
+import random
+import time
+
+from history import TransactionHistory
+
+QUERIES = 2000
+
+
+def fill(rows, accounts, seed):
+    rng = random.Random(seed)
+    history = TransactionHistory()
+    balances = [0] * accounts
+    append = history.append
+    for i in range(rows):
+        row = rng.randrange(accounts)
+        amount = rng.randint(-5000, 10000)
+        balances[row] += amount
+        append(str(10000000 + row), 1 if amount >= 0 else 2, amount, balances[row],
+               timestamp=float(i))
+    return history
+
+
+def time_queries(label, rng, accounts, query):
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        query(str(10000000 + rng.randrange(accounts)), rng)
+    per_query = (time.perf_counter() - start) / QUERIES
+    print(f"  {label:<28} {per_query * 1e6:>9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        start = time.perf_counter()
+        history = fill(rows, args.accounts, args.seed)
+        print(f"{rows:,} rows, {rows // args.accounts:,} per account "
+              f"(filled in {time.perf_counter() - start:.1f} s)")
+        rng = random.Random(args.seed)
+        time_queries("latest page (20 rows)", rng, args.accounts,
+                     lambda a, r: history.statement(a))
+        time_queries("deep page (20 rows)", rng, args.accounts,
+                     lambda a, r: history.statement(a, page=history.count(a) // 40))
+        time_queries("date range (<= 20 rows)", rng, args.accounts,
+                     lambda a, r: history.between(a, t := r.uniform(0, rows), t + 20 * args.accounts))
+        time_queries("balance at time", rng, args.accounts,
+                     lambda a, r: history.balance_at(a, r.uniform(0, rows)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark id allocation and check that every id is unique.
+
+Allocates ``--count`` ids one at a time and through reserved blocks, and
+marks each in a bitmap of the id space to verify there are no repeats.
+
+    python bench_id_allocator.py --count 10000000
+"""
+import argparse
+import time
+
+from id_allocator import IdAllocator
+
+
+def check_unique(ids, low, high):
+    seen = bytearray(high - low)
+    for account_id in ids:
+        offset = int(account_id) - low
+        if seen[offset]:
+            return False
+        seen[offset] = 1
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--block", type=int, default=100000)
+    parser.add_argument("--low", type=int, default=10000000)
+    parser.add_argument("--high", type=int, default=100000000)
+    args = parser.parse_args()
+
+    allocator = IdAllocator(args.low, args.high, key=12345)
+    start = time.perf_counter()
+    single = [allocator.allocate() for _ in range(args.count)]
+    single_time = time.perf_counter() - start
+
+    allocator = IdAllocator(args.low, args.high, key=12345)
+    start = time.perf_counter()
+    blocked = []
+    for _ in range(0, args.count, args.block):
+        blocked.extend(allocator.reserve(min(args.block, args.count - len(blocked))))
+    block_time = time.perf_counter() - start
+
+    print(f"ids:              {args.count:,} from a space of {args.high - args.low:,}")
+    print(f"allocate():       {single_time:.2f} s ({args.count / single_time:,.0f} ids/s)")
+    print(f"reserve() blocks: {block_time:.2f} s ({args.count / block_time:,.0f} ids/s)")
+    print(f"same sequence:    {single == blocked}")
+    print(f"unique:           {check_unique(single, args.low, args.high)}")
+
+
+if __name__ == "__main__":
+    main()
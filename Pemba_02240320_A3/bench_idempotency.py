@@ -0,0 +1,106 @@
+"""Retry storm against ConcurrentLedger transfers, with and without request ids.
+
+``--requests`` distinct transfers are sent by ``--threads`` client
+threads.  A ``--retry`` fraction of them time out on the client and are
+sent ``--copies`` more times, the copies spread over the other threads so
+that some arrive while the first attempt is still running.  Without
+request ids every copy moves money again; with them each transfer must run
+exactly once.  Reports calls per second, how many transfers actually ran,
+and the money moved by duplicates.
+
+    python bench_idempotency.py --requests 200000 --retry 0.3 --copies 3
+"""
+import argparse
+import random
+import threading
+import time
+
+from account import BankAccount, InsufficientFundsError
+from concurrency import ConcurrentLedger
+from idempotency import IdempotencyCache
+
+
+class CountingAccount(BankAccount):
+    transfers = 0
+
+    def transfer(self, amount, recipient):
+        CountingAccount.transfers += 1
+        return super().transfer(amount, recipient)
+
+
+def make_schedule(args):
+    rng = random.Random(args.seed)
+    requests = [(f"req-{n}", str(10000 + rng.randrange(args.accounts)),
+                 str(10000 + rng.randrange(args.accounts)), rng.randint(1, 50))
+                for n in range(args.requests)]
+    streams = [[] for _ in range(args.threads)]
+    for n, request in enumerate(requests):
+        thread = n % args.threads
+        streams[thread].append(request)
+        if rng.random() < args.retry:
+            for copy in range(1, args.copies + 1):
+                # A little later, from another client thread
+                streams[(thread + copy) % args.threads].append(request)
+    for stream in streams:
+        # Keep copies near their original so they overlap in time
+        for i in range(len(stream) - 1, 0, -1):
+            j = max(0, i - rng.randrange(8))
+            stream[i], stream[j] = stream[j], stream[i]
+    return requests, streams
+
+
+def run(args, streams, use_ids):
+    accounts = {str(10000 + i): CountingAccount(str(10000 + i), None, "Personal", 10 ** 6)
+                for i in range(args.accounts)}
+    cache = IdempotencyCache(size=args.requests * 2)
+    ledger = ConcurrentLedger(accounts, idempotency=cache)
+    CountingAccount.transfers = 0
+
+    def client(stream):
+        transfer = ledger.transfer
+        for request_id, source, target, amount in stream:
+            try:
+                transfer(source, target, amount, request_id if use_ids else None)
+            except InsufficientFundsError:
+                pass
+
+    threads = [threading.Thread(target=client, args=(stream,)) for stream in streams]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, CountingAccount.transfers, cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--retry", type=float, default=0.3, help="fraction of requests retried")
+    parser.add_argument("--copies", type=int, default=3, help="extra sends per retried request")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    requests, streams = make_schedule(args)
+    calls = sum(map(len, streams))
+    amounts = {request_id: amount for request_id, _, _, amount in requests}
+    duplicate_money = sum(amounts[request[0]] for stream in streams for request in stream)
+    duplicate_money -= sum(amounts.values())
+    print(f"{args.requests:,} transfers, {calls:,} calls from {args.threads} threads "
+          f"({calls - args.requests:,} retries)")
+    for label, use_ids in (("no request ids", False), ("request ids", True)):
+        elapsed, executed, cache = run(args, streams, use_ids)
+        line = (f"  {label:<15} {calls / elapsed:>9,.0f} calls/s  {elapsed / calls * 1e6:6.2f} us/call"
+                f"  {executed:>9,} transfers ran")
+        if use_ids:
+            assert executed == args.requests, "a transfer ran more than once"
+            line += f", {cache.replayed:,} answered from the cache"
+        else:
+            line += f", duplicates moved {duplicate_money:,} extra"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
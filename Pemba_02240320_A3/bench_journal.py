@@ -0,0 +1,82 @@
+"""Benchmark the transaction journal's group commit.
+
+For each commit window, ``--clients`` threads append records and wait for
+them to become durable (sync=True), which is what a caller that must not
+acknowledge before fsync sees.  A second run appends without waiting to
+show the raw throughput available to the Tk event loop.
+
+    python bench_journal.py --ops 20000 --clients 16 --windows 0 0.001 0.005
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from journal import TransactionJournal
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run_sync(path, window, ops, clients):
+    latencies = []
+    lock = threading.Lock()
+    per_client = ops // clients
+
+    def client(n):
+        local = []
+        for i in range(per_client):
+            start = time.perf_counter()
+            journal.append("deposit", str(10000 + n), 100, sync=True)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    journal = TransactionJournal(path, window=window)
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    return len(latencies) / elapsed, percentile(latencies, 99)
+
+
+def run_async(path, window, ops):
+    journal = TransactionJournal(path, window=window)
+    start = time.perf_counter()
+    for i in range(ops):
+        journal.append("deposit", "12345", 100)
+    appended = time.perf_counter() - start
+    journal.wait()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    return ops / appended, ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 0.0005, 0.002, 0.005])
+    args = parser.parse_args()
+
+    print(f"{'window (ms)':>12} {'sync ops/s':>12} {'p99 commit (ms)':>16} "
+          f"{'append ops/s':>13} {'durable ops/s':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for window in args.windows:
+            path = os.path.join(tmp, f"sync-{window}.journal")
+            sync_rate, p99 = run_sync(path, window, args.ops, args.clients)
+            path = os.path.join(tmp, f"async-{window}.journal")
+            append_rate, durable_rate = run_async(path, window, args.ops)
+            print(f"{window * 1000:>12.2f} {sync_rate:>12,.0f} {p99 * 1000:>16.3f} "
+                  f"{append_rate:>13,.0f} {durable_rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cost of enforcing category limits and fees, per operation.
+
+Runs the same withdrawals and transfers over ``--accounts`` accounts with
+and without a LimitEngine attached: one BankAccount call at a time, and
+as ``apply_batch`` batches of ``--batch`` operations on an AccountStore.
+Reports operations per second and the added nanoseconds per operation,
+also as a share of the 1 us each operation gets at 1M ops/s.
+
+    python bench_limits.py --ops 1000000
+"""
+import argparse
+import random
+import time
+
+from account import BankAccount, InsufficientFundsError, InvalidInputError
+from account_store import AccountStore
+import auth
+from limits import LimitEngine
+from posting import apply_batch
+
+# Only the operations are timed; make building the accounts quick
+auth.ITERATIONS = 1
+
+FIRST_ID = 10000000
+
+
+def make_ops(n_accounts, n_ops, seed):
+    rng = random.Random(seed)
+    ops = []
+    for _ in range(n_ops):
+        source = str(FIRST_ID + rng.randrange(n_accounts))
+        if rng.random() < 0.5:
+            ops.append((source, "withdraw", rng.randint(1, 5000)))
+        else:
+            ops.append((source, "transfer", rng.randint(1, 5000),
+                        str(FIRST_ID + rng.randrange(n_accounts))))
+    return ops
+
+
+def make_store(n_accounts):
+    store = AccountStore(capacity=n_accounts)
+    for i in range(n_accounts):
+        store.add(FIRST_ID + i, "1234", "Business" if i % 5 == 0 else "Personal", 10 ** 6)
+    return store
+
+
+def single(ops, n_accounts):
+    accounts = {str(FIRST_ID + i): BankAccount(str(FIRST_ID + i), None,
+                                              "Business" if i % 5 == 0 else "Personal", 10 ** 6)
+                for i in range(n_accounts)}
+    calls = [(accounts[op[0]].withdraw, (op[2] / 100,)) if op[1] == "withdraw" else
+             (accounts[op[0]].transfer, (op[2] / 100, accounts[op[3]])) for op in ops]
+    start = time.perf_counter()
+    for method, args in calls:
+        try:
+            method(*args)
+        except (InvalidInputError, InsufficientFundsError):
+            pass
+    return time.perf_counter() - start
+
+
+def batched(ops, n_accounts, batch):
+    store = make_store(n_accounts)
+    start = time.perf_counter()
+    for i in range(0, len(ops), batch):
+        apply_batch(store, ops[i:i + batch])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=1000000)
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    ops = make_ops(args.accounts, args.ops, args.seed)
+    print(f"{args.ops:,} withdrawals and transfers over {args.accounts:,} accounts")
+    for label, run in (("single calls", lambda: single(ops, args.accounts)),
+                       (f"batches of {args.batch:,}", lambda: batched(ops, args.accounts, args.batch))):
+        plain = run()
+        engine = LimitEngine()
+        engine.attach()
+        try:
+            limited = run()
+        finally:
+            engine.detach()
+        added = (limited - plain) / args.ops
+        print(f"  {label:<18} no limits {args.ops / plain:>10,.0f} ops/s   "
+              f"limits {args.ops / limited:>10,.0f} ops/s   "
+              f"+{added * 1e9:4.0f} ns/op ({added * 1e6:.0%} of 1 us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Overhead of metrics instrumentation per BankAccount operation.
+
+Runs the same mix of deposits, withdrawals (some failing for lack of
+funds) and transfers with metrics detached, attached timing every call,
+attached with ``--sample``, and attached with a no-op span hook.  Reports
+nanoseconds per operation and what instrumentation adds to it.
+
+    python bench_metrics.py --ops 1000000 --sample 16
+"""
+import argparse
+import random
+import time
+
+from account import BankAccount, InsufficientFundsError
+from metrics import Metrics
+
+
+def make_calls(n_ops, seed):
+    rng = random.Random(seed)
+    accounts = [BankAccount(str(10000 + i), None, "Personal", 1000) for i in range(1000)]
+    calls = []
+    for _ in range(n_ops):
+        account = rng.choice(accounts)
+        r = rng.random()
+        if r < 0.4:
+            calls.append((account.deposit, (rng.randint(1, 100),)))
+        elif r < 0.7:
+            calls.append((account.withdraw, (rng.randint(1, 150),)))
+        else:
+            calls.append((account.transfer, (rng.randint(1, 100), rng.choice(accounts))))
+    return calls
+
+
+def run(calls):
+    # Bound methods are looked up again per call, as callers would, so an
+    # attached Metrics is seen
+    calls = [(method.__self__, method.__name__, args) for method, args in calls]
+    start = time.perf_counter()
+    for account, name, args in calls:
+        try:
+            getattr(account, name)(*args)
+        except InsufficientFundsError:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=1000000)
+    parser.add_argument("--sample", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    calls = make_calls(args.ops, args.seed)
+    print(f"{args.ops:,} deposits, withdrawals and transfers")
+    base = None
+    for label, metrics, hook in (("off", None, False),
+                                 ("on", Metrics(), False),
+                                 (f"sampled 1/{args.sample}", Metrics(sample=args.sample), False),
+                                 ("on + span hook", Metrics(), True)):
+        if metrics is not None:
+            metrics.attach()
+            if hook:
+                metrics.add_span_hook(lambda name, start, end, error: None)
+        try:
+            elapsed = min(run(calls) for _ in range(3))
+        finally:
+            if metrics is not None:
+                metrics.detach()
+        per_op = elapsed / args.ops * 1e9
+        if base is None:
+            base = per_op
+        print(f"  {label:<16} {per_op:7.0f} ns/op  +{per_op - base:5.0f} ns")
+    withdraw = metrics.operations["withdraw"].latency
+    print(f"  withdraw p50 {withdraw.percentile(0.5)} ns, p99 {withdraw.percentile(0.99)} ns, "
+          f"max {withdraw.max} ns")
+
+
+if __name__ == "__main__":
+    main()
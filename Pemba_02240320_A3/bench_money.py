@@ -0,0 +1,76 @@
+"""Benchmark fixed-point parsing and posting against the old float path.
+
+Random deposit/withdraw amounts are generated as text (as typed into the
+GUI), parsed and posted to a set of balances.  The integer path must end
+with exactly the expected total; the float path shows the drift it
+accumulates.
+
+Expect the float path to stay several times faster: ``float()`` is one C
+call that accepts any float literal, while ``parse_amount`` checks the
+amount grammar in Python before building the exact integer.  The exact
+total is what that cost buys.
+
+    python bench_money.py --ops 10000000
+"""
+import argparse
+import random
+import time
+from array import array
+
+from money import format_amount, parse_amount
+
+
+def make_ops(n, accounts, seed):
+    rng = random.Random(seed)
+    ops = []
+    expected = 0
+    for _ in range(n):
+        cents = rng.randint(1, 99999)
+        if rng.random() < 0.5:
+            cents = -cents
+        expected += cents
+        ops.append((rng.randrange(accounts), format_amount(cents)))
+    return ops, expected
+
+
+def post_fixed(ops, accounts):
+    balances = array("q", bytes(8 * accounts))
+    for row, text in ops:
+        balances[row] += parse_amount(text)
+    return sum(balances)
+
+
+def post_float(ops, accounts):
+    balances = [0.0] * accounts
+    for row, text in ops:
+        balances[row] += float(text)
+    return sum(balances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=1000000)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    ops, expected = make_ops(args.ops, args.accounts, args.seed)
+
+    start = time.perf_counter()
+    fixed_total = post_fixed(ops, args.accounts)
+    fixed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    float_total = post_float(ops, args.accounts)
+    float_time = time.perf_counter() - start
+
+    print(f"operations:     {args.ops:,}")
+    print(f"expected total: {format_amount(expected)}")
+    print(f"fixed-point:    {fixed_time:.2f} s ({args.ops / fixed_time:,.0f} ops/s), "
+          f"total {format_amount(fixed_total)}, exact: {fixed_total == expected}")
+    print(f"float:          {float_time:.2f} s ({args.ops / float_time:,.0f} ops/s), "
+          f"total {float_total!r}, error {float_total - expected / 100:.3e}")
+
+
+if __name__ == "__main__":
+    main()
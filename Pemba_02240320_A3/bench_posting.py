@@ -0,0 +1,86 @@
+"""Benchmark apply_batch against one BankAccount call per posting.
+
+    python bench_posting.py --accounts 100000 --postings 1000000
+"""
+import argparse
+import random
+import time
+
+from account import InsufficientFundsError, InvalidInputError
+from account_store import AccountStore
+import auth
+from posting import DEPOSIT, TRANSFER, WITHDRAW, apply_batch
+
+# Account creation is not what is measured here; keep the passcode KDF cheap
+auth.ITERATIONS = 1
+
+
+def make_ops(n_accounts, n_ops, seed):
+    rng = random.Random(seed)
+    kinds = (DEPOSIT, WITHDRAW, TRANSFER)
+    ops = []
+    for _ in range(n_ops):
+        account_id = str(10000000 + rng.randrange(n_accounts))
+        kind = kinds[rng.randrange(3)]
+        amount = rng.randint(1, 200) * 100
+        if kind == TRANSFER:
+            ops.append((account_id, kind, amount, str(10000000 + rng.randrange(n_accounts))))
+        else:
+            ops.append((account_id, kind, amount))
+    return ops
+
+
+def make_store(n_accounts):
+    store = AccountStore(capacity=n_accounts)
+    for i in range(n_accounts):
+        store.add(10000000 + i, "1234", "Personal", 100)
+    return store
+
+
+def per_call(store, ops):
+    failures = 0
+    for op in ops:
+        account = store[op[0]]
+        try:
+            if op[1] == DEPOSIT:
+                account.deposit(op[2] // 100)
+            elif op[1] == WITHDRAW:
+                account.withdraw(op[2] // 100)
+            else:
+                account.transfer(op[2] // 100, store[op[3]])
+        except (InvalidInputError, InsufficientFundsError):
+            failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--postings", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    ops = make_ops(args.accounts, args.postings, args.seed)
+
+    store = make_store(args.accounts)
+    start = time.perf_counter()
+    failures = per_call(store, ops)
+    loop_time = time.perf_counter() - start
+    loop_total = sum(store.balances)
+
+    store = make_store(args.accounts)
+    start = time.perf_counter()
+    status = apply_batch(store, ops)
+    batch_time = time.perf_counter() - start
+    batch_total = sum(store.balances)
+
+    print(f"postings:   {args.postings:,}")
+    print(f"per-call:   {loop_time:.3f} s  ({args.postings / loop_time:,.0f}/s, {failures:,} rejected)")
+    print(f"batch:      {batch_time:.3f} s  ({args.postings / batch_time:,.0f}/s, "
+          f"{sum(1 for s in status if s):,} rejected)")
+    print(f"speed-up:   {loop_time / batch_time:.1f}x")
+    print(f"totals match: {loop_total == batch_total}")
+
+
+if __name__ == "__main__":
+    main()
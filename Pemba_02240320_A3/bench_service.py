@@ -0,0 +1,115 @@
+"""Load generator for the banking service.
+
+Starts a service in a child process (or targets ``--host/--port`` or
+``--unix`` with ``--external``), opens ``--clients`` connections that each
+keep ``--depth`` requests in flight, and reports requests/sec and latency
+percentiles.
+
+    python bench_service.py --clients 32 --depth 16 --seconds 5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from service import (BALANCE, CREATE, DEPOSIT, LOGIN, OK, TRANSFER, WITHDRAW,
+                     BankClient, serve_forever)
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def client_loop(connect, depth, deadline, recipients, latencies, seed):
+    rng = random.Random(seed)
+    client = await connect()
+    account_id, passcode = await client.call(CREATE, "Personal")
+    await client.call(LOGIN, account_id, passcode)
+    await client.call(DEPOSIT, "1000000")
+    recipients.append(account_id)
+    mix = (BALANCE, DEPOSIT, WITHDRAW, TRANSFER)
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        op = mix[rng.randrange(len(mix))]
+        start = time.perf_counter()
+        if op == TRANSFER:
+            future = client.send(TRANSFER, rng.choice(recipients), "1")
+        elif op == BALANCE:
+            future = client.send(BALANCE)
+        else:
+            future = client.send(op, "1")
+        status, _ = await future
+        latencies.append(time.perf_counter() - start)
+        if status != OK:
+            errors += 1
+
+    async def lane():
+        while time.perf_counter() < deadline:
+            await one()
+
+    await asyncio.gather(*(lane() for _ in range(depth)))
+    await client.close()
+    return errors
+
+
+async def run(args, connect):
+    latencies = []
+    recipients = []
+    deadline = time.perf_counter() + args.seconds
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(
+        client_loop(connect, args.depth, deadline, recipients, latencies, args.seed + n)
+        for n in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"clients x depth: {args.clients} x {args.depth}")
+    print(f"requests:        {len(latencies):,} ({sum(errors):,} rejected)")
+    print(f"requests/sec:    {len(latencies) / elapsed:,.0f}")
+    for pct in (50, 90, 99, 99.9):
+        print(f"p{pct:<5}          {percentile(latencies, pct) * 1000:.3f} ms")
+
+
+def run_server(host, port, unix_path):
+    asyncio.run(serve_forever(host, port, unix_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="use a Unix socket")
+    parser.add_argument("--external", action="store_true",
+                        help="connect to an already running service")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.unix == "auto":
+            args.unix = os.path.join(tmp, "bank.sock")
+        if not args.external:
+            server = multiprocessing.Process(
+                target=run_server, args=(args.host, args.port, args.unix), daemon=True)
+            server.start()
+            time.sleep(0.5)
+
+        def connect():
+            return BankClient.connect(args.host, args.port, args.unix)
+
+        try:
+            asyncio.run(run(args, connect))
+        finally:
+            if server is not None:
+                server.terminate()
+
+
+if __name__ == "__main__":
+    main()
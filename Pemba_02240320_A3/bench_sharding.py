@@ -0,0 +1,56 @@
+"""Throughput of the sharded ledger from 1 to N worker processes.
+
+Each round sends one batch of deposits and withdrawals per shard and
+waits for all shards, so shards work in parallel.
+
+    python bench_sharding.py --max-workers 8 --ops 400000
+"""
+import argparse
+import os
+import random
+import time
+
+import auth
+from sharding import ShardedLedger
+
+# Opening the accounts is setup, not part of the measurement
+auth.ITERATIONS = 1
+
+
+def run(workers, n_accounts, n_ops, batch, seed):
+    rng = random.Random(seed)
+    ids = [str(10000000 + i) for i in range(n_accounts)]
+    with ShardedLedger(workers) as ledger:
+        ledger.run_batch([("open", account_id, "1234", "Personal", 100000) for account_id in ids])
+        commands = [("deposit" if rng.random() < 0.5 else "withdraw",
+                     ids[rng.randrange(n_accounts)], rng.randint(1, 500))
+                    for _ in range(n_ops)]
+        start = time.perf_counter()
+        for i in range(0, n_ops, batch):
+            ledger.run_batch(commands[i:i + batch])
+        elapsed = time.perf_counter() - start
+    return n_ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=400000)
+    parser.add_argument("--batch", type=int, default=20000,
+                        help="operations per round, split across shards")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'ops/s':>12} {'speed-up':>9}")
+    base = None
+    workers = 1
+    while workers <= args.max_workers:
+        rate = run(workers, args.accounts, args.ops, args.batch, args.seed)
+        base = base or rate
+        print(f"{workers:>8} {rate:>12,.0f} {rate / base:>8.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Cold start from a snapshot against replaying a journal.
+
+For each ``--sizes`` account count, builds an AccountStore, writes a
+snapshot of it in the background while deposits keep running (reporting
+the writers' pause for the cut and their throughput meanwhile), then
+times a fresh process from its imports to its first successful login: once
+mapping the snapshot, and once replaying a journal of the same accounts
+(only up to ``--replay-up-to`` accounts, as that takes minutes at 10M).
+The files are evicted from the page cache before each start, so the
+numbers include reading from disk.
+
+    python bench_snapshot.py --sizes 1000000 10000000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from account_store import AccountStore
+from auth import hash_passcode
+from journal import MAGIC, encode_record
+from snapshot import Snapshotter
+
+FIRST_ID = 10000000
+PASSCODE = "1234"
+
+START = """
+import time
+start = time.perf_counter()
+import sys
+from auth import Authenticator
+from {module} import {function}
+imported = time.perf_counter()
+accounts = {function}({args})
+account = Authenticator().login(accounts, sys.argv[1], "1234")
+print(imported - start, time.perf_counter() - imported, len(accounts), account.funds)
+"""
+
+
+def build_store(n, record):
+    """A store of n accounts, filled column-wise rather than one add() at a time"""
+    store = AccountStore(capacity=1)
+    store.ids = array("q", range(FIRST_ID, FIRST_ID + n))
+    store.balances = array("q", [10000]) * n
+    store.categories = array("b", bytes(n))
+    store.passcode_hashes = bytearray(record * n)
+    store.reserve(n)
+    return store
+
+
+def write_journal(path, n, record):
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        for i in range(n):
+            f.write(encode_record("open", str(FIRST_ID + i), 10000, "Personal", record.hex()))
+
+
+def evict(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def cold_start(script, account_id):
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", script, account_id], cwd=here, check=True,
+                            capture_output=True, text=True).stdout
+    imports, to_login, count, funds = output.split()
+    assert float(funds) == 100.0
+    return float(imports), float(to_login), int(count)
+
+
+def snapshot_under_load(store, path):
+    """Write a snapshot while deposits run; returns (pause, write s, deposits/s during, idle)"""
+    rng = random.Random(1)
+    rows = [store.view(rng.randrange(len(store))) for _ in range(1000)]
+
+    def deposits(seconds):
+        count = 0
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            for account in rows[:100]:
+                account.deposit(1)
+            count += 100
+        return count / seconds
+
+    idle = deposits(1.0)
+    snapshotter = Snapshotter(store, path)
+    start = time.perf_counter()
+    snapshotter.snapshot()
+    count = 0
+    while snapshotter.busy:
+        for account in rows[:100]:
+            account.deposit(1)
+        count += 100
+    elapsed = time.perf_counter() - start
+    snapshotter.wait()
+    return snapshotter.last_pause, elapsed, count / elapsed, idle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--replay-up-to", type=int, default=1000000)
+    parser.add_argument("--dir", help="where to write the files (default: a temporary directory)")
+    args = parser.parse_args()
+
+    record = hash_passcode(PASSCODE, iterations=1)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for n in args.sizes:
+            snapshot_path = os.path.join(tmp, "accounts.snap")
+            journal_path = os.path.join(tmp, "accounts.journal")
+            start = time.perf_counter()
+            store = build_store(n, record)
+            print(f"{n:,} accounts (built in {time.perf_counter() - start:.1f} s)")
+            pause, write, during, idle = snapshot_under_load(store, snapshot_path)
+            print(f"  background snapshot  {write:6.2f} s, {os.path.getsize(snapshot_path) / 1e6:,.0f} MB"
+                  f" ({os.stat(snapshot_path).st_blocks * 512 / 1e6:,.0f} MB on disk); writers paused "
+                  f"{pause * 1e3:.1f} ms, {during:,.0f} deposits/s meanwhile ({idle:,.0f} idle)")
+            del store
+            account_id = str(FIRST_ID + n - 1)
+
+            evict(snapshot_path)
+            script = START.format(module="snapshot", function="load_snapshot",
+                                  args=repr(snapshot_path))
+            imports, to_login, count = cold_start(script, account_id)
+            assert count == n
+            print(f"  mmap snapshot        {to_login * 1e3:9.1f} ms to first login "
+                  f"(after {imports * 1e3:.0f} ms of imports)")
+
+            if n <= args.replay_up_to:
+                write_journal(journal_path, n, record)
+                evict(journal_path)
+                script = START.format(module="journal", function="replay",
+                                      args=repr(journal_path))
+                imports, to_login, count = cold_start(script, account_id)
+                assert count == n
+                print(f"  journal replay       {to_login * 1e3:9.1f} ms to first login "
+                      f"(after {imports * 1e3:.0f} ms of imports)")
+                os.remove(journal_path)
+            os.remove(snapshot_path)
+
+
+if __name__ == "__main__":
+    main()
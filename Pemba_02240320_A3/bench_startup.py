@@ -0,0 +1,97 @@
+"""Cold-start cost of the core and GUI entry points.
+
+Starts a fresh interpreter ``--runs`` times per entry point and reports
+the medians of: the whole process (interpreter start to exit), the time
+from the first import to the first completed operation (a deposit), and
+the total ``-X importtime`` of the modules it loaded, with the slowest
+of them and whether tkinter was among them.
+
+    core  from Pemba_02240320_A3_PA import BankAccount; open an account, deposit
+    gui   from Pemba_02240320_A3_PA import BankingGUI; build it on a Tk root
+          (without a display: the import only) and deposit through it
+
+    python bench_startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = {
+    "core": """
+import time
+start = time.perf_counter()
+import auth
+auth.ITERATIONS = 1
+from Pemba_02240320_A3_PA import BankAccount
+account = BankAccount.open("10000000", "1234", "Personal")
+account.deposit(1)
+print(time.perf_counter() - start)
+""",
+    "gui": """
+import time
+start = time.perf_counter()
+import auth
+auth.ITERATIONS = 1
+from Pemba_02240320_A3_PA import BankAccount, BankingGUI
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    root = None
+if root is not None:
+    app = BankingGUI(root)
+    app.current_account = app.accounts["10000000"] = BankAccount("10000000", None, "Personal")
+    app.controller.deposit("1")
+    root.destroy()
+print(time.perf_counter() - start)
+""",
+}
+
+
+def import_times(stderr):
+    """({top-level module: cumulative us}, {module: self us}) from -X importtime output"""
+    top_level, own = {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        own[name.strip()] = int(self_us)
+        if not name.startswith("  "):  # nested imports are indented further
+            top_level[name.strip()] = int(cumulative)
+    return top_level, own
+
+
+def run(script):
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=here,
+                            check=True, capture_output=True, text=True)
+    process = time.perf_counter() - start
+    return process, float(result.stdout), import_times(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--entry-points", nargs="+", choices=list(ENTRY_POINTS),
+                        default=list(ENTRY_POINTS))
+    args = parser.parse_args()
+
+    for name in args.entry_points:
+        runs = [run(ENTRY_POINTS[name]) for _ in range(args.runs)]
+        process = statistics.median(r[0] for r in runs)
+        first_op = statistics.median(r[1] for r in runs)
+        top_level, own = runs[-1][2]
+        total = statistics.median(sum(r[2][0].values()) for r in runs)
+        slowest = sorted(own.items(), key=lambda item: -item[1])[:5]
+        print(f"{name:<5} process {process * 1e3:6.1f} ms   first operation {first_op * 1e3:6.1f} ms"
+              f"   imports {total / 1e3:6.1f} ms ({len(own)} modules), "
+              f"tkinter {'loaded' if 'tkinter' in own else 'not loaded'}")
+        print("      slowest modules (own time): "
+              + ", ".join(f"{module} {us / 1e3:.1f} ms" for module, us in slowest))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Reproducible benchmark suite for the banking core, with regression checks.
+
+``run`` times each scenario on a seeded Zipfian workload (see workload.py)
+and writes the results (throughput and latency percentiles per scenario,
+plus the configuration and platform) as JSON:
+
+    create     BankAccount.open into an AccountStore, with ids from IdAllocator
+    login      Authenticator.login of Zipf-chosen accounts (hot ones hit the cache)
+    mix        deposits, withdrawals, transfers and top-ups in ``--mix`` shares
+    contention transfers between Zipf-chosen accounts on ConcurrentLedger from
+               ``--threads`` threads
+    topup      BankAccount.mobile_topup
+    history    statement pages, date ranges and balance_at on a TransactionHistory
+
+Each scenario runs ``--repeat`` times on fresh state and its fastest run
+is kept.  ``compare`` reads two result files and flags every scenario
+whose throughput fell, or whose p99 latency rose, by more than
+``--threshold``; it exits with status 1 if there is any.
+
+    python bench_suite.py run --output base.json
+    python bench_suite.py run --output new.json
+    python bench_suite.py compare base.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+
+from account import BankAccount, InsufficientFundsError
+from account_store import AccountStore
+import auth
+from auth import Authenticator
+from concurrency import ConcurrentLedger
+from history import TransactionHistory
+from id_allocator import IdAllocator
+from metrics import Histogram
+from workload import MIX, Workload, parse_mix
+
+SCENARIOS = ("create", "login", "mix", "contention", "topup", "history")
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+FUNDS = 10 ** 6
+
+
+def make_store(workload):
+    store = AccountStore(capacity=len(workload.account_ids))
+    for i, account_id in enumerate(workload.account_ids):
+        store.add(account_id, "1234", "Business" if i % 5 == 0 else "Personal", FUNDS)
+    return store
+
+
+def timed(calls, latency):
+    """Run (function, args) calls, recording each one's latency; returns elapsed seconds"""
+    clock = time.perf_counter_ns
+    record = latency.record
+    start = time.perf_counter()
+    for function, args in calls:
+        before = clock()
+        try:
+            function(*args)
+        except InsufficientFundsError:
+            pass
+        record(clock() - before)
+    return time.perf_counter() - start
+
+
+def scenario_create(workload, args, latency):
+    store = AccountStore(capacity=args.creates)
+    allocator = IdAllocator(key=args.seed)
+
+    def create():
+        account_id = allocator.allocate()
+        store[account_id] = BankAccount.open(account_id, "1234", "Personal", 100)
+
+    return args.creates, timed([(create, ())] * args.creates, latency)
+
+
+def scenario_login(workload, args, latency):
+    store = make_store(workload)
+    authenticator = Authenticator(cache_size=len(store) // 10)
+    login = authenticator.login
+    calls = [(login, (store, account_id, "1234")) for account_id in workload.pick(args.logins)]
+    return len(calls), timed(calls, latency)
+
+
+def account_calls(store, ops):
+    calls = []
+    for kind, source, amount, extra in ops:
+        account = store[source]
+        if kind == "deposit":
+            calls.append((account.deposit, (amount,)))
+        elif kind == "withdraw":
+            calls.append((account.withdraw, (amount,)))
+        elif kind == "transfer":
+            calls.append((account.transfer, (amount, store[extra])))
+        else:
+            calls.append((account.mobile_topup, (amount, extra)))
+    return calls
+
+
+def scenario_mix(workload, args, latency):
+    store = make_store(workload)
+    calls = account_calls(store, workload.operations(args.ops))
+    return len(calls), timed(calls, latency)
+
+
+def scenario_topup(workload, args, latency):
+    store = make_store(workload)
+    calls = [(store[account_id].mobile_topup, (workload.rng.randint(1, 100), workload.mobile()))
+             for account_id in workload.pick(args.ops)]
+    return len(calls), timed(calls, latency)
+
+
+def scenario_contention(workload, args, latency):
+    ledger = ConcurrentLedger(make_store(workload))
+    sources = workload.pick(args.ops)
+    targets = workload.pick(args.ops)
+    calls = [(ledger.transfer, (source, target, workload.rng.randint(1, 100)))
+             for source, target in zip(sources, targets) if source != target]
+    shares = [calls[i::args.threads] for i in range(args.threads)]
+    latencies = [Histogram() for _ in shares]
+    threads = [threading.Thread(target=timed, args=(share, histogram))
+               for share, histogram in zip(shares, latencies)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for histogram in latencies:
+        latency.merge(histogram)
+    return len(calls), elapsed
+
+
+def scenario_history(workload, args, latency):
+    store = make_store(workload)
+    history = TransactionHistory(clock=iter(range(10 ** 12)).__next__)
+    history.attach()
+    try:
+        for function, call_args in account_calls(store, workload.operations(args.ops)):
+            try:
+                function(*call_args)
+            except InsufficientFundsError:
+                pass
+    finally:
+        history.detach()
+    end = len(history)
+    rng = workload.rng
+    calls = []
+    for account_id in workload.pick(args.queries):
+        query = rng.randrange(3)
+        if query == 0:
+            calls.append((history.statement, (account_id, rng.randrange(3))))
+        elif query == 1:
+            start = rng.randrange(end)
+            calls.append((history.between, (account_id, start, start + end // 10, 100)))
+        else:
+            calls.append((history.balance_at, (account_id, rng.randrange(end))))
+    return len(calls), timed(calls, latency)
+
+
+def run_scenario(name, args):
+    best = None
+    for _ in range(args.repeat):
+        workload = Workload(args.accounts, args.seed, args.skew, args.mix)
+        latency = Histogram()
+        ops, elapsed = globals()["scenario_" + name](workload, args, latency)
+        if best is None or elapsed < best[1]:
+            best = ops, elapsed, latency
+    ops, elapsed, latency = best
+    result = {"ops": ops, "seconds": round(elapsed, 6), "ops_per_sec": round(ops / elapsed, 1)}
+    for label, q in QUANTILES.items():
+        result[label + "_us"] = round(latency.percentile(q) / 1e3, 3)
+    result["max_us"] = round(latency.max / 1e3, 3)
+    return result
+
+
+def run(args):
+    auth.ITERATIONS = args.kdf_iterations
+    config = {key: value for key, value in vars(args).items() if key not in ("command", "output")}
+    report = {"config": config,
+              "platform": {"python": platform.python_version(),
+                           "implementation": platform.python_implementation(),
+                           "machine": platform.machine(), "system": platform.system()},
+              "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "results": {}}
+    for name in args.scenarios:
+        result = report["results"][name] = run_scenario(name, args)
+        print(f"{name:<11} {result['ops_per_sec']:>12,.0f} ops/s   p50 {result['p50_us']:9.1f} us"
+              f"   p99 {result['p99_us']:9.1f} us", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for key in sorted(set(base["config"]) | set(new["config"])):
+        if key != "repeat" and base["config"].get(key) != new["config"].get(key):
+            print(f"note: runs differ in {key}: {base['config'].get(key)} vs "
+                  f"{new['config'].get(key)}")
+    base, new = base["results"], new["results"]
+    regressions = 0
+    print(f"{'scenario':<11} {'ops/s base':>12} {'ops/s new':>12} {'change':>8} "
+          f"{'p99 base':>10} {'p99 new':>10} {'change':>8}")
+    for name in base:
+        if name not in new:
+            print(f"{name:<11} missing from {args.new}")
+            continue
+        old, cur = base[name], new[name]
+        throughput = cur["ops_per_sec"] / old["ops_per_sec"] - 1
+        p99 = cur["p99_us"] / old["p99_us"] - 1 if old["p99_us"] else 0.0
+        flag = ""
+        if throughput < -args.threshold or p99 > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<11} {old['ops_per_sec']:>12,.0f} {cur['ops_per_sec']:>12,.0f} "
+              f"{throughput:>+8.1%} {old['p99_us']:>10.1f} {cur['p99_us']:>10.1f} {p99:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the scenarios and write JSON results")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--accounts", type=int, default=10000)
+    run_parser.add_argument("--ops", type=int, default=200000)
+    run_parser.add_argument("--creates", type=int, default=20000)
+    run_parser.add_argument("--logins", type=int, default=20000)
+    run_parser.add_argument("--queries", type=int, default=100000)
+    run_parser.add_argument("--threads", type=int, default=4)
+    run_parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent (0 = uniform)")
+    run_parser.add_argument("--mix", type=parse_mix, default=MIX,
+                            help='operation shares, e.g. "deposit=40,withdraw=30,transfer=30"')
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--kdf-iterations", type=int, default=1000,
+                            help="passcode hash work factor for created accounts")
+    run_parser.add_argument("--output", help="JSON file to write (default: stdout)")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="allowed relative drop in ops/s or rise in p99")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Throughput and end-to-end latency of the mobile top-up pipeline.
+
+Submits ``--topups`` top-ups from ``--accounts`` accounts through
+``mobile_topup`` against the local operator simulator, in bursts of
+``--burst`` per event-loop turn, and reports top-ups per second from the
+first debit to the last delivery or refund, and the latency from debit to
+result.  Each ``--max-batch`` size is run in turn so the effect of
+coalescing shows; a batch size of 1 is the unbatched baseline.
+
+    python bench_topup.py --topups 20000 --max-batch 1 10 100 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from account import BankAccount
+from topup import OperatorSimulator, TopupGateway
+
+
+async def run(args, max_batch):
+    operator = OperatorSimulator(latency=args.latency / 1000, per_item=args.per_item / 1e6,
+                                 failure_rate=args.failure_rate,
+                                 lost_reply_rate=args.lost_reply_rate, seed=args.seed)
+    latencies = []
+    gateway = TopupGateway(operator, max_batch=max_batch, concurrency=args.concurrency,
+                           backoff=0.01,
+                           on_result=lambda r, ok: latencies.append(time.perf_counter() - r.queued_at))
+    await gateway.start()
+    accounts = [BankAccount(str(10000000 + i), None, "Personal", 10 ** 9)
+                for i in range(args.accounts)]
+    gateway.attach()
+    start = time.perf_counter()
+    try:
+        for i in range(args.topups):
+            prefix = "17" if i % 2 else "77"
+            accounts[i % args.accounts].mobile_topup(5, f"{prefix}{i % 1000000:06d}")
+            if i % args.burst == args.burst - 1:
+                await asyncio.sleep(0)
+    finally:
+        gateway.detach()
+        await gateway.close()
+    elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), gateway, operator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topups", type=int, default=20000)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=20.0, help="ms per operator call")
+    parser.add_argument("--per-item", type=float, default=20.0, help="us per top-up in a call")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--lost-reply-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.topups:,} top-ups, operator {args.latency:g} ms + {args.per_item:g} us/item, "
+          f"{args.concurrency} batches in flight")
+    for max_batch in args.max_batch:
+        elapsed, latencies, gateway, operator = asyncio.run(run(args, max_batch))
+        print(f"  batch {max_batch:>5}: {args.topups / elapsed:>10,.0f} top-ups/s  "
+              f"p50 {latencies[len(latencies) // 2] * 1e3:8.1f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:8.1f} ms  "
+              f"{operator.calls:,} calls, {gateway.refunded:,} refunded, "
+              f"{len(gateway.unresolved):,} unresolved")
+
+
+if __name__ == "__main__":
+    main()
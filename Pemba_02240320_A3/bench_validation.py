@@ -0,0 +1,104 @@
+"""Bulk validation: column validators against per-call checks that raise.
+
+Builds ``--records`` (amount, mobile number, passcode) rows with about
+``--invalid`` of each field malformed, then validates every row twice:
+once the way the account methods used to, one value at a time with an
+exception for each bad field, and once with the column validators in
+``validation``, which return error codes.  Both must find the same bad
+rows.
+
+Rows are drawn from a pool of ``--pool`` distinct values per field, which
+keeps 10M rows in memory.  The column validators gain from repeated
+values; with a pool about as large as ``--records`` they only keep pace
+with the per-call checks, as each column is a separate pass over the rows.
+
+    python bench_validation.py --records 10000000
+"""
+import argparse
+import random
+import time
+
+from money import parse_amount
+from validation import check_amounts, check_mobiles, check_passcodes, first_errors
+
+
+class InvalidInputError(Exception):
+    pass
+
+
+def make_pool(rng, invalid, size):
+    def amount():
+        if rng.random() < invalid:
+            return rng.choice(["", "abc", "1.234", "-5", "0", "1,000", "."])
+        return rng.choice([str(rng.randint(1, 5000)), f"{rng.randint(0, 999)}.{rng.randint(0, 99):02d}"])
+
+    def mobile():
+        if rng.random() < invalid:
+            return rng.choice(["1712345", "27123456", "77abc456", "", "771234567"])
+        return f"{rng.choice(('17', '77'))}{rng.randint(0, 999999):06d}"
+
+    def passcode():
+        if rng.random() < invalid:
+            return rng.choice(["123", "abcd", "12345", ""])
+        return f"{rng.randint(0, 9999):04d}"
+
+    return ([amount() for _ in range(size)], [mobile() for _ in range(size)],
+            [passcode() for _ in range(size)])
+
+
+def per_call(amounts, mobiles, passcodes):
+    """The old checks: one value at a time, exceptions as control flow"""
+    bad = 0
+    for amount, mobile, passcode in zip(amounts, mobiles, passcodes):
+        try:
+            try:
+                if parse_amount(amount) <= 0:
+                    raise InvalidInputError("Invalid amount")
+            except ValueError:
+                raise InvalidInputError("Enter a valid number")
+            if (not mobile.isdigit() or
+                    len(mobile) != 8 or
+                    (not mobile.startswith('17') and not mobile.startswith('77'))):
+                raise InvalidInputError("Invalid mobile number")
+            if len(passcode) != 4 or not passcode.isdigit():
+                raise InvalidInputError("Passcode must be 4 digits")
+        except InvalidInputError:
+            bad += 1
+    return bad
+
+
+def batch(amounts, mobiles, passcodes):
+    codes, _ = check_amounts(amounts)
+    errors = first_errors(codes, check_mobiles(mobiles), check_passcodes(passcodes))
+    return len(errors) - errors.count(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10000000)
+    parser.add_argument("--invalid", type=float, default=0.05, help="fraction bad per field")
+    parser.add_argument("--pool", type=int, default=1 << 16, help="distinct values per field")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pools = make_pool(rng, args.invalid, args.pool)
+    rows = [rng.randrange(args.pool) for _ in range(args.records)]
+    columns = [[pool[i] for i in rows] for pool in pools]
+    del rows
+
+    print(f"{args.records:,} records from {args.pool:,} values per field, "
+          f"{args.invalid:.0%} of each field invalid")
+    results = []
+    for label, check in (("per-call, raising", per_call), ("column validators", batch)):
+        start = time.perf_counter()
+        bad = check(*columns)
+        elapsed = time.perf_counter() - start
+        results.append(bad)
+        print(f"  {label:<20} {elapsed:7.2f} s  {args.records / elapsed / 1e6:6.2f} M records/s  "
+              f"{bad:,} rejected")
+    assert results[0] == results[1], "validators disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""Streaming bulk import and export of accounts and transaction history.
+
+Accounts and history entries are read and written in two formats:
+
+* CSV with a header row.  Accounts are ``account_id,category,balance,
+  passcode_hash`` with the balance in major units ("12.50") and the hash
+  in hex; for onboarding, a ``passcode`` column of plain 4-digit passcodes
+  may take the place of ``passcode_hash`` and is hashed on import.
+  History entries are ``account_id,timestamp,kind,amount,balance,
+  counterparty``, amounts signed and in major units.
+* A compact binary format: a magic string, then one record per row, each
+  a u16 body length and a little-endian body (``ACCOUNT``/``ENTRY``, the
+  passcode hash following the account fields).
+
+Both directions are generator pipelines over chunks of ``chunk_rows`` rows
+through large file buffers: a chunk is read, validated column-wise with
+the ``validation`` batch checks and loaded before the next is read, so
+memory stays flat whatever the size of the file.  Bad rows are not
+raised; the import returns an ``ImportReport`` with the 1-based row number
+and ``validation`` code of every row it skipped.
+
+Ids and categories are kept as they are in the file.  Like journal
+replay, an import does not announce accounts to the BankAccount
+observers; e.g. ``BalanceAggregates.load`` picks them up afterwards.
+"""
+import csv
+import math
+import re
+import struct
+from collections import namedtuple
+from itertools import islice
+
+from account import BankAccount
+from account_store import CATEGORIES, CATEGORY_CODES, AccountStore, parse_id
+from auth import HASH_SIZE, hash_passcode
+from history import KIND_CODES, KINDS
+from money import format_amount
+from validation import (DUPLICATE_ACCOUNT, INVALID_ACCOUNT_ID, INVALID_AMOUNT,
+                        INVALID_CATEGORY, INVALID_KIND, INVALID_PASSCODE_HASH,
+                        INVALID_TIMESTAMP, MALFORMED_ROW, NON_POSITIVE_AMOUNT, OK,
+                        check_amounts, check_passcodes, first_errors)
+
+ACCOUNTS_MAGIC = b"BACC\x01"
+HISTORY_MAGIC = b"BHST\x01"
+
+# Every binary record is a body length and a body
+LENGTH = struct.Struct("<H")
+# Account id, balance in minor units, category code; the passcode hash
+# is the rest of the body
+ACCOUNT = struct.Struct("<qqB")
+# Account id, timestamp, kind code, signed amount and balance after the
+# entry in minor units, counterparty (-1 for none)
+ENTRY = struct.Struct("<qdBqqq")
+_ACCOUNT_RECORD = struct.Struct("<H" + ACCOUNT.format[1:])
+_ENTRY_RECORD = struct.Struct("<H" + ENTRY.format[1:])
+
+ACCOUNT_FIELDS = ["account_id", "category", "balance", "passcode_hash"]
+ONBOARDING_FIELDS = ["account_id", "category", "balance", "passcode"]
+ENTRY_FIELDS = ["account_id", "timestamp", "kind", "amount", "balance", "counterparty"]
+
+CHUNK_ROWS = 65536
+BUFFER_SIZE = 1 << 20
+_NO_COUNTERPARTY = -1
+_HEX_HASH = re.compile(f"[0-9a-fA-F]{{{2 * HASH_SIZE}}}")
+
+ImportReport = namedtuple("ImportReport", "rows imported errors")
+
+
+def _format(path, format):
+    if format is None:
+        format = "csv" if str(path).endswith(".csv") else "binary"
+    if format not in ("csv", "binary"):
+        raise ValueError(f"Unknown format: {format!r}")
+    return format
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _open(path, mode, format):
+    if format == "csv":
+        return open(path, mode, newline="", encoding="utf-8", buffering=BUFFER_SIZE)
+    return open(path, mode + "b", buffering=BUFFER_SIZE)
+
+
+def _bodies(f, magic, what):
+    """Yield the record bodies of a binary file; None for a truncated last record"""
+    if f.read(len(magic)) != magic:
+        raise ValueError(f"{f.name} is not a binary {what} file")
+    buffer = b""
+    while data := f.read(BUFFER_SIZE):
+        buffer += data
+        pos, end = 0, len(buffer)
+        while pos + LENGTH.size <= end:
+            start = pos + LENGTH.size
+            stop = start + LENGTH.unpack_from(buffer, pos)[0]
+            if stop > end:
+                break
+            yield buffer[start:stop]
+            pos = stop
+        buffer = buffer[pos:]
+    if buffer:
+        yield None
+
+
+def _csv_rows(f, headers):
+    """Return (header, rows) of a CSV file whose header is one of headers"""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is not None and header not in headers:
+        raise ValueError(f"Unexpected CSV header: {','.join(header)}")
+    return header, reader
+
+
+def _id_codes(ids):
+    return bytes(OK if parse_id(account_id) is not None else INVALID_ACCOUNT_ID
+                 for account_id in ids)
+
+
+# Accounts
+
+def _validate_csv_accounts(rows, onboarding):
+    """Return (rows as (id, category, cents, hash or passcode), codes) for a CSV chunk"""
+    width = len(ACCOUNT_FIELDS)
+    malformed = bytes(MALFORMED_ROW if len(row) != width else OK for row in rows)
+    if any(malformed):
+        rows = [row if len(row) == width else ("", "", "0", "") for row in rows]
+    ids, categories, balances, secrets = zip(*rows)
+    amount_codes, cents = check_amounts(balances)
+    # A zero balance is fine; only a negative one is not
+    balance_codes = bytes(OK if code == NON_POSITIVE_AMOUNT and amount == 0 else code
+                          for code, amount in zip(amount_codes, cents))
+    if onboarding:
+        secret_codes = check_passcodes(secrets)
+    else:
+        secret_codes = bytes(OK if _HEX_HASH.fullmatch(h) else INVALID_PASSCODE_HASH
+                             for h in secrets)
+    codes = first_errors(malformed, _id_codes(ids),
+                         bytes(OK if c in CATEGORY_CODES else INVALID_CATEGORY
+                               for c in categories),
+                         balance_codes, secret_codes)
+    return list(zip(ids, categories, cents, secrets)), codes
+
+
+def _validate_binary_accounts(bodies):
+    rows, codes = [], bytearray()
+    for body in bodies:
+        if body is None or len(body) < ACCOUNT.size:
+            rows.append(None)
+            codes.append(MALFORMED_ROW)
+            continue
+        key, balance, category = ACCOUNT.unpack_from(body)
+        passcode_hash = body[ACCOUNT.size:]
+        if key < 0:
+            code = INVALID_ACCOUNT_ID
+        elif category >= len(CATEGORIES):
+            code = INVALID_CATEGORY
+        elif balance < 0:
+            code = NON_POSITIVE_AMOUNT
+        elif len(passcode_hash) != HASH_SIZE:
+            code = INVALID_PASSCODE_HASH
+        else:
+            code = OK
+        rows.append(None if code else (str(key), CATEGORIES[category], balance, passcode_hash))
+        codes.append(code)
+    return rows, codes
+
+
+def read_accounts(path, format=None, chunk_rows=CHUNK_ROWS):
+    """Yield (rows, codes, onboarding) per chunk of an accounts file.
+
+    Rows are (account id, category, balance in cents, passcode hash), the
+    hash as hex text from CSV and as bytes from binary, or a plain
+    passcode instead with ``onboarding``.  Where a code is nonzero the row
+    is invalid (and None for binary files).
+    """
+    format = _format(path, format)
+    with _open(path, "r", format) as f:
+        if format == "binary":
+            for chunk in _chunks(_bodies(f, ACCOUNTS_MAGIC, "accounts"), chunk_rows):
+                yield *_validate_binary_accounts(chunk), False
+            return
+        header, reader = _csv_rows(f, (ACCOUNT_FIELDS, ONBOARDING_FIELDS))
+        onboarding = header == ONBOARDING_FIELDS
+        for chunk in _chunks(reader, chunk_rows):
+            yield *_validate_csv_accounts(chunk, onboarding), onboarding
+
+
+def import_accounts(path, accounts, format=None, chunk_rows=CHUNK_ROWS, overwrite=False,
+                    account_class=BankAccount):
+    """Load the accounts in a file into ``accounts`` (a dict or an AccountStore).
+
+    Rows whose id already exists are rejected as DUPLICATE_ACCOUNT unless
+    ``overwrite`` is set.  Returns an ImportReport.
+    """
+    store = accounts if isinstance(accounts, AccountStore) else None
+    rows_seen = imported = 0
+    errors = []
+    for rows, codes, onboarding in read_accounts(path, format, chunk_rows):
+        for code, row in zip(codes, rows):
+            rows_seen += 1
+            if not code and not overwrite and row[0] in accounts:
+                code = DUPLICATE_ACCOUNT
+            if code:
+                errors.append((rows_seen, code))
+                continue
+            account_id, category, balance, secret = row
+            if onboarding:
+                passcode_hash = hash_passcode(secret)
+            elif secret.__class__ is str:
+                passcode_hash = bytes.fromhex(secret)
+            else:
+                passcode_hash = secret
+            if store is not None:
+                store.balances[store.add(account_id, None, category,
+                                         passcode_hash=passcode_hash)] = balance
+            else:
+                account = account_class(account_id, None, category)
+                account.passcode_hash = passcode_hash
+                account.balance = balance
+                accounts[account_id] = account
+            imported += 1
+    return ImportReport(rows_seen, imported, errors)
+
+
+def _account_chunks(accounts, chunk_rows):
+    """Yield chunks of (account id, category, balance, passcode hash) rows"""
+    if isinstance(accounts, AccountStore):
+        ids, balances = accounts.ids, accounts.balances
+        categories, hashes = accounts.categories, accounts.passcode_hashes
+        for start in range(0, len(accounts), chunk_rows):
+            stop = min(start + chunk_rows, len(accounts))
+            yield [(ids[row], CATEGORIES[categories[row]], balances[row],
+                    bytes(hashes[row * HASH_SIZE:(row + 1) * HASH_SIZE]))
+                   for row in range(start, stop)]
+        return
+    for chunk in _chunks(accounts.values(), chunk_rows):
+        yield [(account.account_id, account.account_category, account.balance,
+                account.passcode_hash or b"") for account in chunk]
+
+
+def _binary_key(account_id):
+    key = parse_id(account_id)
+    if key is None:
+        raise ValueError(f"Account ID {account_id!r} cannot be written in the binary format")
+    return key
+
+
+def export_accounts(accounts, path, format=None, chunk_rows=CHUNK_ROWS):
+    """Write every account in ``accounts`` to a file; returns the number of rows"""
+    format = _format(path, format)
+    count = 0
+    with _open(path, "w", format) as f:
+        if format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(ACCOUNT_FIELDS)
+            for chunk in _account_chunks(accounts, chunk_rows):
+                writer.writerows((account_id, category, format_amount(balance), h.hex())
+                                 for account_id, category, balance, h in chunk)
+                count += len(chunk)
+            return count
+        f.write(ACCOUNTS_MAGIC)
+        pack = _ACCOUNT_RECORD.pack
+        for chunk in _account_chunks(accounts, chunk_rows):
+            f.write(b"".join(
+                pack(ACCOUNT.size + len(h), _binary_key(account_id), balance,
+                     CATEGORY_CODES[category]) + h
+                for account_id, category, balance, h in chunk))
+            count += len(chunk)
+    return count
+
+
+# History
+
+def _parse_timestamp(text):
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _validate_csv_entries(rows):
+    """Return (rows as (id, timestamp, kind code, cents, balance, counterparty), codes)"""
+    width = len(ENTRY_FIELDS)
+    malformed = bytes(MALFORMED_ROW if len(row) != width else OK for row in rows)
+    if any(malformed):
+        rows = [row if len(row) == width else ("", "0", "", "0", "0", "") for row in rows]
+    ids, times, kinds, amounts, balances, counterparties = zip(*rows)
+    timestamps = list(map(_parse_timestamp, times))
+    # Amounts are signed: only text that does not parse is an error
+    amount_codes, cents = check_amounts(amounts)
+    balance_codes, balance_cents = check_amounts(balances)
+    codes = first_errors(
+        malformed, _id_codes(ids),
+        bytes(OK if t is not None else INVALID_TIMESTAMP for t in timestamps),
+        bytes(OK if kind in KIND_CODES else INVALID_KIND for kind in kinds),
+        bytes(INVALID_AMOUNT if INVALID_AMOUNT in pair else OK
+              for pair in zip(amount_codes, balance_codes)),
+        bytes(OK if not c or parse_id(c) is not None else INVALID_ACCOUNT_ID
+              for c in counterparties))
+    rows = [None if code else (account_id, timestamp, KIND_CODES[kind], amount, balance,
+                               int(counterparty) if counterparty else _NO_COUNTERPARTY)
+            for account_id, timestamp, kind, amount, balance, counterparty, code
+            in zip(ids, timestamps, kinds, cents, balance_cents, counterparties, codes)]
+    return rows, codes
+
+
+def _validate_binary_entries(bodies):
+    rows, codes = [], bytearray()
+    for body in bodies:
+        if body is None or len(body) != ENTRY.size:
+            rows.append(None)
+            codes.append(MALFORMED_ROW)
+            continue
+        key, timestamp, kind, amount, balance, counterparty = ENTRY.unpack(body)
+        if key < 0 or counterparty < _NO_COUNTERPARTY:
+            code = INVALID_ACCOUNT_ID
+        elif not math.isfinite(timestamp):
+            code = INVALID_TIMESTAMP
+        elif kind >= len(KINDS):
+            code = INVALID_KIND
+        else:
+            code = OK
+        rows.append(None if code else (str(key), timestamp, kind, amount, balance, counterparty))
+        codes.append(code)
+    return rows, codes
+
+
+def read_history(path, format=None, chunk_rows=CHUNK_ROWS):
+    """Yield (rows, codes) per chunk of a history file.
+
+    Rows are (account id, timestamp, kind code, amount, balance,
+    counterparty) as ``TransactionHistory.append`` takes them, or None
+    where the code is nonzero.
+    """
+    format = _format(path, format)
+    with _open(path, "r", format) as f:
+        if format == "binary":
+            for chunk in _chunks(_bodies(f, HISTORY_MAGIC, "history"), chunk_rows):
+                yield _validate_binary_entries(chunk)
+            return
+        _, reader = _csv_rows(f, (ENTRY_FIELDS,))
+        for chunk in _chunks(reader, chunk_rows):
+            yield _validate_csv_entries(chunk)
+
+
+def import_history(path, history, format=None, chunk_rows=CHUNK_ROWS):
+    """Append the entries in a file to a TransactionHistory; returns an ImportReport"""
+    rows_seen = imported = 0
+    errors = []
+    append = history.append
+    for rows, codes in read_history(path, format, chunk_rows):
+        for code, row in zip(codes, rows):
+            rows_seen += 1
+            if code:
+                errors.append((rows_seen, code))
+                continue
+            account_id, timestamp, kind, amount, balance, counterparty = row
+            append(account_id, kind, amount, balance, counterparty, timestamp)
+            imported += 1
+    return ImportReport(rows_seen, imported, errors)
+
+
+def export_history(history, path, format=None, chunk_rows=CHUNK_ROWS):
+    """Write every entry of a TransactionHistory, in log order; returns the number of rows"""
+    format = _format(path, format)
+    count = 0
+    with _open(path, "w", format) as f:
+        if format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(ENTRY_FIELDS)
+            for chunk in _chunks(history.entries(), chunk_rows):
+                writer.writerows((account_id, repr(e.timestamp), e.kind, format_amount(e.amount),
+                                  format_amount(e.balance), e.counterparty or "")
+                                 for account_id, e in chunk)
+                count += len(chunk)
+            return count
+        f.write(HISTORY_MAGIC)
+        pack = _ENTRY_RECORD.pack
+        for chunk in _chunks(history.entries(), chunk_rows):
+            f.write(b"".join(
+                pack(ENTRY.size, _binary_key(account_id), e.timestamp, KIND_CODES[e.kind],
+                     e.amount, e.balance,
+                     _NO_COUNTERPARTY if e.counterparty is None else int(e.counterparty))
+                for account_id, e in chunk))
+            count += len(chunk)
+    return count
@@ -0,0 +1,111 @@
+"""Thread-safe account operations with striped locks.
+
+Each account id hashes to one of a fixed number of lock stripes.  An
+operation locks only the stripes of the accounts it touches, and a
+transfer takes its two stripes in ascending stripe order, so two
+transfers can never wait on each other in a cycle.  Operations on
+accounts in different stripes run without contending.
+"""
+import threading
+from contextlib import contextmanager
+
+from account import InvalidInputError
+from idempotency import IdempotencyCache
+
+
+class StripedLocks:
+    """A fixed pool of locks shared out between account ids"""
+
+    def __init__(self, stripes=256):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def stripe(self, account_id):
+        return hash(account_id) % len(self.locks)
+
+    @contextmanager
+    def hold(self, *account_ids):
+        """Lock the stripes of every given account, in stripe order"""
+        stripes = sorted({self.stripe(account_id) for account_id in account_ids})
+        locks = self.locks
+        for index in stripes:
+            locks[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(stripes):
+                locks[index].release()
+
+    @contextmanager
+    def hold_all(self):
+        """Lock every stripe, e.g. to take a consistent snapshot"""
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self.locks):
+                lock.release()
+
+
+class ConcurrentLedger:
+    """Run BankAccount operations on a shared accounts mapping from many threads.
+
+    Operations that move money take an optional ``request_id``; a retry
+    under the same id returns the first attempt's outcome instead of
+    running again (see idempotency.IdempotencyCache).
+    """
+
+    def __init__(self, accounts, stripes=256, idempotency=None):
+        self.accounts = accounts
+        self.locks = StripedLocks(stripes)
+        self.idempotency = IdempotencyCache() if idempotency is None else idempotency
+
+    def _account(self, account_id):
+        account = self.accounts.get(account_id)
+        if account is None:
+            raise InvalidInputError("Account not found")
+        return account
+
+    def _once(self, request_id, fingerprint, operation, *args):
+        if request_id is None:
+            return operation(*args)
+        return self.idempotency.run(request_id, fingerprint, operation, *args)
+
+    def balance(self, account_id):
+        with self.locks.hold(account_id):
+            return self._account(account_id).balance
+
+    def _deposit(self, account_id, amount):
+        with self.locks.hold(account_id):
+            return self._account(account_id).deposit(amount)
+
+    def deposit(self, account_id, amount, request_id=None):
+        return self._once(request_id, ("deposit", account_id, amount),
+                          self._deposit, account_id, amount)
+
+    def _withdraw(self, account_id, amount):
+        with self.locks.hold(account_id):
+            return self._account(account_id).withdraw(amount)
+
+    def withdraw(self, account_id, amount, request_id=None):
+        return self._once(request_id, ("withdraw", account_id, amount),
+                          self._withdraw, account_id, amount)
+
+    def _mobile_topup(self, account_id, amount, mobile_number):
+        with self.locks.hold(account_id):
+            return self._account(account_id).mobile_topup(amount, mobile_number)
+
+    def mobile_topup(self, account_id, amount, mobile_number, request_id=None):
+        return self._once(request_id, ("topup", account_id, amount, mobile_number),
+                          self._mobile_topup, account_id, amount, mobile_number)
+
+    def _transfer(self, account_id, recipient_id, amount):
+        with self.locks.hold(account_id, recipient_id):
+            sender = self._account(account_id)
+            recipient = self._account(recipient_id)
+            return sender.transfer(amount, recipient)
+
+    def transfer(self, account_id, recipient_id, amount, request_id=None):
+        """Atomically move amount between two accounts"""
+        return self._once(request_id, ("transfer", account_id, recipient_id, amount),
+                          self._transfer, account_id, recipient_id, amount)
@@ -0,0 +1,208 @@
+"""Screens and flows of the banking app, independent of any GUI toolkit.
+
+``BankingController`` holds the application state (the accounts, the
+logged-in account, the screen on show) and implements every flow --
+create, login, deposit, withdraw, transfer, top-up and passcode change --
+on plain strings, running the account operations through a
+CommandDispatcher.  Whatever the user sees goes through a renderer:
+
+    show(screen)     bring up a screen (one of SCREENS)
+    info(message)    tell the user an operation succeeded
+    error(message)   tell the user it failed
+    set_busy(busy)   commands started running / all of them finished
+
+``BankingGUI`` is the Tk renderer; its widgets read the input and call the
+controller.  ``HeadlessRenderer`` just records what would have been shown,
+so flows run without a display, in microseconds, and in as many processes
+as there are cores.
+"""
+import random
+
+from account import BankAccount, InsufficientFundsError, InvalidInputError, LimitExceededError
+from auth import AuthenticationError, Authenticator
+from dispatcher import CommandDispatcher
+from id_allocator import IdAllocator
+from money import format_amount, parse_amount
+
+SCREENS = ("main_menu", "create_account", "login", "account_menu", "balance", "deposit",
+           "withdraw", "transfer", "mobile_topup", "change_password")
+
+
+class BankingController:
+    """Application state and flows, shown through a renderer"""
+
+    def __init__(self, renderer, accounts=None, id_allocator=None, history=None,
+                 dispatcher=None):
+        self.renderer = renderer
+        # Any mapping of account id to BankAccount, e.g. an AccountStore
+        self.accounts = {} if accounts is None else accounts
+        self.id_allocator = IdAllocator() if id_allocator is None else id_allocator
+        self.auth = Authenticator()
+        self.current_account = None
+        # Optional TransactionHistory shown on the balance screen
+        self.history = history
+        self.journal = None
+        self.screen = None
+        # Without a dispatcher commands run inline, which needs no event loop
+        self.dispatcher = (CommandDispatcher(None, workers=0, on_busy=renderer.set_busy)
+                           if dispatcher is None else dispatcher)
+
+    def open_journal(self, path):
+        """Restore accounts from the journal at path and keep logging to it"""
+        # Imported here because the journal module depends on BankAccount
+        from journal import TransactionJournal, replay
+        replay(path, self.accounts)
+        self.journal = TransactionJournal(path)
+        self.journal.attach()
+
+    def close(self):
+        """Finish running commands, then flush and close the journal, if one is open"""
+        self.dispatcher.close()
+        if self.journal:
+            self.journal.detach()
+            self.journal.close()
+            self.journal = None
+
+    def show(self, screen):
+        self.screen = screen
+        self.renderer.show(screen)
+
+    def show_main_menu(self):
+        self.current_account = None
+        self.show("main_menu")
+
+    def show_account_menu(self):
+        self.show("account_menu")
+
+    def run_command(self, key, operation, on_success, errors=()):
+        """Run operation on the dispatcher, ignoring a repeat while key is running.
+
+        errors pairs exception classes with the message to show for them;
+        a message of None shows the exception text.  Anything else is
+        re-raised where the dispatcher reports back.
+        """
+        def on_error(e):
+            for error_class, message in errors:
+                if isinstance(e, error_class):
+                    self.renderer.error(str(e) if message is None else message)
+                    return
+            raise e
+        return self.dispatcher.submit(key, operation, on_success, on_error)
+
+    def command_done(self, message):
+        self.renderer.info(message)
+        # The user may have logged out while the command was running
+        if self.current_account is not None:
+            self.show_account_menu()
+
+    def create_account(self, category):
+        passcode = str(random.randint(1000, 9999))
+        category = "Personal" if category == "Personal" else "Business"
+
+        def create():
+            account_id = self.id_allocator.allocate_unused(self.accounts)
+            self.accounts[account_id] = BankAccount.open(account_id, passcode, category)
+            return account_id
+
+        def created(account_id):
+            self.renderer.info(f"Account Created!\nID: {account_id}\nPasscode: {passcode}")
+            self.show_main_menu()
+
+        self.run_command(("create",), create, created)
+
+    def login(self, account_id, passcode):
+        def logged_in(account):
+            self.current_account = account
+            self.show_account_menu()
+
+        self.run_command(("login",), lambda: self.auth.login(self.accounts, account_id, passcode),
+                         logged_in, [(AuthenticationError, None)])
+
+    def balance_text(self):
+        return f"Current Balance: ${format_amount(self.current_account.balance)}"
+
+    def recent_transactions(self, count):
+        """Up to count lines for the newest history entries, newest first"""
+        if self.history is None:
+            return []
+        entries = self.history.statement(self.current_account.account_id, page_size=count)
+        return [f"{entry.kind:<10} {format_amount(entry.amount):>12}   "
+                f"balance {format_amount(entry.balance)}" for entry in entries]
+
+    def deposit(self, amount):
+        account = self.current_account
+        self.run_command(("deposit", account.account_id), lambda: account.deposit(amount),
+                         lambda _: self.command_done("Deposit completed"),
+                         [(InvalidInputError, "Invalid amount"),
+                          (ValueError, "Enter a valid number")])
+
+    def withdraw(self, amount):
+        account = self.current_account
+        self.run_command(("withdraw", account.account_id), lambda: account.withdraw(amount),
+                         lambda _: self.command_done("Withdrawal completed"),
+                         [(LimitExceededError, None),
+                          (InvalidInputError, "Invalid amount"),
+                          (InsufficientFundsError, "Insufficient funds"),
+                          (ValueError, "Enter a valid number")])
+
+    def transfer(self, recipient_id, amount):
+        account = self.current_account
+
+        def transfer():
+            if recipient_id not in self.accounts:
+                raise InvalidInputError("Recipient account not found")
+            return account.transfer(amount, self.accounts[recipient_id])
+
+        self.run_command(("transfer", account.account_id), transfer,
+                         lambda _: self.command_done("Transfer completed"),
+                         [((InvalidInputError, InsufficientFundsError), None),
+                          (ValueError, "Enter valid details")])
+
+    def mobile_topup(self, mobile, amount):
+        account = self.current_account
+        self.run_command(("topup", account.account_id), lambda: account.mobile_topup(amount, mobile),
+                         lambda _: self.command_done(
+                             f"${format_amount(parse_amount(amount))} credited to {mobile}"),
+                         [((InvalidInputError, InsufficientFundsError), None),
+                          (ValueError, "Enter valid details")])
+
+    def change_password(self, new_passcode, confirm_passcode):
+        account = self.current_account
+
+        def change_password():
+            if new_passcode != confirm_passcode:
+                raise InvalidInputError("Passcodes don't match")
+            return account.change_password(new_passcode)
+
+        self.run_command(("passcode", account.account_id), change_password,
+                         lambda _: self.command_done("Password changed successfully"),
+                         [(InvalidInputError, None)])
+
+
+class HeadlessRenderer:
+    """Renderer that records screens and messages instead of drawing them"""
+
+    def __init__(self):
+        self.screens = []
+        self.messages = []  # ("info" or "error", text)
+        self.busy = False
+
+    @property
+    def screen(self):
+        return self.screens[-1] if self.screens else None
+
+    @property
+    def last_message(self):
+        return self.messages[-1] if self.messages else None
+
+    def show(self, screen):
+        self.screens.append(screen)
+
+    def info(self, message):
+        self.messages.append(("info", message))
+
+    def error(self, message):
+        self.messages.append(("error", message))
+
+    def set_busy(self, busy):
+        self.busy = busy
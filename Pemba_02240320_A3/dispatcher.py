@@ -0,0 +1,101 @@
+"""Run GUI commands off the Tk thread.
+
+``CommandDispatcher`` runs each operation on a thread pool and hands the
+result back to the Tk thread, where the success or error callback runs.
+Tk may only be used from the thread that created it, so workers never
+touch it: they put finished results on a queue, and the Tk thread drains
+that queue from ``root.after`` callbacks, scheduled only while commands
+are in flight.
+
+Commands carry a key, such as ("deposit", account_id); a command whose
+key is already in flight is dropped, so repeated clicks submit once.
+"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CommandDispatcher:
+    """Runs operations in the background and reports back on the Tk thread.
+
+    ``on_busy(busy)`` is called on the Tk thread when the first command
+    starts and when the last one finishes.  With ``workers=0`` operations
+    run inline, which is what tests and scripts without a main loop want.
+    The default single worker runs commands one at a time in submission
+    order, so account objects and their observers never see two threads.
+    """
+
+    def __init__(self, root, workers=1, interval=5, on_busy=None):
+        self.root = root
+        self.interval = interval
+        self.on_busy = on_busy
+        self.in_flight = {}  # key -> (on_success, on_error)
+        self._done = queue.SimpleQueue()
+        self._polling = False
+        self._executor = ThreadPoolExecutor(workers, "dispatcher") if workers else None
+
+    @property
+    def busy(self):
+        return bool(self.in_flight)
+
+    def submit(self, key, operation, on_success=None, on_error=None):
+        """Run operation() in the background; False if key is already in flight.
+
+        on_success(result) or on_error(exception) runs on the Tk thread.
+        """
+        if key in self.in_flight:
+            return False
+        self.in_flight[key] = (on_success, on_error)
+        if len(self.in_flight) == 1 and self.on_busy:
+            self.on_busy(True)
+        if self._executor is None:
+            self._run(key, operation)
+            self._drain()
+        else:
+            self._executor.submit(self._run, key, operation)
+            if not self._polling:
+                self._polling = True
+                self.root.after(self.interval, self._poll)
+        return True
+
+    def _run(self, key, operation):
+        try:
+            self._done.put((key, True, operation()))
+        except Exception as e:
+            self._done.put((key, False, e))
+
+    def _poll(self):
+        try:
+            self._drain()
+        finally:
+            if self.in_flight:
+                self.root.after(self.interval, self._poll)
+            else:
+                self._polling = False
+
+    def _drain(self):
+        while True:
+            try:
+                key, ok, value = self._done.get_nowait()
+            except queue.Empty:
+                return
+            on_success, on_error = self.in_flight.pop(key)
+            if not self.in_flight and self.on_busy:
+                self.on_busy(False)
+            callback = on_success if ok else on_error
+            try:
+                if callback is not None:
+                    callback(value)
+                elif not ok:
+                    raise value
+            except Exception as e:
+                # A failing callback must not stop the results behind it;
+                # without a Tk root (inline mode) the caller gets the error
+                if self.root is None:
+                    raise
+                self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+    def close(self):
+        """Wait for running commands and stop the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._drain()
@@ -0,0 +1,234 @@
+"""Inline velocity checks on transfers and mobile top-ups.
+
+``VelocityDetector`` is shown every transfer and top-up attempt before it
+is applied (attach it to BankAccount like a LimitEngine) and flags bursts:
+
+    TRANSFER_BURST  many transfers from one account
+    FAN_OUT         transfers from one account to many different recipients
+    TOPUP_BURST     many top-ups from one account
+    NEW_NUMBERS     top-ups from one account to many never-seen numbers
+    FAN_IN          one mobile number topped up from many different accounts
+
+A flagged attempt raises SuspectedFraudError, or with ``block=False`` is
+only passed to ``on_flag``.
+
+Memory is fixed when the detector is built, however many accounts and
+numbers pass through it: every count lives in one count-min sketch and
+every "seen before?" is answered by a Bloom filter.  Distinct counts
+(recipients, new numbers, senders) count first sightings: a pair the pair
+filter has not seen in the window increments its key's counter.  Windows
+slide in two generations: each sketch keeps a current and a previous
+table, and every half window the previous one is dropped and the current
+one takes its place, so a count covers between half a window and a whole
+one.  Refused attempts are counted too, so once over a threshold a key
+stays flagged (retries included) until its burst leaves the window.  Sketches only ever overestimate, so a burst is never missed; a false
+flag needs colliding keys in every row of the sketch.
+"""
+import time
+from array import array
+
+from account import BankAccount, SuspectedFraudError
+
+TRANSFER_BURST = 1
+FAN_OUT = 2
+TOPUP_BURST = 4
+NEW_NUMBERS = 8
+FAN_IN = 16
+
+# Most attempts allowed per window before a flag
+THRESHOLDS = {
+    TRANSFER_BURST: 30,
+    FAN_OUT: 10,
+    TOPUP_BURST: 20,
+    NEW_NUMBERS: 5,
+    FAN_IN: 5,
+}
+
+MESSAGES = {
+    TRANSFER_BURST: "Too many transfers in a short time",
+    FAN_OUT: "Too many new recipients in a short time",
+    TOPUP_BURST: "Too many top-ups in a short time",
+    NEW_NUMBERS: "Too many top-ups to new numbers in a short time",
+    FAN_IN: "This number is being topped up from too many accounts",
+}
+
+_MASK32 = (1 << 32) - 1
+
+
+def _hashes(key):
+    """Two 32-bit hashes of key; probe i is h1 + i * h2 (double hashing)"""
+    h = hash(key)
+    return h & _MASK32, (h >> 32 & _MASK32) | 1
+
+
+class _Generations:
+    """A current and a previous table of ``size`` items, aged every half window"""
+
+    def __init__(self, size, typecode, window, now):
+        self.size = size
+        self.typecode = typecode
+        self.half = window / 2
+        self.current = self._fresh()
+        self.previous = self._fresh()
+        self.epoch = int(now // self.half)
+        self.expires = (self.epoch + 1) * self.half
+
+    def _fresh(self):
+        table = array(self.typecode)
+        table.frombytes(bytes(self.size * table.itemsize))
+        return table
+
+    @property
+    def memory(self):
+        return 2 * self.size * self.current.itemsize
+
+    def age(self, now):
+        epoch = int(now // self.half)
+        if epoch <= self.epoch:
+            return
+        self.previous = self.current if epoch == self.epoch + 1 else self._fresh()
+        self.current = self._fresh()
+        self.epoch = epoch
+        self.expires = (epoch + 1) * self.half
+
+
+class CountMinWindow(_Generations):
+    """Windowed count-min sketch with conservative update"""
+
+    def __init__(self, width=1 << 20, depth=4, window=3600.0, now=0.0):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        super().__init__(width * depth, "I", window, now)
+        self.width = width
+        self.depth = depth
+        self.mask = width - 1
+
+        # Offset of each row's counters in the flat tables
+        self.rows = [(row * width, row) for row in range(depth)]
+
+    def _indexes(self, key):
+        h1, h2 = _hashes(key)
+        mask = self.mask
+        return [offset + (h1 + row * h2 & mask) for offset, row in self.rows]
+
+    def estimate(self, key):
+        current, previous = self.current, self.previous
+        return min([current[i] + previous[i] for i in self._indexes(key)])
+
+    def add(self, key):
+        """Count one occurrence of key and return its estimated count in the window"""
+        current, previous = self.current, self.previous
+        indexes = self._indexes(key)
+        totals = [current[i] + previous[i] for i in indexes]
+        count = min(totals) + 1
+        # Raise only the counters that are below the new estimate
+        for i, total in zip(indexes, totals):
+            if total < count:
+                current[i] += count - total
+        return count
+
+
+class BloomWindow(_Generations):
+    """Windowed Bloom filter answering "seen in the window?" """
+
+    def __init__(self, bits=1 << 24, probes=4, window=3600.0, now=0.0):
+        if bits & (bits - 1) or bits < 8:
+            raise ValueError("bits must be a power of two of at least 8")
+        super().__init__(bits // 8, "B", window, now)
+        self.mask = bits - 1
+        self.probes = probes
+
+    def add(self, key):
+        """Insert key; returns True if it was (probably) already seen in the window"""
+        h1, h2 = _hashes(key)
+        current, previous, mask = self.current, self.previous, self.mask
+        in_current = in_previous = True
+        for probe in range(self.probes):
+            bit = h1 + probe * h2 & mask
+            byte, flag = bit >> 3, 1 << (bit & 7)
+            if not current[byte] & flag:
+                in_current = False
+                current[byte] |= flag
+            if not previous[byte] & flag:
+                in_previous = False
+        return in_current or in_previous
+
+
+class VelocityDetector:
+    """Scores transfer and top-up attempts against windowed velocity thresholds.
+
+    ``window`` is the burst window in seconds; a mobile number counts as
+    new if no top-up to it was seen within ``known_window``.  ``width``,
+    ``depth``, ``pair_bits`` and ``number_bits`` size the sketches, which
+    together take ``memory`` bytes.
+    """
+
+    def __init__(self, thresholds=THRESHOLDS, window=3600.0, known_window=30 * 86400.0,
+                 width=1 << 20, depth=4, pair_bits=1 << 26, number_bits=1 << 25, block=True,
+                 on_flag=None, clock=time.time):
+        now = clock()
+        self.counts = CountMinWindow(width, depth, window, now)
+        self.pairs = BloomWindow(pair_bits, 4, window, now)
+        self.numbers = BloomWindow(number_bits, 4, known_window, now)
+        self.thresholds = {**THRESHOLDS, **thresholds}
+        self.block = block
+        self.on_flag = on_flag
+        self.clock = clock
+        self.checked = 0
+        self.flagged = 0
+
+    @property
+    def memory(self):
+        return self.counts.memory + self.pairs.memory + self.numbers.memory
+
+    def attach(self, target=BankAccount):
+        target.screen = self
+
+    def detach(self, target=BankAccount):
+        if target.screen is self:
+            target.screen = None
+
+    def score(self, account_id, kind, counterparty, now):
+        """Count one attempt and return its flags (0 when nothing is unusual)"""
+        counts, pairs, thresholds = self.counts, self.pairs, self.thresholds
+        for sketch in (counts, pairs, self.numbers):
+            if now >= sketch.expires:
+                sketch.age(now)
+        flags = 0
+        if kind == "transfer":
+            if counts.add(("transfers", account_id)) > thresholds[TRANSFER_BURST]:
+                flags |= TRANSFER_BURST
+            key = ("recipients", account_id)
+            if pairs.add(("transfer", account_id, counterparty)):
+                recipients = counts.estimate(key)
+            else:
+                recipients = counts.add(key)
+            if recipients > thresholds[FAN_OUT]:
+                flags |= FAN_OUT
+            return flags
+        if counts.add(("topups", account_id)) > thresholds[TOPUP_BURST]:
+            flags |= TOPUP_BURST
+        key = ("new numbers", account_id)
+        new_numbers = counts.estimate(key) if self.numbers.add(counterparty) else counts.add(key)
+        if new_numbers > thresholds[NEW_NUMBERS]:
+            flags |= NEW_NUMBERS
+        key = ("senders", counterparty)
+        if pairs.add(("topup", counterparty, account_id)):
+            senders = counts.estimate(key)
+        else:
+            senders = counts.add(key)
+        if senders > thresholds[FAN_IN]:
+            flags |= FAN_IN
+        return flags
+
+    def check(self, account, kind, amount, counterparty):
+        """BankAccount screen hook: raise SuspectedFraudError for a flagged attempt"""
+        self.checked += 1
+        flags = self.score(account.account_id, kind, counterparty, self.clock())
+        if flags:
+            self.flagged += 1
+            if self.on_flag is not None:
+                self.on_flag(account, kind, amount, counterparty, flags)
+            if self.block:
+                raise SuspectedFraudError(MESSAGES[flags & -flags])
+        return flags
@@ -0,0 +1,331 @@
+"""Tk front end of the banking app.
+
+Loaded only when the GUI is used: ``Pemba_02240320_A3_PA.BankingGUI`` and
+``main()`` import it on first use, so code that only needs accounts never
+imports tkinter.
+"""
+import tkinter as tk
+from tkinter import messagebox
+
+from controller import BankingController
+from dispatcher import CommandDispatcher
+
+
+class BankingGUI:
+    """Tk renderer for a controller.BankingController.
+
+    The controller owns the state and the flows; this class builds the
+    screens, reads its entries into the controller and shows what the
+    controller tells it to.
+    """
+
+    def __init__(self, root, journal_path=None, accounts=None, id_allocator=None, history=None,
+                 workers=0):
+        self.root = root
+        self.root.title("Banking App")
+        self.root.geometry("500x500")
+        self.font = ("Arial", 12)
+        
+        # Account operations run on the dispatcher's workers (inline when
+        # workers is 0) while the status line shows that something is running
+        self.status = tk.Label(self.root, text="", font=self.font)
+        self.status.pack(side="bottom", pady=5)
+        self.dispatcher = CommandDispatcher(self.root, workers=workers, on_busy=self.set_busy)
+        self.controller = BankingController(self, accounts, id_allocator, history,
+                                            self.dispatcher)
+        if journal_path:
+            self.controller.open_journal(journal_path)
+        
+        # Each screen is a frame built on first use and then kept; showing a
+        # screen refreshes its dynamic fields and raises it over the others
+        self.screens = {}
+        self.current_screen = None
+        self.container = tk.Frame(self.root)
+        self.container.pack(fill="both", expand=True)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        
+        self.show_main_menu()
+
+    # Application state lives in the controller
+    accounts = property(lambda self: self.controller.accounts,
+                        lambda self, value: setattr(self.controller, "accounts", value))
+    current_account = property(lambda self: self.controller.current_account,
+                               lambda self, value: setattr(self.controller, "current_account", value))
+    id_allocator = property(lambda self: self.controller.id_allocator,
+                            lambda self, value: setattr(self.controller, "id_allocator", value))
+    auth = property(lambda self: self.controller.auth)
+    history = property(lambda self: self.controller.history)
+    journal = property(lambda self: self.controller.journal)
+
+    def open_journal(self, path):
+        self.controller.open_journal(path)
+
+    def close(self):
+        self.controller.close()
+
+    # Renderer interface
+    def show(self, screen):
+        getattr(self, "render_" + screen)()
+
+    def info(self, message):
+        messagebox.showinfo("Success", message)
+
+    def error(self, message):
+        messagebox.showerror("Error", message)
+    
+    def set_busy(self, busy):
+        self.status.config(text="Working..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+    
+    def show_screen(self, name, build):
+        """Raise the cached frame for a screen, building it on first use"""
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = tk.Frame(self.container)
+            frame.grid(row=0, column=0, sticky="nsew")
+            build(frame)
+            self.screens[name] = frame
+        frame.tkraise()
+        self.current_screen = name
+        return frame
+    
+    def clear_entries(self, *entries):
+        for entry in entries:
+            entry.delete(0, tk.END)
+    
+    def show_main_menu(self):
+        self.controller.show_main_menu()
+    
+    def render_main_menu(self):
+        self.show_screen("main_menu", self.build_main_menu)
+    
+    def build_main_menu(self, frame):
+        tk.Label(frame, text="Banking App", font=("Arial", 16)).pack(pady=20)
+        
+        buttons = [
+            ("Create Account", self.show_create_account),
+            ("Login", self.show_login),
+            ("Exit", self.root.quit)
+        ]
+        
+        for text, cmd in buttons:
+            tk.Button(frame, text=text, command=cmd, **self.button_style()).pack(pady=5)
+    
+    def button_style(self):
+        return {'font': self.font, 'width': 20}
+    
+    def show_create_account(self):
+        self.controller.show("create_account")
+    
+    def render_create_account(self):
+        self.show_screen("create_account", self.build_create_account)
+        self.account_type.set("Personal")
+    
+    def build_create_account(self, frame):
+        tk.Label(frame, text="Create Account", font=("Arial", 14)).pack(pady=10)
+        
+        self.account_type = tk.StringVar(value="Personal")
+        tk.Radiobutton(frame, text="Personal", variable=self.account_type, 
+                      value="Personal", font=self.font).pack()
+        tk.Radiobutton(frame, text="Business", variable=self.account_type, 
+                      value="Business", font=self.font).pack(pady=5)
+        
+        tk.Button(frame, text="Create", command=self.create_account, **self.button_style()).pack(pady=10)
+        tk.Button(frame, text="Back", command=self.show_main_menu, **self.button_style()).pack()
+    
+    def create_account(self):
+        self.controller.create_account(self.account_type.get())
+    
+    def show_login(self):
+        self.controller.show("login")
+    
+    def render_login(self):
+        self.show_screen("login", self.build_login)
+        self.clear_entries(self.login_id, self.login_pass)
+        self.login_id.focus_set()
+    
+    def build_login(self, frame):
+        tk.Label(frame, text="Login", font=("Arial", 14)).pack(pady=10)
+        
+        tk.Label(frame, text="Account ID:", font=self.font).pack()
+        self.login_id = tk.Entry(frame, font=self.font)
+        self.login_id.pack(pady=5)
+        
+        tk.Label(frame, text="Passcode:", font=self.font).pack()
+        self.login_pass = tk.Entry(frame, font=self.font, show="*")
+        self.login_pass.pack(pady=5)
+        
+        tk.Button(frame, text="Login", command=self.login, **self.button_style()).pack(pady=10)
+        tk.Button(frame, text="Back", command=self.show_main_menu, **self.button_style()).pack()
+    
+    def login(self):
+        self.controller.login(self.login_id.get(), self.login_pass.get())
+    
+    def show_account_menu(self):
+        self.controller.show_account_menu()
+    
+    def render_account_menu(self):
+        self.show_screen("account_menu", self.build_account_menu)
+        self.welcome_label.config(text=f"Welcome {self.current_account.account_id}")
+    
+    def build_account_menu(self, frame):
+        self.welcome_label = tk.Label(frame, font=("Arial", 14))
+        self.welcome_label.pack(pady=10)
+        
+        options = [
+            ("Check Balance", self.show_balance),
+            ("Deposit", self.show_deposit),
+            ("Withdraw", self.show_withdraw),
+            ("Transfer", self.show_transfer),
+            ("Mobile Top-Up", self.show_mobile_topup),
+            ("Change Password", self.show_change_password),
+            ("Logout", self.show_main_menu)
+        ]
+        
+        for text, cmd in options:
+            tk.Button(frame, text=text, command=cmd, **self.button_style()).pack(pady=3)
+    
+    def show_balance(self):
+        self.controller.show("balance")
+    
+    def render_balance(self):
+        self.show_screen("balance", self.build_balance)
+        self.balance_label.config(text=self.controller.balance_text())
+        lines = self.controller.recent_transactions(len(self.history_labels))
+        for i, label in enumerate(self.history_labels):
+            label.config(text=lines[i] if i < len(lines) else "")
+    
+    def build_balance(self, frame):
+        self.balance_label = tk.Label(frame, font=self.font)
+        self.balance_label.pack(pady=20)
+        
+        self.history_labels = []
+        if self.history is not None:
+            tk.Label(frame, text="Recent Transactions", font=self.font).pack()
+            for _ in range(8):
+                label = tk.Label(frame, font=("Courier", 10))
+                label.pack()
+                self.history_labels.append(label)
+            tk.Label(frame, text="").pack()
+        
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def show_deposit(self):
+        self.controller.show("deposit")
+    
+    def render_deposit(self):
+        self.show_screen("deposit", self.build_deposit)
+        self.amount_entry = self.deposit_amount
+        self.clear_entries(self.amount_entry)
+        self.amount_entry.focus_set()
+    
+    def build_deposit(self, frame):
+        tk.Label(frame, text="Deposit Amount", font=("Arial", 14)).pack(pady=10)
+        
+        self.deposit_amount = tk.Entry(frame, font=self.font)
+        self.deposit_amount.pack(pady=10)
+        
+        tk.Button(frame, text="Submit", command=self.do_deposit, **self.button_style()).pack()
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def do_deposit(self):
+        self.controller.deposit(self.amount_entry.get())
+    
+    def show_withdraw(self):
+        self.controller.show("withdraw")
+    
+    def render_withdraw(self):
+        self.show_screen("withdraw", self.build_withdraw)
+        self.amount_entry = self.withdraw_amount
+        self.clear_entries(self.amount_entry)
+        self.amount_entry.focus_set()
+    
+    def build_withdraw(self, frame):
+        tk.Label(frame, text="Withdraw Amount", font=("Arial", 14)).pack(pady=10)
+        
+        self.withdraw_amount = tk.Entry(frame, font=self.font)
+        self.withdraw_amount.pack(pady=10)
+        
+        tk.Button(frame, text="Submit", command=self.do_withdraw, **self.button_style()).pack()
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def do_withdraw(self):
+        self.controller.withdraw(self.amount_entry.get())
+    
+    def show_transfer(self):
+        self.controller.show("transfer")
+    
+    def render_transfer(self):
+        self.show_screen("transfer", self.build_transfer)
+        self.amount_entry = self.transfer_amount
+        self.clear_entries(self.recipient_entry, self.amount_entry)
+        self.recipient_entry.focus_set()
+    
+    def build_transfer(self, frame):
+        tk.Label(frame, text="Transfer Funds", font=("Arial", 14)).pack(pady=10)
+        
+        tk.Label(frame, text="Recipient Account ID:", font=self.font).pack()
+        self.recipient_entry = tk.Entry(frame, font=self.font)
+        self.recipient_entry.pack(pady=5)
+        
+        tk.Label(frame, text="Amount:", font=self.font).pack()
+        self.transfer_amount = tk.Entry(frame, font=self.font)
+        self.transfer_amount.pack(pady=5)
+        
+        tk.Button(frame, text="Submit", command=self.do_transfer, **self.button_style()).pack(pady=10)
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def do_transfer(self):
+        self.controller.transfer(self.recipient_entry.get(), self.amount_entry.get())
+    
+    def show_mobile_topup(self):
+        self.controller.show("mobile_topup")
+    
+    def render_mobile_topup(self):
+        self.show_screen("mobile_topup", self.build_mobile_topup)
+        self.amount_entry = self.topup_amount
+        self.clear_entries(self.mobile_entry, self.amount_entry)
+        self.mobile_entry.focus_set()
+    
+    def build_mobile_topup(self, frame):
+        tk.Label(frame, text="Mobile Top-Up", font=("Arial", 14)).pack(pady=10)
+        
+        tk.Label(frame, text="Mobile Number:", font=self.font).pack()
+        self.mobile_entry = tk.Entry(frame, font=self.font)
+        self.mobile_entry.pack(pady=5)
+        
+        tk.Label(frame, text="Amount:", font=self.font).pack()
+        self.topup_amount = tk.Entry(frame, font=self.font)
+        self.topup_amount.pack(pady=5)
+        
+        tk.Button(frame, text="Submit", command=self.do_mobile_topup, **self.button_style()).pack(pady=10)
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def do_mobile_topup(self):
+        self.controller.mobile_topup(self.mobile_entry.get(), self.amount_entry.get())
+    
+    def show_change_password(self):
+        self.controller.show("change_password")
+    
+    def render_change_password(self):
+        self.show_screen("change_password", self.build_change_password)
+        self.clear_entries(self.new_pass_entry, self.confirm_pass_entry)
+        self.new_pass_entry.focus_set()
+    
+    def build_change_password(self, frame):
+        tk.Label(frame, text="Change Password", font=("Arial", 14)).pack(pady=10)
+        
+        tk.Label(frame, text="New 4-digit Passcode:", font=self.font).pack()
+        self.new_pass_entry = tk.Entry(frame, font=self.font, show="*")
+        self.new_pass_entry.pack(pady=5)
+        
+        tk.Label(frame, text="Confirm Passcode:", font=self.font).pack()
+        self.confirm_pass_entry = tk.Entry(frame, font=self.font, show="*")
+        self.confirm_pass_entry.pack(pady=5)
+        
+        tk.Button(frame, text="Submit", command=self.do_change_password, **self.button_style()).pack(pady=10)
+        tk.Button(frame, text="Back", command=self.show_account_menu, **self.button_style()).pack()
+    
+    def do_change_password(self):
+        self.controller.change_password(self.new_pass_entry.get(), self.confirm_pass_entry.get())
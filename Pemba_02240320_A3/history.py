@@ -0,0 +1,137 @@
+"""Per-account transaction history.
+
+Entries are appended to one global log held column-wise in typed arrays
+(time, kind, signed amount, balance after the entry, counterparty, owning
+account).  Each account has an index of its positions in that log, so a
+statement page or a date range costs a binary search plus the rows
+returned, never a scan of the account's whole history.  Because every
+entry records the balance after it, the balance at any moment is a single
+lookup.
+"""
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from account import BankAccount
+
+KINDS = ("open", "deposit", "withdraw", "transfer", "receive", "topup", "refund", "fee",
+         "interest")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+# Kinds that take money out of the account
+_DEBITS = {"withdraw", "transfer", "topup", "fee"}
+_NO_COUNTERPARTY = -1
+
+HistoryEntry = namedtuple("HistoryEntry", "timestamp kind amount balance counterparty")
+
+
+class TransactionHistory:
+    """Records BankAccount mutations and answers statement queries"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.timestamps = array("d")
+        self.kinds = array("b")
+        self.amounts = array("q")        # signed, minor units
+        self.balances = array("q")       # balance after the entry
+        self.counterparties = array("q")  # account id or mobile number
+        self.owners = array("q")         # slot of the account the entry belongs to
+        self.slots = {}                  # account id -> slot
+        self.account_ids = []            # slot -> account id
+        self.positions = []              # slot -> array of log positions
+        self._last_time = 0.0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def attach(self, target=BankAccount):
+        target.observers = tuple(target.observers) + (self,)
+
+    def detach(self, target=BankAccount):
+        target.observers = tuple(o for o in target.observers if o is not self)
+
+    def record(self, account, kind, amount, detail=None):
+        """BankAccount observer hook"""
+        code = KIND_CODES.get(kind)
+        if code is None:
+            return
+        counterparty = _NO_COUNTERPARTY
+        if kind != "open" and detail is not None and detail.isdigit():
+            counterparty = int(detail)
+        self.append(account.account_id, code, -amount if kind in _DEBITS else amount,
+                    account.balance, counterparty)
+
+    def append(self, account_id, code, amount, balance, counterparty=_NO_COUNTERPARTY,
+               timestamp=None):
+        # Keep time non-decreasing so per-account positions stay sorted by time
+        if timestamp is None:
+            timestamp = self.clock()
+        timestamp = max(timestamp, self._last_time)
+        self._last_time = timestamp
+        slot = self.slots.get(account_id)
+        if slot is None:
+            slot = self.slots[account_id] = len(self.account_ids)
+            self.account_ids.append(account_id)
+            self.positions.append(array("q"))
+        self.positions[slot].append(len(self.kinds))
+        self.owners.append(slot)
+        self.timestamps.append(timestamp)
+        self.kinds.append(code)
+        self.amounts.append(amount)
+        self.balances.append(balance)
+        self.counterparties.append(counterparty)
+
+    def _entry(self, position):
+        counterparty = self.counterparties[position]
+        return HistoryEntry(self.timestamps[position], KINDS[self.kinds[position]],
+                            self.amounts[position], self.balances[position],
+                            None if counterparty == _NO_COUNTERPARTY else str(counterparty))
+
+    def _positions(self, account_id):
+        slot = self.slots.get(account_id)
+        return None if slot is None else self.positions[slot]
+
+    def count(self, account_id):
+        return len(self._positions(account_id) or ())
+
+    def entries(self, start=0, stop=None):
+        """Yield (account id, entry) for log positions start..stop, in log order"""
+        account_ids = self.account_ids
+        for position in range(start, len(self.kinds) if stop is None else stop):
+            yield account_ids[self.owners[position]], self._entry(position)
+
+    def statement(self, account_id, page=0, page_size=20, newest_first=True):
+        """Return one page of an account's entries"""
+        positions = self._positions(account_id)
+        if not positions:
+            return []
+        n = len(positions)
+        if newest_first:
+            stop = n - page * page_size
+            start = max(0, stop - page_size)
+            selected = reversed(positions[start:max(0, stop)])
+        else:
+            selected = positions[page * page_size:(page + 1) * page_size]
+        return [self._entry(position) for position in selected]
+
+    def between(self, account_id, start, end, limit=None):
+        """Return entries with start <= timestamp < end, oldest first"""
+        positions = self._positions(account_id)
+        if not positions:
+            return []
+        key = self.timestamps.__getitem__
+        lo = bisect_left(positions, start, key=key)
+        hi = bisect_left(positions, end, lo=lo, key=key)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self._entry(position) for position in positions[lo:hi]]
+
+    def balance_at(self, account_id, when):
+        """Balance of an account just after time ``when`` (None before its first entry)"""
+        positions = self._positions(account_id)
+        if not positions:
+            return None
+        i = bisect_right(positions, when, key=self.timestamps.__getitem__)
+        if i == 0:
+            return None
+        return self.balances[positions[i - 1]]
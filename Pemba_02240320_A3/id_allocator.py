@@ -0,0 +1,135 @@
+"""Collision-free account id allocation.
+
+Ids are produced by running a counter through a keyed Feistel permutation
+of the id space, so every counter value maps to a distinct, random-looking
+id and allocation is O(1) no matter how full the space is.  Cycle walking
+keeps results inside ``[low, high)``.
+
+The cursor is persisted in leases: the state file always records a cursor
+at or ahead of anything handed out, so after a crash the allocator skips
+the unused remainder of the lease instead of reissuing ids.
+"""
+import json
+import os
+import secrets
+import threading
+
+ROUNDS = 4
+LEASE = 4096
+
+
+class IdSpaceExhaustedError(Exception):
+    pass
+
+
+class FeistelPermutation:
+    """A keyed bijection on range(size)"""
+
+    def __init__(self, size, key):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        # Derive one odd multiplier and one xor key per round
+        self.round_keys = [((key >> (16 * i)) & 0xFFFF) * 0x9E3779B1 | 1 for i in range(ROUNDS)]
+
+    def __call__(self, value):
+        half = self.half_bits
+        mask = self.mask
+        keys = self.round_keys
+        size = self.size
+        while True:
+            left, right = value >> half, value & mask
+            for key in keys:
+                left, right = right, left ^ (((right ^ key) * key >> 7) & mask)
+            value = (left << half) | right
+            if value < size:
+                return value
+
+
+class IdBlock:
+    """A reserved run of ids, for handing to a worker"""
+
+    def __init__(self, allocator, start, stop):
+        self.allocator = allocator
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        permute = self.allocator.permutation
+        low = self.allocator.low
+        for counter in range(self.start, self.stop):
+            yield str(low + permute(counter))
+
+
+class IdAllocator:
+    """Hands out unique account ids from ``[low, high)``.
+
+    With ``state_path`` the key and cursor survive restarts.
+    """
+
+    def __init__(self, low=10000000, high=100000000, state_path=None, key=None):
+        self.low = low
+        self.high = high
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._leased = 0
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            if (state["low"], state["high"]) != (low, high):
+                raise ValueError("Id space does not match the saved allocator state")
+            key = state["key"]
+            self._cursor = self._leased = state["cursor"]
+        if key is None:
+            key = secrets.randbits(64)
+        self.key = key
+        self.permutation = FeistelPermutation(high - low, key)
+
+    @property
+    def remaining(self):
+        return self.high - self.low - self._cursor
+
+    def _save(self, cursor):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"low": self.low, "high": self.high, "key": self.key, "cursor": cursor}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    def _take(self, count):
+        """Advance the cursor by count and return the old cursor"""
+        with self._lock:
+            start = self._cursor
+            if start + count > self.high - self.low:
+                raise IdSpaceExhaustedError("No account ids left")
+            self._cursor = start + count
+            if self.state_path and self._cursor > self._leased:
+                self._leased = min(self._cursor + LEASE, self.high - self.low)
+                self._save(self._leased)
+            return start
+
+    def allocate(self):
+        """Return one new account id"""
+        return str(self.low + self.permutation(self._take(1)))
+
+    def allocate_unused(self, accounts):
+        """Return a new id that is also absent from accounts.
+
+        Only ids created outside this allocator (legacy or imported
+        accounts) can clash, so this rarely loops.
+        """
+        account_id = self.allocate()
+        while account_id in accounts:
+            account_id = self.allocate()
+        return account_id
+
+    def reserve(self, count):
+        """Reserve count ids at once and return them as an IdBlock"""
+        start = self._take(count)
+        return IdBlock(self, start, start + count)
@@ -0,0 +1,116 @@
+"""Exactly-once account operations for retried requests.
+
+A client whose request times out cannot tell whether it ran, so it sends
+it again under the same request id.  ``IdempotencyCache`` remembers the
+outcome of every request id it has run: the return value, or the
+InvalidInputError/InsufficientFundsError it raised.  A repeat gets that
+outcome back without running the operation again, and a repeat that
+arrives while the first attempt is still running waits for it.  Any other
+exception (a failing journal, say) is not an outcome of the request, so
+the id is forgotten and a retry runs it afresh.
+
+Each request id is stored with a fingerprint of the request (operation
+and arguments); a different request under a used id is refused with
+RequestIdReusedError rather than answered with someone else's result.
+
+Entries expire ``ttl`` seconds after they are made and the oldest are
+dropped beyond ``size`` entries, so clients must finish retrying within
+that window.  Every lookup, insert and eviction is O(1).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from account import InsufficientFundsError, InvalidInputError
+
+
+class RequestIdReusedError(InvalidInputError):
+    pass
+
+
+class _Entry:
+    __slots__ = ("expires", "fingerprint", "done", "result", "error", "waiting")
+
+    def __init__(self, expires, fingerprint):
+        self.expires = expires
+        self.fingerprint = fingerprint
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiting = None  # Event made by the first repeat that has to wait
+
+
+class IdempotencyCache:
+    """Bounded, expiring map of request id to the outcome of its first run"""
+
+    def __init__(self, size=100000, ttl=86400.0, clock=time.monotonic,
+                 cached_errors=(InvalidInputError, InsufficientFundsError)):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.cached_errors = cached_errors
+        self.executed = 0
+        self.replayed = 0
+        # Insertion order is expiry order because every entry lives for the
+        # same ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            request_id, entry = next(iter(entries.items()))
+            if entry.expires > now:
+                return
+            del entries[request_id]
+
+    def run(self, request_id, fingerprint, operation, *args):
+        """Return operation(*args), running it only for the first use of request_id"""
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(request_id)
+            if entry is None:
+                first = True
+                entry = self._entries[request_id] = _Entry(now + self.ttl, fingerprint)
+                if len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+                self.executed += 1
+            else:
+                first = False
+                if entry.fingerprint != fingerprint:
+                    raise RequestIdReusedError("Request id already used for a different request")
+                if not entry.done and entry.waiting is None:
+                    entry.waiting = threading.Event()
+                self.replayed += 1
+        if first:
+            return self._first_run(request_id, entry, operation, args)
+        if not entry.done:
+            entry.waiting.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _first_run(self, request_id, entry, operation, args):
+        try:
+            entry.result = operation(*args)
+        except self.cached_errors as e:
+            entry.error = e
+            raise
+        except BaseException as e:
+            # Not an outcome of the request: forget it so a retry runs again
+            entry.error = e
+            with self._lock:
+                if self._entries.get(request_id) is entry:
+                    del self._entries[request_id]
+            raise
+        finally:
+            with self._lock:
+                entry.done = True
+                waiting = entry.waiting
+            if waiting is not None:
+                waiting.set()
+        return entry.result
@@ -0,0 +1,273 @@
+"""Append-only transaction journal for BankAccount mutations.
+
+Every successful mutation is encoded as a small binary record and handed
+to a background writer thread.  The writer groups everything that arrives
+within a short commit window into a single write() + fsync(), so the
+caller only pays for encoding and a list append.  On startup the journal
+is replayed to rebuild the accounts.
+"""
+import os
+import struct
+import threading
+import zlib
+
+from account import BankAccount
+
+MAGIC = b"BJNL\x03"
+
+# Record framing: body length, crc32 of body.  A torn or corrupt tail is
+# detected on replay and ignored.
+FRAME = struct.Struct("<HI")
+# Body: kind code, amount in minor units, then three u8-length-prefixed
+# strings (account id, detail, hex passcode hash).
+BODY = struct.Struct("<Bq")
+
+KIND_CODES = {
+    "open": 1,
+    "deposit": 2,
+    "withdraw": 3,
+    "transfer": 4,
+    "topup": 5,
+    "passcode": 6,
+    # Two-phase transfer records used by the sharded ledger; detail is the
+    # transaction id
+    "hold": 7,
+    "release": 8,
+    "settle": 9,
+    "credit": 10,
+    # Undelivered mobile top-up given back; detail is the mobile number
+    "refund": 11,
+    # Fee charged with a withdrawal, transfer or top-up; detail is its kind
+    "fee": 12,
+    # Periodic interest credited by an accrual pass; detail is the period
+    "interest": 13,
+}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+
+class JournalClosedError(Exception):
+    pass
+
+
+def encode_record(kind, account_id, amount, detail=None, passcode=None):
+    """Encode one journal record, frame included"""
+    parts = [BODY.pack(KIND_CODES[kind], amount)]
+    for text in (account_id, detail, passcode):
+        data = b"" if text is None else str(text).encode()
+        parts.append(bytes((len(data),)))
+        parts.append(data)
+    body = b"".join(parts)
+    return FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_body(body):
+    code, amount = BODY.unpack_from(body)
+    fields = []
+    pos = BODY.size
+    for _ in range(3):
+        size = body[pos]
+        fields.append(body[pos + 1:pos + 1 + size].decode())
+        pos += 1 + size
+    return CODE_KINDS[code], fields[0], amount, fields[1], fields[2]
+
+
+def _bodies(f):
+    """Yield the body of each valid record from f's position, stopping at the first bad one"""
+    while True:
+        frame = f.read(FRAME.size)
+        if len(frame) < FRAME.size:
+            return
+        size, crc = FRAME.unpack(frame)
+        body = f.read(size)
+        if len(body) < size or zlib.crc32(body) != crc:
+            return
+        yield body
+
+
+def read_records(path, start=0):
+    """Yield (kind, account_id, amount, detail, passcode_hash) from a journal file.
+
+    Stops quietly at the first incomplete or corrupt record.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a transaction journal")
+        if start:
+            f.seek(start)
+        for body in _bodies(f):
+            yield decode_body(body)
+
+
+def valid_end(path):
+    """Offset just past the last valid record of a journal file (0 if it has no header)"""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            # A header cut short by a crash while the file was created
+            if MAGIC.startswith(magic):
+                return 0
+            raise ValueError(f"{path} is not a transaction journal")
+        end = f.tell()
+        for _ in _bodies(f):
+            end = f.tell()
+        return end
+
+
+def replay(path, accounts=None, account_class=BankAccount, start=0):
+    """Rebuild accounts from a journal file and return the accounts dict.
+
+    ``start`` is a byte offset to resume from, e.g. the journal position
+    recorded in a snapshot that ``accounts`` was loaded from.
+    """
+    if accounts is None:
+        accounts = {}
+    for kind, account_id, amount, detail, passcode in read_records(path, start):
+        if kind == "open":
+            account = account_class(account_id, None, detail)
+            account.passcode_hash = bytes.fromhex(passcode)
+            account.balance = amount
+            accounts[account_id] = account
+            continue
+        account = accounts[account_id]
+        if kind in ("deposit", "credit", "release", "refund", "interest"):
+            account.balance += amount
+        elif kind in ("withdraw", "topup", "hold", "fee"):
+            account.balance -= amount
+        elif kind == "transfer":
+            account.balance -= amount
+            accounts[detail].balance += amount
+        elif kind == "passcode":
+            account.passcode_hash = bytes.fromhex(passcode)
+    return accounts
+
+
+class TransactionJournal:
+    """Group-committing writer for the transaction journal.
+
+    ``window`` is how long (in seconds) the writer waits after the first
+    pending record to collect more before it writes and fsyncs; ``max_batch``
+    forces an early flush.  ``append`` returns a sequence number that can be
+    passed to ``wait`` to block until that record is durable.
+    """
+
+    def __init__(self, path, window=0.002, max_batch=4096, fsync=True):
+        self.path = path
+        self.window = window
+        self.max_batch = max_batch
+        self.fsync = fsync
+        # Records appended after a torn or corrupt tail would never be
+        # replayed, so cut the file back to its last valid record first
+        if os.path.exists(path):
+            end = valid_end(path)
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+        self._end = self._file.tell()
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    @property
+    def durable(self):
+        """Sequence number of the last record known to be on disk"""
+        return self._durable
+
+    @property
+    def position(self):
+        """File offset just past the last appended record (durable or not)"""
+        return self._end
+
+    def append(self, kind, account_id, amount=0, detail=None, passcode=None, sync=False):
+        """Queue a record for the next group commit and return its sequence number"""
+        record = encode_record(kind, account_id, amount, detail, passcode)
+        with self._cond:
+            if self._closed:
+                raise JournalClosedError("Journal is closed")
+            if self._error is not None:
+                # The writer has stopped; nothing appended now would reach disk
+                raise self._error
+            self._pending.append(record)
+            self._appended += 1
+            self._end += len(record)
+            seq = self._appended
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        if sync:
+            self.wait(seq)
+        return seq
+
+    def record(self, account, kind, amount, detail=None):
+        """BankAccount observer hook"""
+        if kind == "receive":
+            return  # the sender's transfer record covers both sides
+        passcode = account.passcode_hash.hex() if kind in ("open", "passcode") else None
+        self.append(kind, account.account_id, amount, detail, passcode)
+
+    def attach(self, target=BankAccount):
+        """Start journaling mutations of ``target`` (a class or one account)"""
+        target.observers = tuple(target.observers) + (self,)
+
+    def detach(self, target=BankAccount):
+        target.observers = tuple(o for o in target.observers if o is not self)
+
+    def wait(self, seq=None):
+        """Block until record ``seq`` (default: everything appended) is durable"""
+        with self._cond:
+            if seq is None:
+                seq = self._appended
+            while self._durable < seq and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+
+    def close(self):
+        """Flush everything still pending and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while not self._pending and not self._closed:
+                    cond.wait()
+                if not self._pending and self._closed:
+                    return
+                if self.window and not self._closed and len(self._pending) < self.max_batch:
+                    cond.wait(self.window)
+                batch = self._pending
+                self._pending = []
+            try:
+                self._file.write(b"".join(batch))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                with cond:
+                    self._error = e
+                    cond.notify_all()
+                return
+            with cond:
+                self._durable += len(batch)
+                cond.notify_all()
@@ -0,0 +1,148 @@
+"""Daily limits and fees by account category.
+
+``RULES`` gives, for each account category and each debit kind, a
+rolling 24-hour limit and a fee: a fixed part plus a rate in basis points
+(1/100 of a percent), capped.  ``LimitEngine`` compiles them into a table
+of integer tuples, one per category and kind, so checking an operation is
+a table lookup and a little integer arithmetic.
+
+Usage is kept per kind and account as one short list: the current
+bucket, the total in the window and a ring of ``buckets`` counters.  The limit check
+compares against the total, and moving the window on subtracts only the
+buckets that fell out of it; nothing is kept per transaction.
+
+Attach an engine to make ``BankAccount`` enforce it (like an observer):
+withdrawals, transfers and top-ups over the limit raise
+LimitExceededError, and the fee is taken with the operation and reported
+to the observers as a "fee".  ``posting.apply_batch`` enforces the same
+tables for bulk batches.
+"""
+import time
+from collections import namedtuple
+
+from account import BankAccount, InsufficientFundsError, LimitExceededError
+from money import to_minor
+
+# limit, fixed_fee and max_fee in major units (max_fee None for no cap);
+# rate in basis points of the amount
+Rule = namedtuple("Rule", "limit fixed_fee rate max_fee")
+
+RULES = {
+    "Personal": {
+        "withdraw": Rule(limit=50000, fixed_fee=0, rate=0, max_fee=None),
+        "transfer": Rule(limit=100000, fixed_fee=0, rate=10, max_fee=100),
+        "topup": Rule(limit=5000, fixed_fee=0, rate=0, max_fee=None),
+    },
+    "Business": {
+        "withdraw": Rule(limit=500000, fixed_fee=0, rate=0, max_fee=None),
+        "transfer": Rule(limit=2000000, fixed_fee=5, rate=5, max_fee=500),
+        "topup": Rule(limit=50000, fixed_fee=0, rate=0, max_fee=None),
+    },
+}
+
+KINDS = ("withdraw", "transfer", "topup")
+
+# Results of LimitEngine.take other than a fee
+OVER_LIMIT = -1
+NO_FUNDS = -2
+
+# Fees are whole cents, rounded half up
+_BASIS = 10000
+_HALF_BASIS = _BASIS // 2
+_NO_CAP = 1 << 62
+
+
+class LimitEngine:
+    """Compiled limit and fee tables plus windowed per-account usage"""
+
+    def __init__(self, rules=RULES, window=86400.0, buckets=24, clock=time.time):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = window / buckets
+        self.clock = clock
+        # kind -> account id -> [current bucket, total in the window,
+        # bucket counters...]
+        self.usage = {kind: {} for kind in KINDS}
+        # category -> kind -> (limit, fixed fee, rate, fee cap, usage)
+        self.rules = {}
+        for category, kinds in rules.items():
+            self.rules[category] = {}
+            for kind in KINDS:
+                rule = kinds[kind]
+                cap = _NO_CAP if rule.max_fee is None else to_minor(rule.max_fee)
+                self.rules[category][kind] = (to_minor(rule.limit), to_minor(rule.fixed_fee),
+                                              rule.rate, cap, self.usage[kind])
+        self.messages = {kind: f"Daily {kind} limit exceeded" for kind in KINDS}
+
+    def attach(self, target=BankAccount):
+        target.limits = self
+
+    def detach(self, target=BankAccount):
+        if target.limits is self:
+            target.limits = None
+
+    def bucket(self):
+        """The current bucket number, as take() expects it"""
+        return int(self.clock() // self.bucket_seconds)
+
+    def clear(self):
+        for accounts in self.usage.values():
+            accounts.clear()
+
+    def _advance(self, usage, bucket):
+        """Move an account's window on to bucket"""
+        last = usage[0]
+        if bucket <= last:
+            return
+        if bucket - last >= self.buckets:
+            usage[1:] = [0] * (self.buckets + 1)
+        else:
+            total = usage[1]
+            for b in range(last + 1, bucket + 1):
+                slot = 2 + b % self.buckets
+                total -= usage[slot]
+                usage[slot] = 0
+            usage[1] = total
+        usage[0] = bucket
+
+    def take(self, account_id, rule, amount, balance, bucket):
+        """Charge a debit of amount cents against its limit.
+
+        Returns the fee, or OVER_LIMIT or NO_FUNDS (when amount plus fee
+        exceeds balance) without recording anything.
+        """
+        limit, fee, rate, max_fee, accounts = rule
+        usage = accounts.get(account_id)
+        if usage is None:
+            usage = accounts[account_id] = [bucket, 0] + [0] * self.buckets
+        elif usage[0] != bucket:
+            self._advance(usage, bucket)
+        total = usage[1] + amount
+        if total > limit:
+            return OVER_LIMIT
+        if rate:
+            fee += (amount * rate + _HALF_BASIS) // _BASIS
+            if fee > max_fee:
+                fee = max_fee
+        if amount + fee > balance:
+            return NO_FUNDS
+        usage[1] = total
+        usage[2 + bucket % self.buckets] += amount
+        return fee
+
+    def debit(self, account, kind, amount):
+        """Check and record a debit by a BankAccount; returns the fee in cents"""
+        fee = self.take(account.account_id, self.rules[account.account_category][kind],
+                        amount, account.balance, int(self.clock() // self.bucket_seconds))
+        if fee < 0:
+            if fee == OVER_LIMIT:
+                raise LimitExceededError(self.messages[kind])
+            raise InsufficientFundsError("Insufficient funds")
+        return fee
+
+    def release(self, account, kind, amount):
+        """Give back usage recorded by debit() for an operation that was undone"""
+        usage = self.usage[kind].get(account.account_id)
+        if usage is not None:
+            usage[1] -= amount
+            usage[2 + usage[0] % self.buckets] -= amount
@@ -0,0 +1,230 @@
+"""Operation counters, latency histograms and span hooks.
+
+``Metrics.attach()`` wraps the BankAccount operations, Authenticator.login
+and the commands the app's BankingController runs, counting every call
+and every exception by class and timing calls into one ``Histogram`` per
+operation.
+``detach()`` puts the original methods back, so instrumentation that is
+not attached costs nothing at all.  With ``sample=N`` only every Nth call
+of an operation is timed (all are still counted).
+
+Histograms are HDR-style: values in nanoseconds fall into log-linear
+buckets, 16 per power of two, so any percentile is read back within about
+3% and recording is an index computation and an array increment.  Updates
+take no lock; under the GIL two threads can at worst lose an increment,
+which is acceptable for metrics.
+
+Span hooks are callables ``hook(operation, start_ns, end_ns, error)``
+called after each timed call (error is the exception or None), e.g. to
+forward them to a tracer.  ``export()`` renders everything in the
+Prometheus text format.
+"""
+import time
+from array import array
+
+from account import BankAccount
+from auth import Authenticator
+from controller import BankingController
+
+# Values below 2**_SUB_BITS get a bucket each; above that every power of
+# two is split into 2**(_SUB_BITS - 1) buckets
+_SUB_BITS = 5
+_HALF = 1 << (_SUB_BITS - 1)
+_MAX_SHIFT = 40
+BUCKETS = (_MAX_SHIFT + 2) * _HALF
+
+ACCOUNT_OPERATIONS = ("deposit", "withdraw", "transfer", "mobile_topup", "refund_topup",
+                      "change_password")
+
+
+def bucket_index(value):
+    shift = value.bit_length() - _SUB_BITS
+    if shift <= 0:
+        return value
+    if shift > _MAX_SHIFT:
+        return BUCKETS - 1
+    return (shift << (_SUB_BITS - 1)) + (value >> shift)
+
+
+def bucket_floor(index):
+    """The smallest value that falls into bucket index"""
+    if index < 2 * _HALF:
+        return index
+    shift = index // _HALF - 1
+    return (index % _HALF + _HALF) << shift
+
+
+class Histogram:
+    """Log-linear histogram of non-negative integers (nanoseconds)"""
+
+    def __init__(self):
+        self.counts = array("q", bytes(8 * BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        shift = value.bit_length() - _SUB_BITS
+        if shift <= 0:
+            self.counts[value] += 1
+        elif shift <= _MAX_SHIFT:
+            self.counts[(shift << (_SUB_BITS - 1)) + (value >> shift)] += 1
+        else:
+            self.counts[BUCKETS - 1] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Value at quantile q (0..1): the midpoint of the bucket holding it"""
+        if not self.count:
+            return 0
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                low = bucket_floor(index)
+                return min((low + bucket_floor(index + 1) - 1) // 2, self.max)
+        return self.max
+
+    def merge(self, other):
+        """Add the values recorded in another histogram to this one"""
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class OperationStats:
+    """Calls, errors by exception class and latency of one operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.latency = Histogram()
+
+
+class Metrics:
+    """Instruments the banking operations while attached"""
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, sample=1, clock=time.perf_counter_ns):
+        if sample < 1:
+            raise ValueError("sample must be at least 1")
+        self.sample = sample
+        self.clock = clock
+        self.operations = {}  # name -> OperationStats
+        self.spans = []
+        self._originals = []
+
+    def stats(self, name):
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        return stats
+
+    def add_span_hook(self, hook):
+        self.spans.append(hook)
+
+    def remove_span_hook(self, hook):
+        self.spans.remove(hook)
+
+    def instrument(self, name, function):
+        """Return function wrapped to count, time and trace calls as operation name"""
+        stats = self.stats(name)
+        errors = stats.errors
+        record = stats.latency.record
+        spans = self.spans
+        clock = self.clock
+        sample = self.sample
+
+        def instrumented(*args, **kwargs):
+            stats.calls += 1
+            if stats.calls % sample:
+                try:
+                    return function(*args, **kwargs)
+                except Exception as e:
+                    error = type(e).__name__
+                    errors[error] = errors.get(error, 0) + 1
+                    raise
+            start = clock()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                end = clock()
+                record(end - start)
+                error = type(e).__name__
+                errors[error] = errors.get(error, 0) + 1
+                for hook in spans:
+                    hook(name, start, end, e)
+                raise
+            end = clock()
+            record(end - start)
+            for hook in spans:
+                hook(name, start, end, None)
+            return result
+
+        instrumented.__name__ = function.__name__
+        instrumented.__doc__ = function.__doc__
+        instrumented.__wrapped__ = function
+        return instrumented
+
+    def _patch(self, cls, name, wrapper):
+        self._originals.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, wrapper)
+
+    def attach(self):
+        if self._originals:
+            return
+        for name in ACCOUNT_OPERATIONS:
+            self._patch(BankAccount, name, self.instrument(name, getattr(BankAccount, name)))
+        self._patch(Authenticator, "login", self.instrument("login", Authenticator.login))
+
+        # App commands are timed where they run, on the dispatcher, as
+        # "app.<command>" after the first part of their key
+        run_command = BankingController.run_command
+        instrument = self.instrument
+        wrapped = {}
+
+        def instrumented_run_command(controller, key, operation, on_success, errors=()):
+            name = key[0]
+            if name not in wrapped:
+                wrapped[name] = instrument("app." + name, lambda operation: operation())
+            timed = wrapped[name]
+            return run_command(controller, key, lambda: timed(operation), on_success, errors)
+
+        self._patch(BankingController, "run_command", instrumented_run_command)
+
+    def detach(self):
+        while self._originals:
+            cls, name, original = self._originals.pop()
+            setattr(cls, name, original)
+
+    def export(self, prefix="bank"):
+        """All metrics in the Prometheus text exposition format"""
+        lines = [f"# TYPE {prefix}_operations_total counter"]
+        names = sorted(self.operations)
+        for name in names:
+            lines.append(f'{prefix}_operations_total{{operation="{name}"}} '
+                         f"{self.operations[name].calls}")
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for name in names:
+            for error, n in sorted(self.operations[name].errors.items()):
+                lines.append(f'{prefix}_errors_total{{operation="{name}",error="{error}"}} {n}')
+        lines.append(f"# TYPE {prefix}_latency_seconds summary")
+        for name in names:
+            latency = self.operations[name].latency
+            if not latency.count:
+                continue
+            for q in self.QUANTILES:
+                lines.append(f'{prefix}_latency_seconds{{operation="{name}",quantile="{q}"}} '
+                             f"{latency.percentile(q) / 1e9:.9f}")
+            lines.append(f'{prefix}_latency_seconds_sum{{operation="{name}"}} '
+                         f"{latency.total / 1e9:.9f}")
+            lines.append(f'{prefix}_latency_seconds_count{{operation="{name}"}} {latency.count}')
+        return "\n".join(lines) + "\n"
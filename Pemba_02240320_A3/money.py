@@ -0,0 +1,80 @@
+"""Fixed-point money helpers.
+
+Balances and amounts are held as integers in minor units (cents), so
+arithmetic is exact and balance checks are plain integer comparisons.
+Conversion happens once, at the edges: ``parse_amount`` for user text,
+``to_minor`` for API callers passing numbers, ``format_amount`` for display.
+"""
+import re
+from decimal import Decimal
+
+MINOR_UNITS = 100
+
+# The amount grammar: an optional sign, ASCII digits and at most two
+# decimal places, with surrounding whitespace
+_AMOUNT = re.compile(r"\s*([+-]?)(?:([0-9]+)(?:\.([0-9]{0,2}))?|\.([0-9]{1,2}))\s*")
+# Scale for, and zeros that pad to cents, a fraction of 0, 1 or 2 digits
+_FRACTION_SCALE = (0, MINOR_UNITS // 10, MINOR_UNITS // 100)
+_CENTS_PAD = ("00", "0", "")
+
+
+def match_amount(text):
+    """Cents for a decimal string, or None if it is not one"""
+    # Plain "1234", "-12.5" and the like skip the regex: int() reads the
+    # sign and the digits with the fraction padded to cents.  Anything else
+    # (whitespace, a leading point, non-ASCII text) goes through the regex.
+    if text.isascii():
+        whole, _, frac = text.partition(".")
+        digits = whole[1:] if whole[:1] in "+-" else whole
+        if digits.isdigit() and len(frac) <= 2 and (frac.isdigit() or not frac):
+            return int(whole + frac + _CENTS_PAD[len(frac)])
+    match = _AMOUNT.fullmatch(text)
+    if match is None:
+        return None
+    sign, whole, frac, point_frac = match.groups()
+    if whole is None:
+        whole, frac = "0", point_frac
+    cents = int(whole) * MINOR_UNITS
+    if frac:
+        cents += int(frac) * _FRACTION_SCALE[len(frac)]
+    return -cents if sign == "-" else cents
+
+
+def parse_amount(text):
+    """Parse a decimal string such as "12", "12.5" or "-0.05" into cents"""
+    cents = match_amount(text)
+    if cents is None:
+        raise ValueError(f"Invalid amount: {text!r}")
+    return cents
+
+
+def to_minor(amount):
+    """Convert an amount in major units (int, float, Decimal or str) to cents"""
+    cls = amount.__class__
+    if cls is int:
+        return amount * MINOR_UNITS
+    if cls is str:
+        return parse_amount(amount)
+    if cls is float:
+        cents = round(amount * MINOR_UNITS)
+        if abs(cents - amount * MINOR_UNITS) > 1e-6 * max(1.0, abs(amount)):
+            raise ValueError(f"Amount has more than two decimal places: {amount!r}")
+        return cents
+    if isinstance(amount, Decimal):
+        cents = amount * MINOR_UNITS
+        if cents != cents.to_integral_value():
+            raise ValueError(f"Amount has more than two decimal places: {amount!r}")
+        return int(cents)
+    raise TypeError(f"Unsupported amount type: {cls.__name__}")
+
+
+def from_minor(cents):
+    """Convert cents back to an exact Decimal amount in major units"""
+    return Decimal(cents).scaleb(-2)
+
+
+def format_amount(cents):
+    """Format cents as a decimal string with two places, e.g. "1234.05" """
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), MINOR_UNITS)
+    return f"{sign}{whole}.{frac:02d}"
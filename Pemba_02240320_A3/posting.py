@@ -0,0 +1,236 @@
+"""Bulk posting of deposits, withdrawals and transfers.
+
+``apply_batch`` applies a whole batch without raising per row; instead
+the result is a status array with one code per operation, following the
+same rules as ``BankAccount.deposit``/``withdraw``/``transfer``.  An
+AccountStore with no limits attached takes the fast path: one pass that
+validates each operation and posts it straight into the balance column,
+looking each distinct id up once.  Otherwise a first pass resolves and
+validates the whole batch and a second posts it.
+
+Operations are applied strictly in batch order, so several transfers
+touching the same account see each other's effects in that order, and
+observers are told about each one as it is posted, like the per-call
+methods do.  When a
+limits.LimitEngine is attached to BankAccount, withdrawals and transfers
+are checked against it and charged its fees in that same order.
+"""
+from array import array
+
+from account import BankAccount
+from account_store import CATEGORIES, AccountStore
+from limits import OVER_LIMIT
+
+# Status codes
+OK = 0
+INVALID_INPUT = 1        # InvalidInputError
+INSUFFICIENT_FUNDS = 2   # InsufficientFundsError
+UNKNOWN_ACCOUNT = 3      # account or recipient does not exist
+LIMIT_EXCEEDED = 4       # LimitExceededError
+
+DEPOSIT = "deposit"
+WITHDRAW = "withdraw"
+TRANSFER = "transfer"
+_OP_CODES = {DEPOSIT: 0, WITHDRAW: 1, TRANSFER: 2}
+
+
+def _resolve(accounts, ops):
+    """First pass: map ids to rows and validate kinds and amounts.
+
+    Returns parallel lists of op codes, amounts, source rows and target
+    rows (-1 for unknown accounts; None where there is no target) plus
+    the status array, pre-filled for operations that are already invalid.
+    """
+    if isinstance(accounts, AccountStore):
+        row_of = accounts.row_of
+    else:
+        def row_of(account_id):
+            return accounts.get(account_id, -1)
+    account_ids = [op[0] for op in ops]
+    codes = [_OP_CODES.get(op[1], -1) for op in ops]
+    amounts = [op[2] for op in ops]
+    recipients = [op[3] if len(op) > 3 and code == 2 else None
+                  for op, code in zip(ops, codes)]
+
+    # Every distinct id is looked up once, however often it appears
+    rows = {account_id: row_of(account_id) for account_id in set(account_ids)}
+    for recipient in set(recipients):
+        if recipient not in rows:
+            rows[recipient] = -1 if recipient is None else row_of(recipient)
+    sources = list(map(rows.__getitem__, account_ids))
+    targets = list(map(rows.__getitem__, recipients))
+
+    status = array("b", bytes(len(ops)))
+    for i, (code, amount, source, target) in enumerate(zip(codes, amounts, sources, targets)):
+        if code == -1 or amount.__class__ is not int or amount <= 0:
+            status[i] = INVALID_INPUT
+        elif source == -1 or code == 2 and target == -1:
+            status[i] = UNKNOWN_ACCOUNT
+    return codes, amounts, sources, targets, status
+
+
+def _apply_store(store, ops, status, notify=None):
+    """Validate and post each operation in one pass"""
+    balances = store.balances
+    row_of = store.row_of
+    rows = {}
+    get = rows.get
+    for i, op in enumerate(ops):
+        kind = op[1]
+        amount = op[2]
+        if amount.__class__ is not int or amount <= 0 or kind not in _OP_CODES:
+            status[i] = INVALID_INPUT
+            continue
+        account_id = op[0]
+        source = get(account_id)
+        if source is None:
+            source = rows[account_id] = row_of(account_id)
+        if source == -1:
+            status[i] = UNKNOWN_ACCOUNT
+            continue
+        if kind == DEPOSIT:
+            balances[source] += amount
+            if notify is not None:
+                notify(i, source, None)
+            continue
+        target = None
+        if kind == TRANSFER:
+            recipient = op[3] if len(op) > 3 else None
+            target = get(recipient)
+            if target is None:
+                target = rows[recipient] = -1 if recipient is None else row_of(recipient)
+            if target == -1:
+                status[i] = UNKNOWN_ACCOUNT
+                continue
+        if amount > balances[source]:
+            status[i] = INSUFFICIENT_FUNDS
+            continue
+        balances[source] -= amount
+        if kind == TRANSFER:
+            balances[target] += amount
+        if notify is not None:
+            notify(i, source, target)
+
+
+def _rules(limits, category):
+    """Compiled limit rules by op code for one category (deposits have none)"""
+    rules = limits.rules[category]
+    return [None, rules[WITHDRAW], rules[TRANSFER]]
+
+
+def _post_store_limited(store, limits, account_ids, codes, amounts, sources, targets, status,
+                        fees, notify=None):
+    balances = store.balances
+    categories = store.categories
+    rules = [_rules(limits, category) for category in CATEGORIES]
+    take = limits.take
+    bucket = limits.bucket()
+    for i, (code, amount, source, target) in enumerate(zip(codes, amounts, sources, targets)):
+        if status[i]:
+            continue
+        if code == 0:
+            balances[source] += amount
+            if notify is not None:
+                notify(i, source, target)
+            continue
+        fee = take(str(account_ids[i]), rules[categories[source]][code], amount,
+                   balances[source], bucket)
+        if fee < 0:
+            status[i] = LIMIT_EXCEEDED if fee == OVER_LIMIT else INSUFFICIENT_FUNDS
+            continue
+        balances[source] -= amount + fee
+        if code == 2:
+            balances[target] += amount
+        fees[i] = fee
+        if notify is not None:
+            notify(i, source, target)
+
+
+def _post_objects_limited(limits, codes, amounts, sources, targets, status, fees, notify=None):
+    rules = {category: _rules(limits, category) for category in limits.rules}
+    take = limits.take
+    bucket = limits.bucket()
+    for i, (code, amount, source, target) in enumerate(zip(codes, amounts, sources, targets)):
+        if status[i]:
+            continue
+        if code == 0:
+            source.balance += amount
+            if notify is not None:
+                notify(i, source, target)
+            continue
+        fee = take(source.account_id, rules[source.account_category][code], amount,
+                   source.balance, bucket)
+        if fee < 0:
+            status[i] = LIMIT_EXCEEDED if fee == OVER_LIMIT else INSUFFICIENT_FUNDS
+            continue
+        source.balance -= amount + fee
+        if code == 2:
+            target.balance += amount
+        fees[i] = fee
+        if notify is not None:
+            notify(i, source, target)
+
+
+def _post_objects(codes, amounts, sources, targets, status, notify=None):
+    for i, (code, amount, source, target) in enumerate(zip(codes, amounts, sources, targets)):
+        if status[i]:
+            continue
+        if code == 0:
+            source.balance += amount
+        elif amount > source.balance:
+            status[i] = INSUFFICIENT_FUNDS
+            continue
+        else:
+            source.balance -= amount
+            if code == 2:
+                target.balance += amount
+        if notify is not None:
+            notify(i, source, target)
+
+
+def _notifier(accounts, ops, fees):
+    """notify(i, source, target): report row i to the observers as soon as it is
+    posted, so they see the balances it left (source and target are rows of
+    an AccountStore, or accounts)"""
+    view = accounts.view if isinstance(accounts, AccountStore) else None
+
+    def notify(i, source, target):
+        op = ops[i]
+        account = source if view is None else view(source)
+        if op[1] == TRANSFER:
+            account._notify(TRANSFER, op[2], op[3])
+            recipient = target if view is None else view(target)
+            recipient._notify("receive", op[2], op[0])
+        else:
+            account._notify(op[1], op[2])
+        if fees is not None and fees[i]:
+            account._notify("fee", fees[i], op[1])
+    return notify
+
+
+def apply_batch(accounts, ops):
+    """Apply a batch of operations and return an array of status codes.
+
+    ``accounts`` is an AccountStore or a dict of BankAccount objects.  Each
+    op is ``(account_id, kind, amount)`` or, for transfers,
+    ``(account_id, "transfer", amount, recipient_id)``, with the amount an
+    int in minor units.
+    """
+    if not isinstance(ops, (list, tuple)):
+        ops = list(ops)
+    limits = BankAccount.limits
+    fees = array("q", bytes(8 * len(ops))) if limits is not None else None
+    notify = _notifier(accounts, ops, fees) if BankAccount.observers else None
+    if limits is None and isinstance(accounts, AccountStore):
+        status = array("b", bytes(len(ops)))
+        _apply_store(accounts, ops, status, notify)
+        return status
+    codes, amounts, sources, targets, status = _resolve(accounts, ops)
+    if limits is None:
+        _post_objects(codes, amounts, sources, targets, status, notify)
+    elif isinstance(accounts, AccountStore):
+        _post_store_limited(accounts, limits, [op[0] for op in ops], codes, amounts, sources,
+                            targets, status, fees, notify)
+    else:
+        _post_objects_limited(limits, codes, amounts, sources, targets, status, fees, notify)
+    return status
@@ -0,0 +1,419 @@
+"""Headless banking service over TCP or a Unix socket.
+
+Wire format: every message is a frame of a little-endian u32 length
+followed by the body.  A request body is ``u32 request id, u8 opcode``
+followed by u16-length-prefixed UTF-8 fields; a response body is
+``u32 request id, u8 status`` followed by fields the same way.  Amounts
+travel as decimal text in major units ("12.50").
+
+Clients may pipeline: they can send any number of requests without
+waiting, and responses come back in request order on each connection.
+Login state belongs to the connection, like the GUI's current account.
+The operations that hash a passcode (CREATE, LOGIN, CHANGE_PASSWORD) run
+the slow KDF on the default executor, so other connections are served
+meanwhile; the connection itself waits, keeping its responses in order.
+
+Operations that move money take an optional last field, a client-chosen
+request id.  A retry with the same id (on any connection logged in to
+the same account) gets the original response without the operation
+running again.
+
+    python service.py --port 8765
+    python service.py --unix /tmp/bank.sock
+    python service.py --simulate-operators   # deliver top-ups to a local simulator
+    python service.py --journal bank.journal --snapshot bank.snap   # keep state across restarts
+"""
+import argparse
+import asyncio
+import random
+import struct
+from operator import methodcaller
+
+from account import BankAccount, InsufficientFundsError, InvalidInputError
+from auth import AuthenticationError, Authenticator, hash_passcode, verify_passcode
+from id_allocator import IdAllocator
+from idempotency import IdempotencyCache
+from money import format_amount
+from validation import MESSAGES, check_passcode
+
+LENGTH = struct.Struct("<I")
+HEADER = struct.Struct("<IB")
+FIELD = struct.Struct("<H")
+
+# Opcodes
+CREATE = 1           # (category) -> (account_id, passcode)
+LOGIN = 2            # (account_id, passcode) -> ()
+BALANCE = 3          # () -> (amount)
+DEPOSIT = 4          # (amount[, request_id]) -> ()
+WITHDRAW = 5         # (amount[, request_id]) -> ()
+TRANSFER = 6         # (recipient_id, amount[, request_id]) -> ()
+TOPUP = 7            # (mobile_number, amount[, request_id]) -> ()
+CHANGE_PASSWORD = 8  # (new_passcode) -> ()
+
+# Status codes
+OK = 0
+INVALID_INPUT = 1
+INSUFFICIENT_FUNDS = 2
+NOT_LOGGED_IN = 3
+AUTH_FAILED = 4
+BAD_REQUEST = 5
+
+MAX_FRAME = 64 * 1024
+DRAIN_THRESHOLD = 256 * 1024
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message or f"status {status}")
+        self.status = status
+
+
+class MalformedFrameError(ValueError):
+    """A frame too short for its header, or with fields that overrun it"""
+    def __init__(self, request_id=0):
+        super().__init__("Malformed request")
+        self.request_id = request_id
+
+
+def encode_fields(fields):
+    parts = []
+    for field in fields:
+        data = field.encode()
+        parts.append(FIELD.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_fields(body, pos):
+    fields = []
+    end = len(body)
+    while pos < end:
+        if pos + FIELD.size > end:
+            raise ValueError("Truncated field length")
+        (size,) = FIELD.unpack_from(body, pos)
+        pos += FIELD.size
+        if pos + size > end:
+            raise ValueError("Truncated field")
+        fields.append(body[pos:pos + size].decode())
+        pos += size
+    return fields
+
+
+def encode_frame(request_id, code, fields=()):
+    body = HEADER.pack(request_id, code) + encode_fields(fields)
+    return LENGTH.pack(len(body)) + body
+
+
+def decode_frame(body):
+    """Split a frame body into (request_id, code, fields); raises MalformedFrameError"""
+    if len(body) < HEADER.size:
+        raise MalformedFrameError()
+    request_id, code = HEADER.unpack_from(body)
+    try:
+        return request_id, code, decode_fields(body, HEADER.size)
+    except ValueError:  # including UnicodeDecodeError
+        raise MalformedFrameError(request_id) from None
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(LENGTH.size)
+    (size,) = LENGTH.unpack(header)
+    if size > MAX_FRAME:
+        raise ValueError("Frame too large")
+    return await reader.readexactly(size)
+
+
+class Session:
+    """Per-connection state"""
+    __slots__ = ("account", "peer")
+
+    def __init__(self, peer=None):
+        self.account = None
+        self.peer = peer
+
+
+class BankService:
+    """Executes protocol operations against an accounts mapping"""
+
+    def __init__(self, accounts=None, id_allocator=None):
+        self.accounts = {} if accounts is None else accounts
+        self.id_allocator = IdAllocator() if id_allocator is None else id_allocator
+        self.auth = Authenticator()
+        # Outcomes of requests sent with a request id, keyed by account and id
+        self.idempotency = IdempotencyCache()
+        self.handlers = {
+            BALANCE: self.balance,
+            DEPOSIT: self.deposit,
+            WITHDRAW: self.withdraw,
+            TRANSFER: self.transfer,
+            TOPUP: self.mobile_topup,
+        }
+        # Coroutines that hash a passcode off the event loop
+        self.hashing_handlers = {
+            CREATE: self.create_account,
+            LOGIN: self.login,
+            CHANGE_PASSWORD: self.change_password,
+        }
+
+    def execute(self, session, code, fields):
+        """Run one request and return (status, response fields)"""
+        handler = self.handlers.get(code)
+        if handler is None:
+            return BAD_REQUEST, ("Unknown operation",)
+        try:
+            return OK, handler(session, *fields)
+        except Exception as e:
+            return self._failure(e)
+
+    async def execute_hashing(self, session, code, fields):
+        """execute() for the operations in hashing_handlers"""
+        try:
+            return OK, await self.hashing_handlers[code](session, *fields)
+        except Exception as e:
+            return self._failure(e)
+
+    @staticmethod
+    def _failure(error):
+        """(status, response fields) for an exception from a handler"""
+        if isinstance(error, TypeError):
+            return BAD_REQUEST, ("Wrong number of fields",)
+        if isinstance(error, ServiceError):
+            return error.status, (str(error),)
+        if isinstance(error, InvalidInputError):
+            return INVALID_INPUT, (str(error),)
+        if isinstance(error, InsufficientFundsError):
+            return INSUFFICIENT_FUNDS, (str(error),)
+        if isinstance(error, ValueError):
+            return INVALID_INPUT, ("Enter a valid number",)
+        raise error
+
+    @staticmethod
+    async def _off_loop(function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _current(self, session):
+        if session.account is None:
+            raise ServiceError(NOT_LOGGED_IN, "Not logged in")
+        return session.account
+
+    async def create_account(self, session, category):
+        if category not in ("Personal", "Business"):
+            raise InvalidInputError("Unknown account category")
+        passcode = str(random.randint(1000, 9999))
+        passcode_hash = await self._off_loop(hash_passcode, passcode)
+        account_id = self.id_allocator.allocate_unused(self.accounts)
+        self.accounts[account_id] = BankAccount.open(account_id, None, category,
+                                                     passcode_hash=passcode_hash)
+        return account_id, passcode
+
+    async def login(self, session, account_id, passcode):
+        auth = self.auth
+        try:
+            account, record = auth.begin_login(self.accounts, account_id, passcode, session.peer)
+            if account is None:
+                valid = await self._off_loop(verify_passcode, record, passcode)
+                account = auth.finish_login(self.accounts, account_id, passcode, session.peer,
+                                            record, valid)
+        except AuthenticationError as e:
+            raise ServiceError(AUTH_FAILED, str(e))
+        session.account = account
+        return ()
+
+    def balance(self, session):
+        return (format_amount(self._current(session).balance),)
+
+    def _once(self, session, request_id, fingerprint, operation):
+        """Run operation(account) for the session's account, once per request id"""
+        account = self._current(session)
+        if request_id is None:
+            return operation(account)
+        return self.idempotency.run((account.account_id, request_id), fingerprint,
+                                    operation, account)
+
+    def deposit(self, session, amount, request_id=None):
+        self._once(session, request_id, ("deposit", amount), methodcaller("deposit", amount))
+        return ()
+
+    def withdraw(self, session, amount, request_id=None):
+        self._once(session, request_id, ("withdraw", amount), methodcaller("withdraw", amount))
+        return ()
+
+    def transfer(self, session, recipient_id, amount, request_id=None):
+        def transfer(account):
+            recipient = self.accounts.get(recipient_id)
+            if recipient is None:
+                raise InvalidInputError("Recipient account not found")
+            return account.transfer(amount, recipient)
+
+        self._once(session, request_id, ("transfer", recipient_id, amount), transfer)
+        return ()
+
+    def mobile_topup(self, session, mobile_number, amount, request_id=None):
+        self._once(session, request_id, ("topup", mobile_number, amount),
+                   methodcaller("mobile_topup", amount, mobile_number))
+        return ()
+
+    async def change_password(self, session, new_passcode):
+        account = self._current(session)
+        code = check_passcode(new_passcode)
+        if code:
+            raise InvalidInputError(MESSAGES[code])
+        passcode_hash = await self._off_loop(hash_passcode, new_passcode)
+        account.change_password(new_passcode, passcode_hash)
+        return ()
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        # Throttle by client host; Unix socket peers share one bucket
+        session = Session(peer[0] if isinstance(peer, tuple) else "local")
+        try:
+            while True:
+                try:
+                    body = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    request_id, code, fields = decode_frame(body)
+                except MalformedFrameError as e:
+                    # The frame length was sound, so the stream is still in step
+                    request_id, status, result = e.request_id, BAD_REQUEST, (str(e),)
+                else:
+                    if code in self.hashing_handlers:
+                        status, result = await self.execute_hashing(session, code, fields)
+                    else:
+                        status, result = self.execute(session, code, fields)
+                writer.write(encode_frame(request_id, status, result))
+                # Responses go out as soon as they are written; only apply
+                # back-pressure once a pipelining client falls behind
+                if writer.transport.get_write_buffer_size() > DRAIN_THRESHOLD:
+                    await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+class BankClient:
+    """Pipelining asyncio client for BankService"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._waiting = {}
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                body = await read_frame(self.reader)
+                request_id, status, fields = decode_frame(body)
+                future = self._waiting.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, fields))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(str(e)))
+            self._waiting.clear()
+
+    def send(self, code, *fields):
+        """Queue a request without waiting; returns a future of (status, fields)"""
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[self._next_id] = future
+        self.writer.write(encode_frame(self._next_id, code, fields))
+        return future
+
+    async def call(self, code, *fields):
+        """Send a request and return its fields, raising ServiceError on failure"""
+        status, result = await self.send(code, *fields)
+        if status != OK:
+            raise ServiceError(status, result[0] if result else "")
+        return result
+
+    async def close(self):
+        self.writer.close()
+        self._receiver.cancel()
+
+
+async def snapshot_periodically(snapshotter, interval):
+    """Start a snapshot every interval seconds.
+
+    The cut runs here on the event loop, between requests, so it never
+    sees an operation half done; the file is written on a thread.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        snapshotter.snapshot()
+
+
+async def serve_forever(host, port, unix_path, simulate_operators=False, journal_path=None,
+                        snapshot_path=None, snapshot_interval=300.0):
+    gateway = None
+    accounts = journal = snapshotter = snapshots = None
+    if journal_path or snapshot_path:
+        # Imported here because these modules depend on BankAccount
+        from journal import TransactionJournal
+        from snapshot import Snapshotter, restore
+        accounts = restore(snapshot_path, journal_path)
+        if journal_path:
+            journal = TransactionJournal(journal_path)
+            journal.attach()
+        if snapshot_path:
+            snapshotter = Snapshotter(accounts, snapshot_path, journal)
+            snapshots = asyncio.ensure_future(snapshot_periodically(snapshotter, snapshot_interval))
+    if simulate_operators:
+        # Imported here because the simulator is only for local runs
+        from topup import OperatorSimulator, TopupGateway
+        gateway = TopupGateway(OperatorSimulator())
+        await gateway.start()
+        gateway.attach()
+    server = await BankService(accounts).start(host, port, unix_path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if gateway:
+            gateway.detach()
+            await gateway.close()
+        if snapshotter:
+            snapshots.cancel()
+            snapshotter.wait()
+            snapshotter.snapshot()
+            snapshotter.wait()
+        if journal:
+            journal.detach()
+            journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the headless banking service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--simulate-operators", action="store_true",
+                        help="send mobile top-ups to a local operator simulator")
+    parser.add_argument("--journal", help="journal every change to this file and replay it on start")
+    parser.add_argument("--snapshot", help="snapshot the accounts to this file and restart from it")
+    parser.add_argument("--snapshot-interval", type=float, default=300.0, help="seconds")
+    args = parser.parse_args()
+    asyncio.run(serve_forever(args.host, args.port, args.unix, args.simulate_operators,
+                              args.journal, args.snapshot, args.snapshot_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Sharded ledger: accounts hash-partitioned across worker processes.
+
+Each worker process owns the ``BankAccount`` objects of its shard and, when
+a journal directory is given, journals every change so it can be restarted
+after a crash.  Single-account operations go straight to the owning shard.
+Transfers between shards use two-phase commit, coordinated by
+``ShardedLedger``:
+
+1. prepare: the source shard moves the amount out of the balance into a
+   hold keyed by transaction id (journaled durably), and the target shard
+   confirms the recipient exists;
+2. commit: the target credits the recipient (once per transaction id) and
+   the source settles the hold; on abort the source releases the hold.
+
+If a worker dies the coordinator restarts it from its journal and resolves
+every hold it still has according to the coordinator's decision, so money
+is never created or lost.  The coordinator itself is single-threaded.
+"""
+import multiprocessing
+import os
+import zlib
+
+from account import BankAccount, InsufficientFundsError, InvalidInputError
+from journal import TransactionJournal, read_records, replay
+from money import from_minor
+
+OK = 0
+INVALID_INPUT = 1
+INSUFFICIENT_FUNDS = 2
+SHARD_UNAVAILABLE = 3
+
+
+class ShardUnavailableError(Exception):
+    pass
+
+
+_ERRORS = {INVALID_INPUT: InvalidInputError, INSUFFICIENT_FUNDS: InsufficientFundsError,
+           SHARD_UNAVAILABLE: ShardUnavailableError}
+
+
+def shard_of(account_id, shards):
+    """Index of the shard that owns account_id"""
+    return zlib.crc32(account_id.encode()) % shards
+
+
+class Shard:
+    """State and command handling inside one worker process"""
+
+    def __init__(self, journal_path=None):
+        self.accounts = {}
+        self.holds = {}        # txid -> (account_id, cents) debited, not yet settled
+        self.credited = set()  # txids already credited on this shard
+        self.crash_on = None
+        self.journal = None
+        # Observers inherited from the parent process belong to it
+        BankAccount.observers = ()
+        if journal_path:
+            self.recover(journal_path)
+            self.journal = TransactionJournal(journal_path)
+            self.journal.attach()
+
+    def recover(self, path):
+        replay(path, self.accounts)
+        for kind, account_id, amount, txid, _ in read_records(path):
+            if kind == "hold":
+                self.holds[txid] = (account_id, amount)
+            elif kind in ("release", "settle"):
+                self.holds.pop(txid, None)
+            elif kind == "credit":
+                self.credited.add(txid)
+
+    def _log(self, kind, account_id, cents, txid):
+        if self.journal:
+            self.journal.append(kind, account_id, cents, txid)
+
+    def _account(self, account_id):
+        account = self.accounts.get(account_id)
+        if account is None:
+            raise InvalidInputError("Account not found")
+        return account
+
+    def handle(self, command):
+        """Run one command and return (status, value)"""
+        if command[0] == self.crash_on:
+            os._exit(1)
+        try:
+            return OK, getattr(self, "do_" + command[0])(*command[1:])
+        except InvalidInputError as e:
+            return INVALID_INPUT, str(e)
+        except InsufficientFundsError as e:
+            return INSUFFICIENT_FUNDS, str(e)
+
+    def do_open(self, account_id, passcode, category, cents):
+        self.accounts[account_id] = BankAccount.open(account_id, passcode, category,
+                                                     from_minor(cents))
+
+    def do_balance(self, account_id):
+        return self._account(account_id).balance
+
+    def do_deposit(self, account_id, cents):
+        return self._account(account_id).deposit(from_minor(cents))
+
+    def do_withdraw(self, account_id, cents):
+        return self._account(account_id).withdraw(from_minor(cents))
+
+    def do_transfer(self, account_id, recipient_id, cents):
+        return self._account(account_id).transfer(from_minor(cents),
+                                                  self._account(recipient_id))
+
+    def do_prepare_debit(self, txid, account_id, cents):
+        account = self._account(account_id)
+        cents = account._debit_amount(from_minor(cents))
+        account.balance -= cents
+        self.holds[txid] = (account_id, cents)
+        self._log("hold", account_id, cents, txid)
+
+    def do_prepare_credit(self, txid, account_id, cents):
+        self._account(account_id)
+
+    def do_commit_credit(self, txid, account_id, cents):
+        if txid in self.credited:
+            return
+        self._account(account_id).balance += cents
+        self.credited.add(txid)
+        self._log("credit", account_id, cents, txid)
+
+    def do_commit_debit(self, txid):
+        hold = self.holds.pop(txid, None)
+        if hold:
+            self._log("settle", hold[0], hold[1], txid)
+
+    def do_abort(self, txid):
+        hold = self.holds.pop(txid, None)
+        if hold:
+            self.accounts[hold[0]].balance += hold[1]
+            self._log("release", hold[0], hold[1], txid)
+
+    def do_pending(self):
+        return list(self.holds)
+
+    def do_totals(self):
+        return (sum(a.balance for a in self.accounts.values()),
+                sum(cents for _, cents in self.holds.values()))
+
+    def do_crash_on(self, command_name):
+        self.crash_on = command_name
+
+
+def _worker(conn, journal_path):
+    shard = Shard(journal_path)
+    while True:
+        try:
+            batch = conn.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        results = [shard.handle(command) for command in batch]
+        if shard.journal:
+            shard.journal.wait()
+        conn.send(results)
+    if shard.journal:
+        shard.journal.close()
+
+
+class ShardedLedger:
+    """Coordinator that routes operations to shard worker processes.
+
+    Amounts are ints in minor units.  Without ``journal_dir`` a crashed
+    shard cannot be recovered and ShardUnavailableError is raised.
+    """
+
+    def __init__(self, workers=None, journal_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.journal_dir = journal_dir
+        self.processes = [None] * self.workers
+        self.connections = [None] * self.workers
+        self.decisions = {}  # txid -> True once committed, while in flight
+        self._next_tx = 0
+        for index in range(self.workers):
+            self._start(index)
+
+    def _journal_path(self, index):
+        if self.journal_dir is None:
+            return None
+        return os.path.join(self.journal_dir, f"shard-{index}.journal")
+
+    def _start(self, index):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker, args=(child, self._journal_path(index)),
+                                          daemon=True)
+        process.start()
+        child.close()
+        self.processes[index] = process
+        self.connections[index] = parent
+
+    def _restart(self, index):
+        """Bring a dead shard back from its journal and resolve its in-doubt holds"""
+        self.processes[index].join()
+        self.connections[index].close()
+        if self.journal_dir is None:
+            raise ShardUnavailableError(f"Shard {index} failed and has no journal")
+        self._start(index)
+        conn = self.connections[index]
+        conn.send([("pending",)])
+        pending = conn.recv()[0][1]
+        resolution = [("commit_debit", txid) if self.decisions.get(txid) else ("abort", txid)
+                      for txid in pending]
+        if resolution:
+            conn.send(resolution)
+            conn.recv()
+
+    def send(self, index, batch):
+        """Send a batch of commands to one shard without waiting"""
+        try:
+            self.connections[index].send(batch)
+        except (BrokenPipeError, ConnectionResetError):
+            self._restart(index)
+            raise ShardUnavailableError(f"Shard {index} restarted")
+
+    def receive(self, index):
+        """Collect the results of the batch last sent to a shard"""
+        try:
+            return self.connections[index].recv()
+        except (EOFError, ConnectionResetError):
+            self._restart(index)
+            raise ShardUnavailableError(f"Shard {index} restarted")
+
+    def call(self, index, *command):
+        self.send(index, [command])
+        status, value = self.receive(index)[0]
+        if status != OK:
+            raise _ERRORS[status](value)
+        return value
+
+    def _finish(self, index, *command):
+        """Deliver a commit/abort, retrying across shard restarts"""
+        while True:
+            try:
+                return self.call(index, *command)
+            except ShardUnavailableError:
+                continue
+
+    def shard(self, account_id):
+        return shard_of(account_id, self.workers)
+
+    def open_account(self, account_id, passcode, category, cents=0):
+        return self.call(self.shard(account_id), "open", account_id, passcode, category, cents)
+
+    def balance(self, account_id):
+        return self.call(self.shard(account_id), "balance", account_id)
+
+    def deposit(self, account_id, cents):
+        return self.call(self.shard(account_id), "deposit", account_id, cents)
+
+    def withdraw(self, account_id, cents):
+        return self.call(self.shard(account_id), "withdraw", account_id, cents)
+
+    def transfer(self, account_id, recipient_id, cents):
+        """Move cents between two accounts, using two-phase commit across shards"""
+        source = self.shard(account_id)
+        target = self.shard(recipient_id)
+        if source == target:
+            return self.call(source, "transfer", account_id, recipient_id, cents)
+        self._next_tx += 1
+        txid = f"{os.getpid()}-{self._next_tx}"
+        self.decisions[txid] = False
+        try:
+            # If the source shard dies here, its restart releases any hold
+            # it had made (presumed abort)
+            self.call(source, "prepare_debit", txid, account_id, cents)
+            try:
+                self.call(target, "prepare_credit", txid, recipient_id, cents)
+            except (ShardUnavailableError, InvalidInputError):
+                self._finish(source, "abort", txid)
+                raise
+            self.decisions[txid] = True
+            self._finish(target, "commit_credit", txid, recipient_id, cents)
+            self._finish(source, "commit_debit", txid)
+            return True
+        finally:
+            del self.decisions[txid]
+
+    def run_batch(self, commands):
+        """Run single-shard commands in parallel across shards.
+
+        ``commands`` are tuples such as ("deposit", account_id, cents); the
+        second element picks the shard.  Returns (status, value) per command,
+        in input order.  Every command sent to a shard that fails during the
+        batch gets SHARD_UNAVAILABLE: the shard is restarted from its journal
+        and whether those commands took effect is unknown.
+        """
+        per_shard = [[] for _ in range(self.workers)]
+        positions = [[] for _ in range(self.workers)]
+        for position, command in enumerate(commands):
+            index = self.shard(command[1])
+            per_shard[index].append(command)
+            positions[index].append(position)
+        results = [None] * len(commands)
+        sent = []
+        for index in range(self.workers):
+            if not per_shard[index]:
+                continue
+            try:
+                self.send(index, per_shard[index])
+            except ShardUnavailableError as e:
+                self._unavailable(results, positions[index], e)
+            else:
+                sent.append(index)
+        # Read every reply, even after a failure, so none is left in a pipe
+        for index in sent:
+            try:
+                replies = self.receive(index)
+            except ShardUnavailableError as e:
+                self._unavailable(results, positions[index], e)
+            else:
+                for position, result in zip(positions[index], replies):
+                    results[position] = result
+        return results
+
+    @staticmethod
+    def _unavailable(results, positions, error):
+        for position in positions:
+            results[position] = (SHARD_UNAVAILABLE, str(error))
+
+    def crash_on(self, index, command_name):
+        """Crash-injection hook: make a shard exit when it next sees command_name"""
+        self.call(index, "crash_on", command_name)
+
+    def totals(self):
+        """Return (sum of balances, sum of open holds) over all shards"""
+        balances = holds = 0
+        for index in range(self.workers):
+            shard_balances, shard_holds = self.call(index, "totals")
+            balances += shard_balances
+            holds += shard_holds
+        return balances, holds
+
+    def close(self):
+        for index, conn in enumerate(self.connections):
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        for conn in self.connections:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
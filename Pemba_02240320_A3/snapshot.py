@@ -0,0 +1,257 @@
+"""Point-in-time snapshots of an AccountStore and fast restart from them.
+
+A snapshot file is the store's columns laid out at fixed offsets behind a
+small header: ids and balances (8 bytes per row), the open-addressing
+index exactly as the store uses it, categories and passcode hashes.
+``load_snapshot`` maps the file copy-on-write and hands back a
+``MappedAccountStore`` whose columns are views of the mapping, so restart
+costs the same whatever the number of accounts and pages are only read
+when an account on them is touched.  Changes stay private to the process
+(the file is never written through the mapping); the index has room for
+as many rows as it has slots / 2, and new accounts fill those spare rows
+before the columns are first copied into ordinary arrays.
+
+The header also records the journal position at the moment of the
+snapshot, and ``restore`` replays only the journal written after it.  A
+snapshot is renamed into place only once the journal is durable up to
+that position, so the file never points past the end of the journal.
+
+``Snapshotter`` takes snapshots without stopping writers for the write:
+the cut copies just the balance column, which is the only one whose
+changes are not idempotent to replay, and a background thread writes the
+rest in chunks.  Ids never change once assigned, rows added after the cut
+are left out, and a category or passcode hash changed after the cut is
+set again by its journal record on replay, so the file restores exactly
+the state at the cut.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from contextlib import nullcontext
+
+from account_store import _EMPTY, _HASH_MULT, _MASK64, AccountStore
+from auth import HASH_SIZE
+from journal import replay
+
+MAGIC = b"BSNP\x01"
+
+# Magic, rows in use, row capacity, index slots, journal position
+HEADER = struct.Struct("<5s3xqqqq")
+HEADER_SIZE = 64
+_EMPTY_SLOT = struct.pack("<q", _EMPTY)
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def _layout(capacity, table_size):
+    """Byte offsets of the ids, balances, slots, categories and hashes columns, and the file size"""
+    ids = HEADER_SIZE
+    balances = ids + 8 * capacity
+    slots = balances + 8 * capacity
+    categories = slots + 8 * table_size
+    hashes = categories + _align(capacity)
+    return ids, balances, slots, categories, hashes, hashes + _align(HASH_SIZE * capacity)
+
+
+class MappedAccountStore(AccountStore):
+    """An AccountStore whose columns live in a private mapping of a snapshot file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, count, capacity, table_size, self.journal_position = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an account snapshot")
+        ids, balances, slots, categories, hashes, end = _layout(capacity, table_size)
+        if len(self._map) < end:
+            raise ValueError(f"{path} is truncated")
+        view = memoryview(self._map)
+        self.capacity = capacity
+        self._full = (view[ids:balances].cast("q"), view[balances:slots].cast("q"),
+                      view[categories:categories + capacity].cast("b"),
+                      view[hashes:hashes + HASH_SIZE * capacity])
+        self._trim(count)
+        self._slots = view[slots:categories].cast("q")
+        self._shift = 64 - (table_size.bit_length() - 1)
+
+    def _trim(self, count):
+        ids, balances, categories, hashes = self._full
+        self.ids = ids[:count]
+        self.balances = balances[:count]
+        self.categories = categories[:count]
+        self.passcode_hashes = hashes[:count * HASH_SIZE]
+
+    def _thaw(self):
+        """Copy the columns out of the mapping so that they can grow"""
+        columns = []
+        for typecode, column in (("q", self.ids), ("q", self.balances), ("b", self.categories)):
+            copy = array(typecode)
+            copy.frombytes(column.cast("B"))
+            columns.append(copy)
+        self.ids, self.balances, self.categories = columns
+        self.passcode_hashes = bytearray(self.passcode_hashes)
+        if isinstance(self._slots, memoryview):
+            slots = array("q")
+            slots.frombytes(self._slots.cast("B"))
+            self._slots = slots
+        self._full = None
+
+    def _append_row(self, key, balance, category, passcode_hash):
+        if self._full is None or len(self.ids) == self.capacity:
+            if self._full is not None:
+                self._thaw()
+            super()._append_row(key, balance, category, passcode_hash)
+            return
+        row = len(self.ids)
+        ids, balances, categories, hashes = self._full
+        ids[row] = key
+        balances[row] = balance
+        categories[row] = category
+        hashes[row * HASH_SIZE:(row + 1) * HASH_SIZE] = passcode_hash
+        self._trim(row + 1)
+
+
+def load_snapshot(path):
+    """Map a snapshot file; returns a MappedAccountStore"""
+    return MappedAccountStore(path)
+
+
+def restore(snapshot_path=None, journal_path=None):
+    """Return an AccountStore rebuilt from a snapshot and the journal after it.
+
+    Either file may be missing: without a snapshot the whole journal is
+    replayed into an empty store.
+    """
+    if snapshot_path and os.path.exists(snapshot_path):
+        store = load_snapshot(snapshot_path)
+        start = store.journal_position
+    else:
+        store = AccountStore()
+        start = 0
+    if journal_path:
+        replay(journal_path, store, start=start)
+    return store
+
+
+class _Cut:
+    """What a snapshot must capture while writers are held"""
+    __slots__ = ("count", "balances", "slots", "journal_position", "journal_seq")
+
+    def __init__(self, store, journal):
+        self.count = len(store.ids)
+        with memoryview(store.balances) as balances:
+            self.balances = balances[:self.count].tobytes()
+        self.slots = store._slots
+        # Appended is not yet durable: the write waits for journal_seq
+        self.journal_position = journal.position if journal is not None else 0
+        self.journal_seq = journal._appended if journal is not None else 0
+
+
+def _write(store, cut, path, chunk_rows, journal=None):
+    """Write the snapshot for cut to path, via a temporary file and rename"""
+    count = cut.count
+    table_size = len(cut.slots)
+    capacity = table_size // 2
+    ids, balances, slots, categories, hashes, end = _layout(capacity, table_size)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        # Spare rows are never written and stay holes in a sparse file
+        f.truncate(end)
+        f.write(HEADER.pack(MAGIC, count, capacity, table_size, cut.journal_position))
+        f.seek(balances)
+        f.write(cut.balances)
+        # Columns are read by slicing, which copies an array in one call, so
+        # no buffer stays exported from a column that a writer may append to
+        for offset, name, items in ((ids, "ids", 1), (categories, "categories", 1),
+                                    (hashes, "passcode_hashes", HASH_SIZE)):
+            f.seek(offset)
+            for start in range(0, count, chunk_rows):
+                stop = min(start + chunk_rows, count)
+                f.write(getattr(store, name)[start * items:stop * items])
+        f.seek(slots)
+        for start in range(0, table_size, chunk_rows):
+            f.write(cut.slots[start:start + chunk_rows])
+        # Slots filled after the cut belong to rows the snapshot leaves out;
+        # they were empty at the cut, so empty them again
+        key_ids = store.ids
+        mask = table_size - 1
+        shift = 64 - (table_size.bit_length() - 1)
+        for row in range(count, len(key_ids)):
+            slot = ((key_ids[row] * _HASH_MULT) & _MASK64) >> shift
+            while True:
+                entry = cut.slots[slot]
+                if entry == _EMPTY:
+                    break
+                if entry == row:
+                    f.seek(slots + 8 * slot)
+                    f.write(_EMPTY_SLOT)
+                    break
+                slot = (slot + 1) & mask
+        f.flush()
+        os.fsync(f.fileno())
+    if journal is not None:
+        journal.wait(cut.journal_seq)
+    os.replace(temp, path)
+
+
+class Snapshotter:
+    """Writes snapshots of an AccountStore on a background thread.
+
+    ``snapshot()`` must run where no account operation is half done (the
+    thread or event loop that runs them), or ``quiesce`` must return a
+    context manager that holds them off, e.g. ``ledger.locks.hold_all``
+    for a ConcurrentLedger.  Writers only wait for the cut, a copy of the
+    balance column; ``last_pause`` records how long it took.
+    """
+
+    def __init__(self, store, path, journal=None, quiesce=nullcontext, chunk_rows=65536):
+        self.store = store
+        self.path = path
+        self.journal = journal
+        self.quiesce = quiesce
+        self.chunk_rows = chunk_rows
+        self.last_pause = 0.0
+        self.written = 0
+        self._thread = None
+        self._error = None
+
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def snapshot(self):
+        """Start a snapshot; returns False if the previous one is still being written"""
+        if self.busy:
+            return False
+        self._raise_error()
+        with self.quiesce():
+            start = time.perf_counter()
+            cut = _Cut(self.store, self.journal)
+            self.last_pause = time.perf_counter() - start
+        self._thread = threading.Thread(target=self._run, args=(cut,), name="snapshot-writer",
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, cut):
+        try:
+            _write(self.store, cut, self.path, self.chunk_rows, self.journal)
+            self.written += 1
+        except OSError as e:
+            self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def wait(self):
+        """Block until the snapshot being written (if any) is on disk"""
+        if self._thread is not None:
+            self._thread.join()
+        self._raise_error()
@@ -0,0 +1,235 @@
+"""Mobile top-up dispatch to the phone operators.
+
+``BankAccount.mobile_topup`` debits the account at once and reports a
+"topup" to its observers; ``TopupGateway`` is such an observer.  It gives
+each top-up an idempotency key and queues it by number prefix (each prefix
+belongs to one operator).  One sender task per prefix coalesces whatever
+has queued up within ``linger`` seconds into a batch of at most
+``max_batch`` top-ups, and at most ``concurrency`` batches are in flight
+across all operators.
+
+A batch that fails or times out is retried with backoff under the same
+keys, so an operator that applied it before the failure does not apply it
+again.  A number the operator rejects is refunded to the account.  When
+the retries run out the batch may or may not have been applied, so it is
+voided with the operator first and refunded once the void succeeds; if
+the void cannot be confirmed either, the top-ups are left in
+``unresolved`` for reconciliation rather than risk paying twice.
+"""
+import asyncio
+import itertools
+import os
+import random
+import time
+
+from account import BankAccount
+from money import from_minor
+
+OPERATORS = {"17": "B-Mobile", "77": "TashiCell"}
+
+
+class OperatorError(Exception):
+    """A batch could not be delivered; it may be retried"""
+
+
+class TopupRequest:
+    __slots__ = ("key", "account", "mobile", "cents", "queued_at")
+
+    def __init__(self, key, account, mobile, cents):
+        self.key = key
+        self.account = account
+        self.mobile = mobile
+        self.cents = cents
+        self.queued_at = time.perf_counter()
+
+
+def refund(request):
+    """Default refund: credit the account object directly"""
+    request.account.refund_topup(from_minor(request.cents), request.mobile)
+
+
+class TopupGateway:
+    """Queues top-ups and delivers them in batches over asyncio.
+
+    Start it with ``await gateway.start()`` on the event loop that should
+    do the sending; ``record``/``submit`` may then be called from any
+    thread.  Refunds run on that loop, so where accounts are also changed
+    from other threads pass a ``refund`` callable that goes through the
+    same locking (e.g. a ConcurrentLedger).  ``on_result(request, ok)``
+    is called once per top-up: ok is True when delivered, False when
+    refunded and None when unresolved.
+    """
+
+    def __init__(self, operator, max_batch=100, linger=0.005, concurrency=8, retries=3,
+                 backoff=0.05, timeout=2.0, refund=refund, on_result=None):
+        self.operator = operator
+        self.max_batch = max_batch
+        self.linger = linger
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.refund = refund
+        self.on_result = on_result
+        self.delivered = 0
+        self.refunded = 0
+        self.unresolved = []
+        self._key_prefix = os.urandom(6).hex()
+        self._counter = itertools.count(1)
+        self._loop = None
+        self._queues = {}
+        self._senders = []
+        self._batches = set()
+        self._slots = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def attach(self, target=BankAccount):
+        target.observers = tuple(target.observers) + (self,)
+
+    def detach(self, target=BankAccount):
+        target.observers = tuple(o for o in target.observers if o is not self)
+
+    def record(self, account, kind, amount, detail=None):
+        """BankAccount observer hook"""
+        if kind == "topup":
+            self.submit(account, detail, amount)
+
+    def submit(self, account, mobile, cents):
+        """Queue a top-up whose amount has already been debited; returns its key"""
+        if self._loop is None:
+            raise RuntimeError("TopupGateway has not been started")
+        request = TopupRequest(f"{self._key_prefix}-{next(self._counter)}", account, mobile, cents)
+        self._loop.call_soon_threadsafe(self._enqueue, request)
+        return request.key
+
+    def _enqueue(self, request):
+        prefix = request.mobile[:2]
+        queue = self._queues.get(prefix)
+        if queue is None:
+            queue = self._queues[prefix] = asyncio.Queue()
+            self._senders.append(asyncio.ensure_future(self._sender(prefix, queue)))
+        queue.put_nowait(request)
+
+    async def _sender(self, prefix, queue):
+        while True:
+            request = await queue.get()
+            if request is None:
+                return
+            if queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.linger)
+            batch = [request]
+            closing = False
+            while len(batch) < self.max_batch and not queue.empty():
+                request = queue.get_nowait()
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._send(prefix, batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+            if closing:
+                return
+
+    async def _call(self, method, *args):
+        """Await an operator call with timeout and retries; None if it never succeeds"""
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(method(*args), self.timeout)
+            except (OperatorError, asyncio.TimeoutError, ConnectionError):
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        return None
+
+    async def _send(self, prefix, batch):
+        try:
+            results = await self._call(self.operator.send_batch, prefix,
+                                       [(r.key, r.mobile, r.cents) for r in batch])
+            if results is None:
+                voided = await self._call(self.operator.void_batch, prefix,
+                                          [r.key for r in batch])
+                results = [False if voided is not None else None] * len(batch)
+            for request, ok in zip(batch, results):
+                if ok:
+                    self.delivered += 1
+                elif ok is None:
+                    self.unresolved.append(request)
+                else:
+                    self.refund(request)
+                    self.refunded += 1
+                if self.on_result:
+                    self.on_result(request, ok)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Deliver or refund everything submitted so far, then stop"""
+        await asyncio.sleep(0)  # let top-ups submitted before this call reach their queues
+        for queue in self._queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*self._senders)
+        await asyncio.gather(*self._batches)
+        self._queues.clear()
+        self._senders.clear()
+
+
+class OperatorSimulator:
+    """Local stand-in for the operators' top-up APIs.
+
+    Each batch call takes ``latency`` plus ``per_item`` seconds per top-up.
+    It fails before applying anything with probability ``failure_rate``,
+    and after applying the batch with probability ``lost_reply_rate``.
+    Single numbers are rejected with probability ``reject_rate``.  Results
+    are remembered by idempotency key, so a retried key is never applied
+    twice, and a voided key is reversed and never applied afterwards.
+    """
+
+    def __init__(self, latency=0.02, per_item=0.0, failure_rate=0.0, lost_reply_rate=0.0,
+                 reject_rate=0.0, seed=None):
+        self.latency = latency
+        self.per_item = per_item
+        self.failure_rate = failure_rate
+        self.lost_reply_rate = lost_reply_rate
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.results = {}   # idempotency key -> accepted
+        self.applied = {}   # idempotency key -> (mobile number, cents) while credited
+        self.credited = {}  # mobile number -> cents delivered
+        self.calls = 0
+
+    async def send_batch(self, prefix, items):
+        """Apply [(key, mobile, cents), ...]; returns one bool per item"""
+        self.calls += 1
+        if prefix not in OPERATORS:
+            raise OperatorError(f"No operator for prefix {prefix}")
+        await asyncio.sleep(self.latency + self.per_item * len(items))
+        if self.rng.random() < self.failure_rate:
+            raise OperatorError("Operator unavailable")
+        results = []
+        for key, mobile, cents in items:
+            accepted = self.results.get(key)
+            if accepted is None:
+                accepted = self.results[key] = self.rng.random() >= self.reject_rate
+                if accepted:
+                    self.applied[key] = (mobile, cents)
+                    self.credited[mobile] = self.credited.get(mobile, 0) + cents
+            results.append(accepted)
+        if self.rng.random() < self.lost_reply_rate:
+            raise OperatorError("Reply lost")
+        return results
+
+    async def void_batch(self, prefix, keys):
+        """Reverse and block the given keys; safe to repeat"""
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for key in keys:
+            self.results[key] = False
+            applied = self.applied.pop(key, None)
+            if applied is not None:
+                mobile, cents = applied
+                self.credited[mobile] -= cents
+        return len(keys)
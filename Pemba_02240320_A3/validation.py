@@ -0,0 +1,127 @@
+"""Input validation that reports error codes instead of raising.
+
+Every check has a column form that takes a sequence of inputs and returns
+an ``array('b')`` of codes, so bulk and API ingestion can validate a file
+or a request batch at once and report every bad row; ``first_errors``
+combines the columns of a row.  Amount and passcode columns repeat, so
+each distinct value in them is checked once.  The single-value forms are
+what ``BankAccount`` uses before raising its own exceptions.
+
+Amounts are checked with ``money.match_amount``, the grammar
+``parse_amount`` uses.  Only ASCII digits are accepted anywhere, and a
+value that is not a string gets its field's error code.
+"""
+import re
+from array import array
+
+from money import match_amount
+
+OK = 0
+INVALID_AMOUNT = 1       # not a decimal number with at most two places, or out of range
+NON_POSITIVE_AMOUNT = 2
+INVALID_MOBILE = 3       # not 8 digits starting 17 or 77
+INVALID_PASSCODE = 4     # not 4 digits
+# Bulk import (see bulk_io)
+INVALID_ACCOUNT_ID = 5   # not a canonical non-negative integer
+INVALID_CATEGORY = 6
+INVALID_PASSCODE_HASH = 7
+DUPLICATE_ACCOUNT = 8    # already exists, or appeared earlier in the file
+INVALID_KIND = 9
+INVALID_TIMESTAMP = 10
+MALFORMED_ROW = 11       # wrong number of fields, or a truncated record
+
+MESSAGES = {
+    INVALID_AMOUNT: "Enter a valid number",
+    NON_POSITIVE_AMOUNT: "Invalid amount",
+    INVALID_MOBILE: "Invalid mobile number",
+    INVALID_PASSCODE: "Passcode must be 4 digits",
+    INVALID_ACCOUNT_ID: "Invalid account ID",
+    INVALID_CATEGORY: "Invalid account category",
+    INVALID_PASSCODE_HASH: "Invalid passcode hash",
+    DUPLICATE_ACCOUNT: "Account already exists",
+    INVALID_KIND: "Invalid transaction kind",
+    INVALID_TIMESTAMP: "Invalid timestamp",
+    MALFORMED_ROW: "Malformed row",
+}
+
+# Amounts are stored in int64 columns
+_MAX_CENTS = (1 << 63) - 1
+
+_MOBILE = re.compile(r"(?:17|77)[0-9]{6}")
+_PASSCODE = re.compile(r"[0-9]{4}")
+
+
+def check_mobile(number):
+    if number.__class__ is not str:
+        return INVALID_MOBILE
+    return OK if _MOBILE.fullmatch(number) else INVALID_MOBILE
+
+
+def check_passcode(passcode):
+    if passcode.__class__ is not str:
+        return INVALID_PASSCODE
+    return OK if _PASSCODE.fullmatch(passcode) else INVALID_PASSCODE
+
+
+def _cents(text):
+    """Cents for an amount string that fits int64, or None"""
+    if text.__class__ is not str:
+        return None
+    cents = match_amount(text)
+    if cents is None or not -_MAX_CENTS <= cents <= _MAX_CENTS:
+        return None
+    return cents
+
+
+def check_amount(text):
+    """Return (code, cents); cents is 0 unless the text parsed"""
+    cents = _cents(text)
+    if cents is None:
+        return INVALID_AMOUNT, 0
+    return (OK if cents > 0 else NON_POSITIVE_AMOUNT), cents
+
+
+def _per_value(check, column):
+    """check(value) for each value of a column, once per distinct value
+
+    A column of mostly distinct values is checked value by value instead,
+    as deduplicating it would cost more than it saves.
+    """
+    try:
+        results = dict.fromkeys(column)
+    except TypeError:  # unhashable values
+        return list(map(check, column))
+    if 2 * len(results) > len(column):
+        return list(map(check, column))
+    for value in results:
+        results[value] = check(value)
+    return list(map(results.__getitem__, column))
+
+
+def check_mobiles(numbers):
+    """Codes for a column of mobile numbers"""
+    # Mobile numbers rarely repeat, so there is nothing to deduplicate
+    return array("b", list(map(check_mobile, numbers)))
+
+
+def check_passcodes(passcodes):
+    """Codes for a column of passcodes"""
+    return array("b", _per_value(check_passcode, passcodes))
+
+
+def check_amounts(texts):
+    """Return (codes, cents) arrays for a column of amount strings"""
+    # Plain ints, not (code, cents) tuples: a column's worth of tuples
+    # kept alive would set off full garbage collections.
+    cents = _per_value(_cents, texts)
+    codes = [INVALID_AMOUNT if value is None else OK if value > 0 else NON_POSITIVE_AMOUNT
+             for value in cents]
+    return array("b", codes), array("q", [value or 0 for value in cents])
+
+
+def first_errors(*columns):
+    """Combine per-column codes into the first nonzero code of each row"""
+    combined = columns[0]
+    for codes in columns[1:]:
+        combined = [first or code for first, code in zip(combined, codes)]
+    return array("b", combined)
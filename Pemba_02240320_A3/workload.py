@@ -0,0 +1,85 @@
+"""Synthetic, reproducible workloads for benchmarks and load tests.
+
+``Zipf`` picks accounts with Zipfian skew: the k-th most popular account
+is chosen with probability proportional to 1/k**skew, so a few hot
+accounts take most of the traffic (skew 0 is uniform).  Which accounts are
+hot is itself decided by the seed, not by their ids.
+
+``Workload`` turns a seed, an account count, a skew and an operation mix
+into a list of operations; the same arguments always give the same list.
+"""
+import random
+from itertools import accumulate
+
+MOBILE_PREFIXES = ("17", "77")
+
+# Share of each operation kind in the default mix
+MIX = {"deposit": 0.35, "withdraw": 0.3, "transfer": 0.25, "topup": 0.1}
+
+
+def parse_mix(text):
+    """Parse a mix like "deposit=40,withdraw=30,transfer=30" into shares summing to 1"""
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in MIX:
+            raise ValueError(f"unknown operation {kind!r} in mix")
+        weights[kind] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("mix weights must add up to more than 0")
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+class Zipf:
+    """Zipfian choice among n items, returning item indexes"""
+
+    def __init__(self, n, skew, rng):
+        self.rng = rng
+        self.cum_weights = list(accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+        # rank -> item, so the hottest items are spread over the id range
+        self.items = list(range(n))
+        rng.shuffle(self.items)
+
+    def sample(self, k):
+        ranks = self.rng.choices(range(len(self.items)), cum_weights=self.cum_weights, k=k)
+        items = self.items
+        return [items[rank] for rank in ranks]
+
+
+class Workload:
+    """Seeded generator of account ids and operations over them"""
+
+    def __init__(self, accounts, seed=1, skew=1.1, mix=MIX, first_id=10000000):
+        self.seed = seed
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.account_ids = [str(first_id + i) for i in range(accounts)]
+        self.zipf = Zipf(accounts, skew, self.rng)
+
+    def pick(self, k):
+        """k account ids, Zipf-distributed"""
+        ids = self.account_ids
+        return [ids[i] for i in self.zipf.sample(k)]
+
+    def mobile(self):
+        return self.rng.choice(MOBILE_PREFIXES) + f"{self.rng.randrange(10 ** 6):06d}"
+
+    def operations(self, n):
+        """n operations: (kind, account_id, amount in major units, recipient or mobile or None)"""
+        rng = self.rng
+        kinds = rng.choices(list(self.mix), weights=list(self.mix.values()), k=n)
+        sources = self.pick(n)
+        # Recipients are skewed too: hot accounts also receive the most
+        targets = self.pick(n)
+        ops = []
+        for kind, source, target in zip(kinds, sources, targets):
+            amount = rng.randint(1, 200)
+            if kind == "transfer":
+                ops.append((kind, source, amount, target))
+            elif kind == "topup":
+                ops.append((kind, source, amount, self.mobile()))
+            else:
+                ops.append((kind, source, amount, None))
+        return ops